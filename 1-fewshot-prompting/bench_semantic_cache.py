@@ -0,0 +1,133 @@
+"""Semantic cache lookup latency and hit quality at scale (no API calls).
+
+    uv run python bench_semantic_cache.py                      # 1M entries (~1 GB RAM)
+    uv run python bench_semantic_cache.py --entries 100000 --queries 2000 --json
+
+Fills a cache with synthetic topics, then times `get()` for paraphrases of
+stored topics (should hit), paraphrases with one extra word (similarity
+around the threshold) and unseen topics (should miss). The approximate
+lookup's recall is checked against an exact brute-force scan over a sample
+of the extended queries, whose latency is printed alongside for comparison.
+"""
+import argparse
+import json
+import math
+import random
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache, embed
+
+SUBJECTS = ["AI", "remote work", "quantum computing", "climate tech", "open source", "space travel",
+            "electric cars", "cybersecurity", "healthcare", "education", "fintech", "robotics"]
+VERBS = {"transforms": "transforming", "disrupts": "disrupting", "reshapes": "reshaping", "powers": "powering",
+         "boosts": "boosting", "changes": "changing", "rethinks": "rethinking", "scales": "scaling"}
+FILLERS = ["is", "the", "of", "for", "about", "how"]
+
+
+def synthetic_vocabulary(rng: random.Random, size: int) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def make_topic(rng: random.Random, vocab: list[str]) -> str:
+    words = rng.sample(vocab, rng.randint(2, 4))
+    return f"{rng.choice(SUBJECTS)} {rng.choice(list(VERBS))} {' '.join(words)}"
+
+
+def paraphrase(rng: random.Random, topic: str) -> str:
+    """A near-duplicate: different inflection, stop words and casing, same content words."""
+    words = topic.split()
+    out = []
+    for word in words:
+        if word in VERBS and rng.random() < 0.7:
+            out.append("is")
+            word = VERBS[word]
+        out.append(word.upper() if rng.random() < 0.1 else word)
+    if rng.random() < 0.5:
+        out.insert(rng.randint(1, len(out)), rng.choice(FILLERS))
+    return " ".join(out)
+
+
+def exact_scores(cache: SemanticCache, vec: np.ndarray, chunk: int = 100_000) -> np.ndarray:
+    """Cosine of `vec` with every live row, scaled back from int8 like the cache's own lookup."""
+    scores = np.concatenate([(cache.vectors[s:s + chunk].astype(np.float32) @ vec) * cache.scales[s:s + chunk]
+                             for s in range(0, len(cache.vectors), chunk)])
+    scores[~cache.alive] = -1.0
+    return scores
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cache lookup latency at scale.")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--brute-force-sample", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocab = synthetic_vocabulary(rng, 50_000)
+    topics = [make_topic(rng, vocab) for _ in range(args.entries)]
+
+    start = time.perf_counter()
+    vectors = np.stack([embed(t) for t in topics])
+    embed_s = time.perf_counter() - start
+    cache = SemanticCache(capacity=args.entries, threshold=args.threshold)
+    start = time.perf_counter()
+    cache.extend(topics, [f"post about {t}" for t in topics], vectors)
+    index_s = time.perf_counter() - start
+
+    stored = rng.sample(range(args.entries), min(args.queries, args.entries))
+    near = [paraphrase(rng, topics[i]) for i in stored]
+    extended = [f"{q} {rng.choice(vocab)}" for q in near]
+    unseen = [make_topic(rng, vocab) for _ in range(len(stored))]
+
+    results = {"entries": args.entries, "embed_s": round(embed_s, 1), "index_s": round(index_s, 1)}
+    for name, queries in (("paraphrase", near), ("extended", extended), ("unseen", unseen)):
+        latencies, hits = [], 0
+        for q in queries:
+            t = time.perf_counter()
+            hits += cache.get(q) is not None
+            latencies.append(time.perf_counter() - t)
+        results[name] = {"hit_rate": hits / len(queries), "p50_ms": 1000 * percentile(latencies, 50),
+                         "p99_ms": 1000 * percentile(latencies, 99)}
+
+    # exact scan over every row, for recall and as the baseline latency
+    sample = extended[: args.brute_force_sample]
+    exact_hits = approx_hits = 0
+    latencies = []
+    for q in sample:
+        vec = embed(q)
+        t = time.perf_counter()
+        scores = exact_scores(cache, vec)
+        latencies.append(time.perf_counter() - t)
+        if scores.max() >= args.threshold:
+            exact_hits += 1
+            approx_hits += cache.get(q) is not None
+    results["exact_hit_rate"] = exact_hits / len(sample) if sample else 0.0
+    results["recall_vs_exact"] = approx_hits / exact_hits if exact_hits else 1.0
+    results["brute_force_p50_ms"] = 1000 * percentile(latencies, 50)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.entries:,} entries: embedded in {embed_s:.1f}s, indexed in {index_s:.1f}s\n")
+    print(f"{'queries':<12}{'hit rate':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in ("paraphrase", "extended", "unseen"):
+        r = results[name]
+        print(f"{name:<12}{100 * r['hit_rate']:>9.1f}%{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    print(f"\nrecall vs exact scan: {100 * results['recall_vs_exact']:.1f}% of the "
+          f"{100 * results['exact_hit_rate']:.1f}% extended queries the scan matches, "
+          f"exact scan p50 {results['brute_force_p50_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,15 @@
 import os
+import sys
 import logging
-from dotenv import load_dotenv
-import google.generativeai as genai
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from rate_limit import rate_limited_generate
+from profiling import profile_from_argv
+from prompting import PromptBuilder
+
+CACHE_FILE = os.getenv("SEMANTIC_CACHE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "semantic_cache.npz"))
+X_POST_PROMPT_TOKENS = int(os.getenv("X_POST_PROMPT_TOKENS", "1000"))  # a topic is one line; raise rather than send a pasted essay
+
 
 # --- Setup logging ---
 logging.basicConfig(
@@ -13,6 +21,7 @@ logging.basicConfig(
 
 def load_api_key() -> str:
     logging.info("🔑 Loading API key...")
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -24,6 +33,7 @@ def load_api_key() -> str:
 
 def configure_genai(api_key: str):
     logging.info("⚙️ Configuring Gemini client...")
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     logging.info("🟢 Gemini client configured")
 
@@ -37,54 +47,90 @@ def get_user_topic() -> str:
 
 def build_prompt(user_topic: str) -> str:
     logging.info("🛠️ Building prompt...")
-    prompt = f"""
-    You are an expert social media manager.
-    Write a short, engaging X (formerly Twitter) post about the following topic.
-    Keep it concise, avoid hashtags, use max 1–2 emojis, and format with line breaks if needed.
-
-    Here are some examples (topic → generated post):
-
-    <example>
-      <topic>AI transforms healthcare</topic>
-      <generated-post>AI is reshaping healthcare 🏥 Faster diagnoses, smarter hospitals, and better treatments.</generated-post>
-    </example>
-
-    <example>
-      <topic>Remote work is the new normal</topic>
-      <generated-post>Work from anywhere 🌍 Remote work is here to stay, bringing flexibility and global collaboration.</generated-post>
-    </example>
-
-    Please use the tone, structure, and style of the examples above 
-    (but not the content) to generate a new post for the topic below.
-
-    <TOPIC>
-    {user_topic}
-    </TOPIC>
-    """
+    prompt = (
+        PromptBuilder("build_prompt", budget=X_POST_PROMPT_TOKENS)
+        .text("""
+            You are an expert social media manager.
+            Write a short, engaging X (formerly Twitter) post about the following topic.
+            Keep it concise, avoid hashtags, use max 1–2 emojis, and format with line breaks if needed.
+
+            Here are some examples (topic → generated post):
+
+            <example>
+              <topic>AI transforms healthcare</topic>
+              <generated-post>AI is reshaping healthcare 🏥 Faster diagnoses, smarter hospitals, and better treatments.</generated-post>
+            </example>
+
+            <example>
+              <topic>Remote work is the new normal</topic>
+              <generated-post>Work from anywhere 🌍 Remote work is here to stay, bringing flexibility and global collaboration.</generated-post>
+            </example>
+
+            Please use the tone, structure, and style of the examples above
+            (but not the content) to generate a new post for the topic below.
+        """)
+        .block("TOPIC", user_topic)
+        .build()
+    )
     logging.info("🟢 Prompt built successfully")
     return prompt
 
 
 def generate_post(prompt: str) -> str:
     logging.info("🚀 Sending request to Gemini API...")
+    import google.generativeai as genai
     model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(prompt)
+    response = rate_limited_generate(model, prompt)
     logging.info("🟢 Response received from Gemini API")
     return response.text
 
 
+def open_cache(threshold: float | None):
+    from semantic_cache import SemanticCache
+
+    overrides = {} if threshold is None else {"threshold": threshold}
+    cache = SemanticCache.load(CACHE_FILE, **overrides)
+    logging.info(f"🔵 Semantic cache: {len(cache)} topics from {CACHE_FILE}")
+    return cache
+
+
 def main():
-    logging.info("🚀 Starting X post generator workflow...")
-    api_key = load_api_key()
-    configure_genai(api_key)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate an X post for a topic (asks for the topic when omitted).")
+    parser.add_argument("topic", nargs="*")
+    parser.add_argument("--cache", action="store_true", default=os.getenv("SEMANTIC_CACHE", "") not in ("", "0"),
+                        help=f"reuse posts of near-duplicate topics, stored in {os.path.basename(CACHE_FILE)} "
+                             "(or set SEMANTIC_CACHE=1)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="with --cache: generate anyway and keep the post as another variant")
+    parser.add_argument("--threshold", type=float, default=None, help="cosine similarity that counts as a hit")
+    args = parser.parse_args()
 
-    user_topic = get_user_topic()
-    prompt = build_prompt(user_topic)
-    post = generate_post(prompt)
+    logging.info("🚀 Starting X post generator workflow...")
+    user_topic = " ".join(args.topic) or get_user_topic()
+
+    cache = open_cache(args.threshold) if args.cache else None
+    hit = cache.get(user_topic) if cache is not None and not args.fresh else None
+    if hit is not None:
+        logging.info(f"🟢 Cache hit ({hit.similarity:.2f} similar to \"{hit.topic}\"), skipping generation")
+        post = hit.post
+    else:
+        api_key = load_api_key()
+        configure_genai(api_key)
+
+        prompt = build_prompt(user_topic)
+        post = generate_post(prompt)
+        if cache is not None:
+            cache.put(user_topic, post)
+    if cache is not None:
+        cache.save(CACHE_FILE)
+        logging.info(f"🔵 Cache stats: {cache.stats()}")
 
     logging.info("✅ X Post Generated:")
     print(post)  # vẫn print kết quả cuối cho dễ copy
 
 
 if __name__ == "__main__":
-    main()
+    with profile_from_argv():
+        main()
@@ -0,0 +1,298 @@
+"""Semantic cache for generated posts: near-duplicate topics reuse a stored post.
+
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache.load("semantic_cache.npz")      # empty cache if the file doesn't exist
+    hit = cache.get("AI is transforming healthcare")
+    if hit is None:
+        post = generate_post(build_prompt(topic))
+        cache.put(topic, post)
+    cache.save("semantic_cache.npz")
+
+Topics are embedded locally (no API call): lowercased, stop words dropped,
+simple suffix stemming, then word + character-trigram features hashed into a
+fixed-size, L2-normalised vector. "AI transforms healthcare" and "AI is
+transforming healthcare" end up with the same vector.
+
+Lookup is approximate nearest neighbour with random-hyperplane LSH: each
+vector gets a `bits`-bit code (about log2(capacity)) in each of `tables`
+tables, and a query looks at its own bucket plus the one-bit-off buckets in
+every table (multi-probe). Only those candidates, a few hundred rows even at
+1M entries, are scored exactly (cosine).
+
+All tables share one sorted array of (table, code) keys, so every probe goes
+through a single searchsorted; new entries go to a small dict until the next
+merge, and evicted slots are filtered out at query time, so nothing is
+deleted from the index in place. Rows are stored as int8 with a per-row scale
+(256 MB at 1M x 256) and scored in float32. Size is bounded by `capacity`
+with LRU eviction; a slot is reused by the next insert.
+
+A topic close to a cached one (cosine >= `threshold`) adds its post as another
+variant of that entry (up to `max_variants`); hits rotate through the variants,
+so asking for the same topic twice doesn't always give the same post.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+DIM = 256
+TABLES = 12
+THRESHOLD = 0.85
+CAPACITY = 10_000
+MAX_VARIANTS = 3
+SEED = 1234
+
+STOP_WORDS = frozenset(
+    "a an the is are was were be been being am of to in on for with and or at by from as it its this that "
+    "these those into about how why what will can do does".split()
+)
+_SUFFIXES = ("ing", "ed", "es", "s")
+_WORD = re.compile(r"\w+")
+
+
+# ========== Embedding ==========
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+def topic_tokens(text: str) -> list[str]:
+    tokens = [_stem(w) for w in _WORD.findall(text.lower()) if w not in STOP_WORDS]
+    return tokens or _WORD.findall(text.lower())  # a topic made only of stop words still needs features
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """Signed feature hashing of words (weight 1) and their char trigrams (weight 0.5), L2-normalised."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in topic_tokens(text):
+        features = [(token, 1.0)]
+        padded = f"<{token}>"
+        features += [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+        for feature, weight in features:
+            h = zlib.crc32(feature.encode("utf-8"))  # stable across runs, unlike hash()
+            vec[h % dim] += weight if h & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+@dataclass
+class CacheHit:
+    post: str
+    similarity: float
+    topic: str          # the cached topic that matched
+
+
+# ========== Cache ==========
+class SemanticCache:
+    def __init__(self, capacity: int = CAPACITY, threshold: float = THRESHOLD, dim: int = DIM,
+                 tables: int = TABLES, bits: int | None = None, max_variants: int = MAX_VARIANTS, seed: int = SEED):
+        # about one entry per bucket when full, so a lookup scores ~tables * (bits + 1) rows at any size
+        bits = bits or min(24, max(8, round(math.log2(capacity))))
+        if bits > 32:
+            raise ValueError("bits must be <= 32")
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        self.max_variants = max_variants
+        self.seed = seed
+
+        self.vectors = np.zeros((capacity, dim), dtype=np.int8)
+        self.scales = np.zeros(capacity, dtype=np.float32)
+        self.codes = np.zeros((capacity, tables), dtype=np.uint32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.topics: list[str | None] = [None] * capacity
+        self.posts: list[list[str] | None] = [None] * capacity
+        self._turn = [0] * capacity
+        self._lru: OrderedDict[int, None] = OrderedDict()
+        self._free = list(range(capacity - 1, -1, -1))
+
+        rng = np.random.default_rng(seed)
+        self._planes = rng.standard_normal((tables * bits, dim)).astype(np.float32)
+        self._bit_weights = (1 << np.arange(bits, dtype=np.uint64)).astype(np.uint32)
+        self._probes = np.array([0] + [1 << b for b in range(bits)], dtype=np.uint32)
+        self._table_keys = np.arange(tables, dtype=np.int64)[:, None] << bits
+        self._sorted_keys = np.empty(0, dtype=np.int64)
+        self._sorted_slots = np.empty(0, dtype=np.int32)
+        self._pending: dict[int, list[int]] = {}
+        self._pending_count = 0
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    # ---- index ----
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dim) -> (n, tables) LSH codes."""
+        signs = (vectors @ self._planes.T) > 0
+        return signs.reshape(len(vectors), self.tables, self.bits).astype(np.uint32) @ self._bit_weights
+
+    def _keys(self, codes: np.ndarray) -> np.ndarray:
+        """(..., tables) codes -> index keys, unique across tables."""
+        return self._table_keys[:, 0] + codes.astype(np.int64)
+
+    def _candidates(self, codes: np.ndarray) -> np.ndarray:
+        probes = codes[:, None] ^ self._probes[None, :]  # (tables, bits + 1): own bucket + one-bit neighbours
+        probes = (self._table_keys + probes).ravel()
+        lo = np.searchsorted(self._sorted_keys, probes, side="left")
+        hi = np.searchsorted(self._sorted_keys, probes, side="right")
+        lengths = hi - lo
+        total = int(lengths.sum())
+        # concatenated ranges [lo, hi) without a Python loop
+        positions = np.arange(total) + np.repeat(lo - (np.cumsum(lengths) - lengths), lengths)
+        found = [self._sorted_slots[positions]]
+        if self._pending:
+            found += [np.asarray(self._pending[p], dtype=np.int32) for p in probes.tolist() if p in self._pending]
+        candidates = np.concatenate(found) if len(found) > 1 else found[0]
+        # a slot found by several probes is scored more than once: cheaper than deduplicating it
+        return candidates[self.alive[candidates]]  # evicted slots are still in the index until the next merge
+
+    def _best(self, vec: np.ndarray) -> tuple[int, float]:
+        candidates = self._candidates(self._hash(vec[None, :])[0])
+        if len(candidates) == 0:
+            return -1, 0.0
+        scores = (self.vectors[candidates].astype(np.float32) @ vec) * self.scales[candidates]
+        i = int(np.argmax(scores))
+        return int(candidates[i]), float(scores[i])
+
+    def _merge(self) -> None:
+        slots = np.flatnonzero(self.alive)
+        keys = self._keys(self.codes[slots]).ravel()           # row-major: slot0 t0..tN, slot1 t0..tN, ...
+        order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[order]
+        self._sorted_slots = np.repeat(slots.astype(np.int32), self.tables)[order]
+        self._pending = {}
+        self._pending_count = 0
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot, _ = self._lru.popitem(last=False)
+        self.alive[slot] = False
+        self.topics[slot] = self.posts[slot] = None
+        self.evictions += 1
+        return slot
+
+    def _store(self, slot: int, vec: np.ndarray, codes: np.ndarray, topic: str, posts: list[str]) -> None:
+        scale = float(np.abs(vec).max()) / 127 or 1.0
+        self.vectors[slot] = np.round(vec / scale)
+        self.scales[slot] = scale
+        self.codes[slot] = codes
+        self.alive[slot] = True
+        self.topics[slot] = topic
+        self.posts[slot] = posts
+        self._turn[slot] = 0
+        self._lru[slot] = None
+
+    # ---- public API ----
+    def get(self, topic: str) -> CacheHit | None:
+        start = time.perf_counter()
+        vec = embed(topic, self.dim)
+        with self._lock:
+            slot, similarity = self._best(vec)
+            self.lookups += 1
+            hit = None
+            if slot >= 0 and similarity >= self.threshold:
+                self.hits += 1
+                self._lru.move_to_end(slot)
+                variants = self.posts[slot]
+                post = variants[self._turn[slot] % len(variants)]
+                self._turn[slot] += 1
+                hit = CacheHit(post=post, similarity=similarity, topic=self.topics[slot])
+            self.lookup_seconds += time.perf_counter() - start
+            return hit
+
+    def put(self, topic: str, post: str) -> None:
+        vec = embed(topic, self.dim)
+        with self._lock:
+            slot, similarity = self._best(vec)
+            if slot >= 0 and similarity >= self.threshold:
+                variants = self.posts[slot]
+                if post not in variants:
+                    variants.append(post)
+                    del variants[:-self.max_variants]
+                self._lru.move_to_end(slot)
+                return
+            codes = self._hash(vec[None, :])[0]
+            slot = self._allocate()
+            self._store(slot, vec, codes, topic, [post])
+            for key in self._keys(codes).tolist():
+                self._pending.setdefault(key, []).append(slot)
+            self._pending_count += 1
+            if self._pending_count >= max(256, len(self._lru) // 8):
+                self._merge()
+
+    def extend(self, topics: list[str], posts: list[list[str]] | list[str], vectors: np.ndarray | None = None) -> None:
+        """Bulk insert (oldest first), without near-duplicate merging: for loading and benchmarks."""
+        if vectors is None:
+            vectors = np.stack([embed(t, self.dim) for t in topics]) if topics else np.empty((0, self.dim))
+        vectors = vectors.astype(np.float32, copy=False)
+        with self._lock:
+            for start in range(0, len(topics), 65_536):
+                batch = vectors[start:start + 65_536]
+                codes = self._hash(batch)
+                for i, topic in enumerate(topics[start:start + 65_536]):
+                    variants = posts[start + i]
+                    self._store(self._allocate(), batch[i], codes[i], topic,
+                                list(variants) if isinstance(variants, list) else [variants])
+            self._merge()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._lru),
+                "capacity": self.capacity,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "evictions": self.evictions,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / self.lookups if self.lookups else 0.0,
+            }
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        with self._lock:
+            order = list(self._lru)  # least recently used first, so loading restores the LRU order
+            config = {"capacity": self.capacity, "threshold": self.threshold, "dim": self.dim,
+                      "tables": self.tables, "bits": self.bits, "max_variants": self.max_variants,
+                      "seed": self.seed}
+            entries = {"topics": [self.topics[s] for s in order], "posts": [self.posts[s] for s in order]}
+            tmp = f"{path}.tmp.npz"
+            np.savez(tmp, vectors=self.vectors[order].astype(np.float32) * self.scales[order, None], config=np.array(json.dumps(config)),
+                     entries=np.array(json.dumps(entries, ensure_ascii=False)))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **overrides) -> "SemanticCache":
+        """Cache from `path`, or an empty one when it doesn't exist; `overrides` win over the saved config."""
+        if not os.path.exists(path):
+            return cls(**overrides)
+        with np.load(path) as data:
+            config = {**json.loads(str(data["config"])), **overrides}
+            entries = json.loads(str(data["entries"]))
+            vectors = data["vectors"]
+        cache = cls(**config)
+        topics, posts = entries["topics"][-cache.capacity:], entries["posts"][-cache.capacity:]
+        if config["dim"] != vectors.shape[1]:  # re-embed when the dimension changed
+            vectors = None
+        else:
+            vectors = vectors[-cache.capacity:] if len(topics) else vectors[:0]
+        cache.extend(topics, posts, vectors)
+        return cache
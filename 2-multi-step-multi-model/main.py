@@ -1,8 +1,13 @@
 import os
+import sys
 import logging
-from dotenv import load_dotenv
-import google.generativeai as genai
-import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from rate_limit import rate_limited_generate
+from chunking import map_concurrently, split_html
+from tracing import span, traced
+from profiling import profile_from_argv
+from prompting import PromptBuilder
 
 
 # --- Setup logging ---
@@ -15,6 +20,7 @@ logging.basicConfig(
 
 def load_api_key() -> str:
     logging.info("🔑 Loading API key...")
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -26,11 +32,14 @@ def load_api_key() -> str:
 
 def configure_genai(api_key: str):
     logging.info("⚙️ Configuring Gemini client...")
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     logging.info("🟢 Gemini client configured")
 
     
+@traced
 def get_html_from_website(url: str) -> str:
+    import requests
     try:
         response = requests.get(url)
         response.raise_for_status()
@@ -40,63 +49,99 @@ def get_html_from_website(url: str) -> str:
         return ""
 
 
+# Pages above this (estimated) size are split between DOM sections and extracted concurrently.
+HTML_CHUNK_TOKENS = 30_000
+PROMPT_OVERHEAD_TOKENS = 1_000  # instructions and tags around a chunk
+# The core content is cut (with a marker) past these, rather than failing the pipeline.
+SUMMARY_PROMPT_TOKENS = int(os.getenv("SUMMARY_PROMPT_TOKENS", "100000"))
+X_POST_PROMPT_TOKENS = int(os.getenv("X_POST_PROMPT_TOKENS", "8000"))
+
+
+@traced
 def extract_core_website_content(html: str) -> str:
-    logging.info("🚀 Sending request to Gemini API...")
-    prompt = f"""
-        You are an expert web content extractor. Your task is to extract the core content from a given HTML page.
-        The core content should be the main text, excluding navigation, footers, and other non-essential elements like scripts etc.
+    chunks = split_html(html, HTML_CHUNK_TOKENS)
+    if len(chunks) == 1:
+        return extract_html_chunk(chunks[0])
+    logging.info(f"🔵 Large page: extracting core content from {len(chunks)} sections concurrently...")
+    parts = map_concurrently(extract_html_chunk, chunks)
+    return "\n\n".join(part.strip() for part in parts if part.strip())
 
-        Here is the HTML content:
-        <html>
-        {html}
-        </html>
 
-        Please extract the core content and return it as plain text.
-    """
-    
+def extract_html_chunk(html: str) -> str:
+    logging.info("🚀 Sending request to Gemini API...")
+    prompt = (
+        PromptBuilder("extract_html_chunk", budget=HTML_CHUNK_TOKENS + PROMPT_OVERHEAD_TOKENS)
+        .text("""
+            You are an expert web content extractor. Your task is to extract the core content from a given HTML page.
+            The core content should be the main text, excluding navigation, footers, and other non-essential elements like scripts etc.
+
+            Here is the HTML content:
+        """)
+        .block("html", html)
+        .text("Please extract the core content and return it as plain text.")
+        .build()
+    )
+
+    import google.generativeai as genai
     model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(prompt)
+    response = rate_limited_generate(model, prompt)
     logging.info("🟢 Response received from Gemini API")
     return response.text
 
 
+@traced
 def summarize_content(content: str) -> str:
-    prompt = f"""
-    You are an expert summarizer. Your task is to summarize the provided content into a concise and clear summary.
-
-    Here is the content to summarize:
-    <content>
-    {content}
-    </content>
-
-    Please provide a brief summary of the main points in the content in Vietnamese language. Prefer bullet points and avoid unncessary explanations.
-    """
+    prompt = (
+        PromptBuilder("summarize_content", budget=SUMMARY_PROMPT_TOKENS, overflow="truncate")
+        .text("""
+            You are an expert summarizer. Your task is to summarize the provided content into a concise and clear summary.
+
+            Here is the content to summarize:
+        """)
+        .block("content", content, truncatable=True)
+        .text("Please provide a brief summary of the main points in the content in Vietnamese language. "
+              "Prefer bullet points and avoid unncessary explanations.")
+        .build()
+    )
+    import google.generativeai as genai
     model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(prompt)
+    response = rate_limited_generate(model, prompt)
     logging.info("🟢 Response received from Gemini API")
     return response.text
 
+@traced
 def generate_x_post(summary: str) -> str:
-    prompt = f"""
-    You are an expert content creator. Your task is to generate a social media post based on the provided summary.
-
-    Here is the summary to base the post on:
-    <summary>
-    {summary}
-    </summary>
-
-    Please create a catchy and engaging social media post in Vietnamese language.
-    """
+    prompt = (
+        PromptBuilder("generate_x_post", budget=X_POST_PROMPT_TOKENS, overflow="truncate")
+        .text("""
+            You are an expert content creator. Your task is to generate a social media post based on the provided summary.
+
+            Here is the summary to base the post on:
+        """)
+        .block("summary", summary, truncatable=True)
+        .text("Please create a catchy and engaging social media post in Vietnamese language.")
+        .build()
+    )
+    import google.generativeai as genai
     model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content(prompt)
+    response = rate_limited_generate(model, prompt)
     logging.info("🟢 Response received from Gemini API")
     return response.text
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        print("Usage: python main.py [website_url]    (asks for the URL when omitted)")
+        return
+
+    website_url = sys.argv[1] if len(sys.argv) > 1 else input("Website URL: ")
     api_key = load_api_key()
     configure_genai(api_key)
-    
-    website_url = input("Website URL: ")
+
+    with span("x_post_pipeline", url=website_url):
+        run_pipeline(website_url)
+
+
+def run_pipeline(website_url: str) -> None:
     logging.info("🚀 Fetching website HTML...")
     try:
         html_content = get_html_from_website(website_url)
@@ -127,5 +172,6 @@ def main():
     logging.info(f"🟢 X Post saved to {x_post_file}")
 
 if __name__ == "__main__":
-    main()
+    with profile_from_argv():
+        main()
 # https://vietnamnet.vn/dan-xe-phao-quan-su-khung-hung-huc-khi-the-trong-buoi-tong-duyet-dieu-binh-2437891.html
\ No newline at end of file
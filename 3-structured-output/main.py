@@ -1,14 +1,15 @@
-import json
 import sys
 import os
-import sqlite3
-import google.generativeai as genai
-
-from pypdf import PdfReader
-from dotenv import load_dotenv
-import requests
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from rate_limit import rate_limited_generate
+from structured import build_field_reprompt, merge_fields, optional_schema, parse_lenient, repair_against_schema
+from chunking import PAGE_BREAK, map_concurrently, merge_partial_records, split_text
+from tracing import span, traced
+from profiling import profile_from_argv
+from prompting import PromptBuilder
+
 
 # --- Setup logging ---
 logging.basicConfig(
@@ -20,6 +21,7 @@ logging.basicConfig(
 
 # --- Setup database ---
 def setup_database():
+    import sqlite3
     conn = sqlite3.connect("invoices.db")
     cursor = conn.cursor()
     cursor.execute('''
@@ -72,6 +74,7 @@ invoice_schema = {
 
 def load_api_key() -> str:
     logging.info("🔑 Loading API key...")
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -83,33 +86,50 @@ def load_api_key() -> str:
 
 def configure_genai(api_key: str):
     logging.info("⚙️ Configuring Gemini client...")
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     logging.info("🟢 Gemini client configured")
 
 
+@traced
 def get_pdf_content(pdf_path: str) -> str:
+    from pypdf import PdfReader
     with open(pdf_path, "rb") as f:
         reader = PdfReader(f)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+        # keep page boundaries so oversized invoices can be chunked per page
+        return PAGE_BREAK.join(page.extract_text() for page in reader.pages)
+
 
+# Invoices above this (estimated) size are split per page and extracted concurrently.
+INVOICE_CHUNK_TOKENS = 30_000
+PROMPT_OVERHEAD_TOKENS = 1_000  # instructions and tags around a chunk
 
+
+@traced
 def extract_invoice_details(pdf_content: str) -> dict:
-    prompt = f"""
-    You are an expert data extractor who excels at analyzing invoices.
+    chunks = split_text(pdf_content, INVOICE_CHUNK_TOKENS, [PAGE_BREAK, "\n\n", "\n"])
+    if len(chunks) > 1:
+        logging.info(f"🔵 Large invoice: extracting from {len(chunks)} chunks concurrently...")
+        partials = map_concurrently(extract_invoice_chunk, [(i, len(chunks), c) for i, c in enumerate(chunks, start=1)])
+        logging.info("🟢 Chunk responses received from Gemini API")
+        # totals are printed at the end of an invoice, so for those the last chunk wins
+        invoice_data = merge_partial_records(partials, prefer_last=("totalAmount", "tax"))
+        return validate_invoice_data(PAGE_BREAK.join([chunks[0], chunks[-1]]), invoice_data)
 
-    Extract all relevant data from the below invoice content (which was extracted from a PDF document).
-    Make sure to capture data like vendor name, date, amount, tax, tax IDs etc.
+    prompt = (
+        PromptBuilder("extract_invoice_details", budget=INVOICE_CHUNK_TOKENS + PROMPT_OVERHEAD_TOKENS)
+        .text("""
+            You are an expert data extractor who excels at analyzing invoices.
 
-    <invoice-content>
-    {pdf_content}
-    </invoice-content>
+            Extract all relevant data from the below invoice content (which was extracted from a PDF document).
+            Make sure to capture data like vendor name, date, amount, tax, tax IDs etc.
+        """)
+        .block("invoice-content", pdf_content)
+        .text("Return your response as a JSON object without any extra text or explanation.")
+        .build()
+    )
 
-    Return your response as a JSON object without any extra text or explanation.
-    """
-    
+    import google.generativeai as genai
     model = genai.GenerativeModel(
         model_name="gemini-1.5-flash",
         generation_config={
@@ -117,13 +137,61 @@ def extract_invoice_details(pdf_content: str) -> dict:
             "response_mime_type": "application/json",
         }
     )
-    response = model.generate_content(prompt)
+    response = rate_limited_generate(model, prompt)
     logging.info("🟢 Response received from Gemini API")
-    return response.text
+    return validate_invoice_data(pdf_content, parse_lenient(response.text))
+
+
+def extract_invoice_chunk(numbered_chunk: tuple[int, int, str]) -> dict:
+    index, total, chunk = numbered_chunk
+    prompt = (
+        PromptBuilder(f"extract_invoice_chunk[{index}/{total}]", budget=INVOICE_CHUNK_TOKENS + PROMPT_OVERHEAD_TOKENS)
+        .text(f"""
+            You are an expert data extractor who excels at analyzing invoices.
+
+            Below is part {index} of {total} of a long invoice (text extracted from a PDF document).
+            Extract the invoice data that appears in THIS part: vendor name, date, amount, tax, tax IDs etc.
+            Leave out any field that does not appear in this part.
+        """)
+        .block("invoice-content", chunk)
+        .text("Return your response as a JSON object without any extra text or explanation.")
+        .build()
+    )
+    import google.generativeai as genai
+    model = genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        generation_config={
+            "response_schema": optional_schema(invoice_schema),
+            "response_mime_type": "application/json",
+        }
+    )
+    return parse_lenient(rate_limited_generate(model, prompt).text)
+
+
+def validate_invoice_data(pdf_content: str, invoice_data: dict) -> dict:
+    invoice_data, invalid_fields = repair_against_schema(invoice_data, invoice_schema)
+    # "$": the answer isn't a JSON object at all, so there are no fields to re-prompt for
+    if invalid_fields and "$" not in invalid_fields:
+        logging.info(f"🟡 Re-prompting Gemini for invalid fields only: {', '.join(invalid_fields)}")
+        prompt, schema = build_field_reprompt(pdf_content, invoice_schema, invalid_fields)
+        import google.generativeai as genai
+        model = genai.GenerativeModel(
+            model_name="gemini-1.5-flash",
+            generation_config={
+                "response_schema": schema,
+                "response_mime_type": "application/json",
+            }
+        )
+        patch = parse_lenient(rate_limited_generate(model, prompt).text)
+        invoice_data, invalid_fields = repair_against_schema(
+            merge_fields(invoice_data, patch, invalid_fields), invoice_schema)
+    if invalid_fields:
+        raise ValueError(f"Invalid invoice fields in Gemini response: {', '.join(invalid_fields)}")
+    return invoice_data
 
 
-def insert_invoice_data(conn, invoice_data):
-    invoice_data = json.loads(invoice_data) # parse str to dict
+@traced
+def insert_invoice_data(conn, invoice_data: dict):
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO invoices (
@@ -149,10 +217,7 @@ def insert_invoice_data(conn, invoice_data):
 
     
 def main():
-    api_key = load_api_key()
-    configure_genai(api_key)
-    
-    if len(sys.argv) < 2:
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
         print("Usage: python main.py /path/to/file_or_folder")
         return
     
@@ -178,15 +243,19 @@ def main():
         print("No PDF files found.")
         return
 
+    # only now pay for dotenv / the Gemini SDK: usage errors and empty folders exit before this
+    api_key = load_api_key()
+    configure_genai(api_key)
     conn = setup_database()
     
 
     for pdf_file in pdf_files:
         print(f"Processing {pdf_file}...")
         try:
-            pdf_content = get_pdf_content(pdf_file)
-            invoice_details = extract_invoice_details(pdf_content)
-            insert_invoice_data(conn, invoice_details)
+            with span("process_invoice", file=pdf_file):
+                pdf_content = get_pdf_content(pdf_file)
+                invoice_details = extract_invoice_details(pdf_content)
+                insert_invoice_data(conn, invoice_details)
             print("Extracted Invoice Details:")
             print(invoice_details)
         except Exception as e:
@@ -196,4 +265,5 @@ def main():
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_from_argv():
+        main()
\ No newline at end of file
@@ -0,0 +1,327 @@
+"""Bulk invoice extraction through a batch job instead of one request per PDF.
+
+    python batch.py pdfs/                # Gemini Batch API (needs `google-genai`)
+    python batch.py pdfs/ --fake         # offline: local fake batch service + mock LLM
+
+Every prompt is written to <job-dir>/requests.jsonl and submitted as one job.
+The job is polled until it finishes, then the results are validated (and
+locally repaired) against `Invoice` and loaded into invoices.db. Re-running
+the same command after a crash resumes: an already submitted job is polled
+again (not resubmitted) and rows that were already loaded are skipped.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+
+from main import (
+    INSERT_INVOICE_SQL,
+    INVOICE_GENERATION_CONFIG,
+    INVOICE_MODEL_NAME,
+    build_extraction_prompt,
+    get_pdf_content,
+    invoice_row,
+    load_api_key,
+    setup_database,
+)
+from profiling import profile_from_argv
+from validation import parse_invoice
+
+FINISHED_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+LOAD_CHUNK_SIZE = 500
+
+
+# ========== Job file ==========
+def find_pdfs(path: str) -> list[str]:
+    if os.path.isfile(path):
+        return [path] if path.lower().endswith(".pdf") else []
+    return sorted(
+        os.path.join(path, filename)
+        for filename in os.listdir(path)
+        if filename.lower().endswith(".pdf")
+    )
+
+
+def write_job_file(pdf_files: list[str], job_file: str, skipped: list | None = None) -> int:
+    """One Gemini batch request per PDF, keyed by its path; returns how many were written.
+
+    A PDF that can't be read (corrupt, encrypted) is left out and appended to `skipped` as {"key", "error"}.
+    """
+    written = 0
+    tmp_file = job_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        for pdf_file in pdf_files:
+            try:
+                pdf_content = get_pdf_content(pdf_file)
+            except Exception as e:
+                logging.error(f"🔴 {pdf_file}: {e}, left out of the job")
+                if skipped is not None:
+                    skipped.append({"key": pdf_file, "error": f"unreadable PDF: {e}"})
+                continue
+            # batch requests aren't split into chunks, so the whole document goes in, without a budget
+            prompt = build_extraction_prompt(pdf_content, budget=None)
+            request = {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "generation_config": INVOICE_GENERATION_CONFIG,
+            }
+            f.write(json.dumps({"key": pdf_file, "request": request}, ensure_ascii=False) + "\n")
+            written += 1
+    os.replace(tmp_file, job_file)  # a crash mid-write never leaves a half job file behind
+    return written
+
+
+def response_text(result: dict) -> str:
+    parts = result["response"]["candidates"][0]["content"]["parts"]
+    return "".join(part.get("text", "") for part in parts)
+
+
+# ========== Batch services ==========
+class LocalBatchService:
+    """Fake batch backend: consumes the job file itself, a slice per poll."""
+
+    def __init__(self, root: str, requests_per_poll: int = 50):
+        self.root = root
+        self.requests_per_poll = requests_per_poll
+        os.makedirs(root, exist_ok=True)
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def submit(self, job_file: str, model: str) -> str:
+        job_id = f"local-{uuid.uuid4().hex[:12]}"
+        job = {"input": os.path.abspath(job_file), "output": os.path.join(self.root, f"{job_id}.results.jsonl"),
+               "model": model, "state": "JOB_STATE_PENDING"}
+        with open(self._job_path(job_id), "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        with open(self._job_path(job_id), encoding="utf-8") as f:
+            job = json.load(f)
+        if job["state"] in FINISHED_STATES:
+            return job["state"]
+
+        done = set()
+        if os.path.exists(job["output"]):
+            with open(job["output"], encoding="utf-8") as f:
+                done = {json.loads(line)["key"] for line in f if line.strip()}
+
+        import google.generativeai as genai
+        from rate_limit import rate_limited_generate
+
+        processed = 0
+        with open(job["input"], encoding="utf-8") as src, open(job["output"], "a", encoding="utf-8") as out:
+            for line in src:
+                item = json.loads(line)
+                if item["key"] in done:
+                    continue
+                if processed == self.requests_per_poll:
+                    job["state"] = "JOB_STATE_RUNNING"
+                    break
+                request = item["request"]
+                model = genai.GenerativeModel(model_name=job["model"], generation_config=request["generation_config"])
+                try:
+                    response = rate_limited_generate(model, request["contents"][0]["parts"][0]["text"])
+                    result = {"key": item["key"], "response": {"candidates": [{"content": {"parts": [{"text": response.text}]}}]}}
+                except Exception as e:
+                    result = {"key": item["key"], "error": {"message": str(e)}}
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                processed += 1
+            else:
+                job["state"] = "JOB_STATE_SUCCEEDED"
+
+        with open(self._job_path(job_id), "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        return job["state"]
+
+    def results(self, job_id: str):
+        with open(self._job_path(job_id), encoding="utf-8") as f:
+            job = json.load(f)
+        with open(job["output"], encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class GeminiBatchService:
+    """Gemini Batch API. Lives in the newer `google-genai` SDK, imported lazily."""
+
+    def __init__(self, api_key: str):
+        try:
+            from google import genai as genai_sdk
+        except ImportError:
+            raise ImportError("Batch mode needs the google-genai package: uv add google-genai") from None
+        self.client = genai_sdk.Client(api_key=api_key)
+
+    def submit(self, job_file: str, model: str) -> str:
+        uploaded = self.client.files.upload(
+            file=job_file,
+            config={"display_name": os.path.basename(job_file), "mime_type": "jsonl"},
+        )
+        job = self.client.batches.create(model=model, src=uploaded.name,
+                                         config={"display_name": f"invoices-{int(time.time())}"})
+        return job.name
+
+    def poll(self, job_id: str) -> str:
+        return self.client.batches.get(name=job_id).state.name
+
+    def results(self, job_id: str):
+        job = self.client.batches.get(name=job_id)
+        content = self.client.files.download(file=job.dest.file_name)
+        for line in content.decode("utf-8").splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+
+# ========== State ==========
+def load_state(job_dir: str) -> dict | None:
+    path = os.path.join(job_dir, "state.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(job_dir: str, state: dict) -> None:
+    path = os.path.join(job_dir, "state.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# ========== Loading ==========
+def setup_batch_tables(conn) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS batch_loaded (
+            job_id TEXT,
+            request_key TEXT,
+            invoice_id INTEGER,
+            PRIMARY KEY (job_id, request_key)
+        )
+    ''')
+    conn.commit()
+
+
+def load_results(conn, service, job_id: str, failed_file: str, skipped: list | None = None) -> tuple[int, int]:
+    """Validate every result against Invoice and insert the new ones; returns (loaded, failed).
+
+    `skipped` (PDFs left out of the job) are written to `failed_file` first and counted as failed.
+    """
+    setup_batch_tables(conn)
+    already_loaded = {key for (key,) in conn.execute(
+        "SELECT request_key FROM batch_loaded WHERE job_id = ?", (job_id,))}
+
+    loaded = failed = 0
+    pending = []
+    with open(failed_file, "w", encoding="utf-8") as failures:
+        for failure in skipped or []:
+            failed += 1
+            failures.write(json.dumps(failure, ensure_ascii=False) + "\n")
+        for result in service.results(job_id):
+            key = result["key"]
+            if key in already_loaded:
+                continue
+            try:
+                if "error" in result:
+                    raise ValueError(result["error"].get("message", result["error"]))
+                invoice_obj, _, invalid_fields = parse_invoice(response_text(result))
+                if invalid_fields:
+                    raise ValueError(f"invalid fields: {', '.join(invalid_fields)}")
+                pending.append((key, invoice_obj))
+            except Exception as e:
+                failed += 1
+                failures.write(json.dumps({"key": key, "error": str(e)}, ensure_ascii=False) + "\n")
+                continue
+            if len(pending) >= LOAD_CHUNK_SIZE:
+                loaded += _insert_chunk(conn, job_id, pending)
+                pending = []
+        loaded += _insert_chunk(conn, job_id, pending)
+    return loaded, failed
+
+
+def _insert_chunk(conn, job_id: str, pending: list) -> int:
+    # invoice rows and their "loaded" markers commit together, so a crash can't double-insert
+    with conn:
+        for key, invoice_obj in pending:
+            cursor = conn.execute(INSERT_INVOICE_SQL, invoice_row(invoice_obj))
+            conn.execute("INSERT INTO batch_loaded (job_id, request_key, invoice_id) VALUES (?, ?, ?)",
+                         (job_id, key, cursor.lastrowid))
+    return len(pending)
+
+
+# ========== CLI ==========
+def run_batch(path: str, job_dir: str, fake: bool, poll_interval: float, model: str) -> None:
+    os.makedirs(job_dir, exist_ok=True)
+    if fake:
+        import mock_llm
+        mock_llm.install_genai()
+        service = LocalBatchService(os.path.join(job_dir, "local_service"))
+    else:
+        service = GeminiBatchService(load_api_key())
+
+    state = load_state(job_dir)
+    if state and state.get("loaded"):
+        logging.info(f"🔵 Job {state['job_id']} in '{job_dir}' is already loaded. Use a new --job-dir for a new batch.")
+        return
+
+    if state is None:
+        pdf_files = find_pdfs(path)
+        if not pdf_files:
+            print("No PDF files found.")
+            return
+        job_file = os.path.join(job_dir, "requests.jsonl")
+        logging.info(f"🚀 Writing {len(pdf_files)} extraction requests to {job_file}...")
+        skipped = []
+        requests = write_job_file(pdf_files, job_file, skipped)
+        if not requests:
+            logging.error(f"🔴 None of the {len(pdf_files)} PDFs could be read, nothing to submit")
+            return
+        job_id = service.submit(job_file, model)
+        state = {"job_id": job_id, "job_file": job_file, "fake": fake, "requests": requests, "skipped": skipped,
+                 "loaded": False}
+        save_state(job_dir, state)
+        logging.info(f"🟢 Submitted batch job {job_id}")
+    else:
+        logging.info(f"🔵 Resuming batch job {state['job_id']}")
+
+    job_id = state["job_id"]
+    while (job_state := service.poll(job_id)) not in FINISHED_STATES:
+        logging.info(f"⏳ Job {job_id}: {job_state}")
+        time.sleep(poll_interval)
+
+    if job_state != "JOB_STATE_SUCCEEDED":
+        logging.error(f"🔴 Job {job_id} ended in {job_state}")
+        return
+
+    conn = setup_database()
+    try:
+        loaded, failed = load_results(conn, service, job_id, os.path.join(job_dir, "failed.jsonl"),
+                                      state.get("skipped"))
+    finally:
+        conn.close()
+    state["loaded"] = True
+    save_state(job_dir, state)
+    logging.info(f"✅ Loaded {loaded} invoices into invoices.db ({failed} unreadable or failed validation, see failed.jsonl)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract invoices from a folder of PDFs as one batch job.")
+    parser.add_argument("path", help="PDF file or folder")
+    parser.add_argument("--job-dir", default="batch_job", help="where the job file and resume state live")
+    parser.add_argument("--fake", action="store_true", help="use the local fake batch service and mock LLM (offline)")
+    parser.add_argument("--poll-interval", type=float, default=30.0)
+    parser.add_argument("--model", default=INVOICE_MODEL_NAME)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Error: The path '{args.path}' does not exist.")
+        return
+    run_batch(args.path, args.job_dir, args.fake, 0.0 if args.fake else args.poll_interval, args.model)
+
+
+if __name__ == "__main__":
+    with profile_from_argv():
+        main()
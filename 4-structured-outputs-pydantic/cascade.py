@@ -0,0 +1,230 @@
+"""Cascade mode: extract with the cheapest model first, escalate only when its answer is wrong.
+
+    python cascade.py pdfs/
+    INVOICE_MODEL_LADDER=gemini-1.5-flash-8b,gemini-1.5-flash,gemini-1.5-pro python cascade.py pdfs/
+    python cascade.py pdfs/ --fake --repeat 50          # offline, mock models of different quality (nothing stored)
+
+Each PDF goes to the first model of the ladder. Its answer is accepted when it
+validates as an `Invoice` and passes the cross-field checks in
+`validation.consistency_errors` (tax not above the total, well-formed tax IDs,
+a parseable date, ...). Otherwise the next, stronger model gets the document.
+Only the last tier re-prompts for invalid fields; earlier tiers escalate
+straight away, since the stronger model is the better fix.
+
+The report shows, per tier, how many documents it was tried on and resolved,
+and its average latency and cost, next to the documents a vendor template or
+the dedup index answered without a model call. Cost comes from the token usage
+the API reports, priced with MODEL_PRICES.
+
+--fake and --repeat are for benchmarking the ladder: they imply --no-store,
+so mock invoices stay out of invoices.db and repeats reach the models instead
+of being answered by the dedup index.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+
+from main import (
+    DuplicateInvoice,
+    configure_genai,
+    extract_invoice,
+    extract_invoice_details,
+    get_pdf_content,
+    insert_invoice_data,
+    load_api_key,
+    open_dedup,
+    open_templates,
+    setup_database,
+)
+from rate_limit import track_usage
+from profiling import profile_from_argv
+from tracing import span
+
+DEFAULT_LADDER = ["gemini-1.5-flash-8b", "gemini-1.5-flash", "gemini-1.5-pro"]
+# USD per 1M tokens (input, output), prompts up to 128k tokens
+MODEL_PRICES = {
+    "gemini-1.5-flash-8b": (0.0375, 0.15),
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-1.5-pro": (1.25, 5.00),
+    "gemini-2.0-flash": (0.10, 0.40),
+}
+
+
+def model_ladder(value: str | None = None) -> list[str]:
+    """INVOICE_MODEL_LADDER (comma separated, cheapest first), or DEFAULT_LADDER."""
+    value = os.getenv("INVOICE_MODEL_LADDER", "") if value is None else value
+    ladder = [model.strip() for model in value.split(",") if model.strip()]
+    return ladder or list(DEFAULT_LADDER)
+
+
+def call_cost(model: str, prompt_tokens: int, output_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model.removeprefix("models/"), (0.0, 0.0))
+    return (prompt_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+# ========== Cascade ==========
+class Cascade:
+    def __init__(self, ladder: list[str] | None = None):
+        self.ladder = ladder or model_ladder()
+        self.tiers = {model: {"tried": 0, "resolved": 0, "escalated": 0, "seconds": 0.0, "cost": 0.0}
+                      for model in self.ladder}
+        self.failed = 0
+        self._lock = threading.Lock()
+        unpriced = [model for model in self.ladder if model.removeprefix("models/") not in MODEL_PRICES]
+        if unpriced:
+            logging.warning(f"🟡 No price for {', '.join(unpriced)}: their cost is reported as 0")
+
+    def extract(self, pdf_content: str):
+        from validation import consistency_errors
+
+        problems = []
+        for i, model in enumerate(self.ladder):
+            last = i == len(self.ladder) - 1
+            start = time.monotonic()
+            with span("cascade.tier", model=model, tier=i) as tier, track_usage() as usage:
+                try:
+                    invoice_obj = extract_invoice_details(pdf_content, model_name=model, reprompt=last)
+                    errors = consistency_errors(invoice_obj)
+                except ValueError as e:  # invalid fields the model couldn't fix
+                    invoice_obj, errors = None, [str(e)]
+                tier.set("errors", "; ".join(errors))
+            cost = sum(call_cost(c["model"] or model, c["prompt_tokens"], c["output_tokens"]) for c in usage.calls)
+            with self._lock:
+                stats = self.tiers[model]
+                stats["tried"] += 1
+                stats["seconds"] += time.monotonic() - start
+                stats["cost"] += cost
+                stats["resolved" if not errors else "escalated"] += 1
+            if not errors:
+                return invoice_obj
+            problems.append(f"{model}: {'; '.join(errors)}")
+            if not last:
+                logging.info(f"🟡 {model} answer rejected ({'; '.join(errors)}), escalating to {self.ladder[i + 1]}")
+        with self._lock:
+            self.failed += 1
+        raise ValueError(f"No model in the ladder produced a consistent invoice ({' | '.join(problems)})")
+
+    def report(self) -> dict:
+        with self._lock:
+            tiers = []
+            for model, stats in self.tiers.items():
+                tried = stats["tried"]
+                tiers.append({
+                    "model": model,
+                    "tried": tried,
+                    "resolved": stats["resolved"],
+                    "escalated": stats["escalated"] if model != self.ladder[-1] else 0,
+                    "avg_latency_s": stats["seconds"] / tried if tried else 0.0,
+                    "avg_cost": stats["cost"] / tried if tried else 0.0,
+                    "cost": stats["cost"],
+                })
+            return {"tiers": tiers, "failed": self.failed, "cost": sum(t["cost"] for t in tiers)}
+
+
+def print_report(report: dict, documents: int, template_hits: int = 0, dedup_hits: int = 0) -> None:
+    header = f"{'tier':<24}{'tried':>7}{'resolved':>10}{'escalated':>11}{'avg s':>9}{'avg cost $':>13}{'cost $':>11}"
+    print(header)
+    print("-" * len(header))
+    if template_hits:
+        print(f"{'(vendor template)':<24}{template_hits:>7}{template_hits:>10}{0:>11}{'-':>9}{0:>13.6f}{0:>11.6f}")
+    if dedup_hits:
+        print(f"{'(duplicate)':<24}{dedup_hits:>7}{dedup_hits:>10}{0:>11}{'-':>9}{0:>13.6f}{0:>11.6f}")
+    for t in report["tiers"]:
+        print(f"{t['model'][:23]:<24}{t['tried']:>7}{t['resolved']:>10}{t['escalated']:>11}"
+              f"{t['avg_latency_s']:>9.2f}{t['avg_cost']:>13.6f}{t['cost']:>11.6f}")
+    extracted = report["tiers"][0]["tried"] if report["tiers"] else 0
+    per_doc = report["cost"] / extracted if extracted else 0.0
+    print(f"\n{documents} documents, {extracted} sent to the ladder, {report['failed']} failed on every tier, "
+          f"${report['cost']:.6f} total (${per_doc:.6f} per extracted document)")
+    top = report["tiers"][-1]
+    if top["tried"] and len(report["tiers"]) > 1:
+        print(f"{top['model']} alone would have cost about ${top['avg_cost'] * extracted:.6f}")
+
+
+# ========== CLI ==========
+def install_fake_ladder(ladder: list[str], latency: float) -> None:
+    """Mock models that get slower, pricier and more reliable up the ladder."""
+    import mock_llm
+
+    tiers = len(ladder)
+    mock_llm.install_genai(mock_llm.MockConfig(
+        seed=7,
+        model_latency={model: latency * 3 ** i for i, model in enumerate(ladder)},
+        sloppiness={model: 0.3 * (tiers - 1 - i) / max(tiers - 1, 1) for i, model in enumerate(ladder)},
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract invoices with a cheapest-first model cascade.")
+    parser.add_argument("path", help="PDF file or folder")
+    parser.add_argument("--ladder", help="comma separated models, cheapest first (default: INVOICE_MODEL_LADDER)")
+    parser.add_argument("--no-store", action="store_true", help="don't insert into invoices.db (no templates, no dedup)")
+    parser.add_argument("--repeat", type=int, default=1, help="process every PDF this many times (benchmarking, implies --no-store)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--fake", action="store_true", help="use mock models (offline, implies --no-store)")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="latency of the cheapest mock model")
+    args = parser.parse_args()
+
+    from batch import find_pdfs
+
+    if not os.path.exists(args.path):
+        print(f"Error: The path '{args.path}' does not exist.")
+        return
+    pdf_files = find_pdfs(args.path)
+    if not pdf_files:
+        print("No PDF files found.")
+        return
+
+    cascade = Cascade(model_ladder(args.ladder))
+    logging.info(f"🚀 Model ladder: {' -> '.join(cascade.ladder)}")
+    if args.fake:
+        install_fake_ladder(cascade.ladder, args.fake_latency)
+    else:
+        configure_genai(load_api_key())
+    if (args.fake or args.repeat > 1) and not args.no_store:
+        logging.info("🟡 --fake/--repeat: nothing is stored, templates and dedup are off")
+        args.no_store = True
+    conn = None if args.no_store else setup_database()
+    templates = open_templates() if conn is not None else None  # templates learn from stored runs only
+    dedup = open_dedup() if conn is not None else None
+
+    documents = 0
+    for pdf_file in pdf_files * args.repeat:
+        documents += 1
+        try:
+            with span("process_invoice", file=pdf_file, mode="cascade"):
+                pdf_content = get_pdf_content(pdf_file)
+                invoice_obj = extract_invoice(pdf_content, templates, extract=cascade.extract,
+                                              dedup=dedup, source=pdf_file)
+                if conn is not None:
+                    insert_invoice_data(conn, invoice_obj)
+                    if dedup is not None:
+                        dedup.add(pdf_content, invoice_obj, pdf_file)
+        except DuplicateInvoice:
+            pass  # logged by the dedup index, nothing new to store
+        except Exception as e:
+            logging.error(f"🔴 {pdf_file}: {e}")
+
+    report = cascade.report()
+    template_hits = templates.stats["hits"] if templates is not None else 0
+    dedup_hits = dedup.stats["exact"] + dedup.stats["near"] if dedup is not None else 0
+    if args.json:
+        print(json.dumps({**report, "documents": documents, "template_hits": template_hits,
+                          "dedup_hits": dedup_hits}, indent=2))
+    else:
+        print_report(report, documents, template_hits, dedup_hits)
+    if templates is not None:
+        templates.close()
+    if dedup is not None:
+        logging.info(f"🔵 Duplicates: {dedup.stats}")
+        dedup.close()
+    if conn is not None:
+        conn.close()
+
+
+if __name__ == "__main__":
+    with profile_from_argv():
+        main()
@@ -0,0 +1,289 @@
+"""Near-duplicate invoices: a re-sent scan or reminder copy reuses the first extraction instead of the LLM.
+
+    python main.py pdfs/                      # duplicates are detected as invoices go by
+    python dedup.py check pdfs/invoice1.pdf   # closest document already processed
+    python dedup.py duplicates                # every duplicate seen, with what it matched
+    python dedup.py stats
+
+Copies of one invoice differ by a few bytes (print date, "REMINDER", a
+scanner footer), so an exact hash misses them. Every stored document's
+text (from `get_pdf_content`) is cut into word 3-shingles and summarized by a
+128-value MinHash signature; LSH splits the signature into 16 bands of 8, and
+documents sharing any band become candidates. A lookup is one exact-hash probe
+plus 16 indexed band probes, each capped at MAX_BUCKET candidates, so its cost
+doesn't grow with the archive. Candidates are then scored by signature
+agreement (an estimate of the Jaccard similarity of the shingle sets).
+
+A candidate above the threshold (INVOICE_DEDUP_THRESHOLD, default 0.85) only
+counts as the same invoice if its invoice number and vendor tax ID also
+appear in the new text: next month's invoice from the same vendor has the
+same layout and most of the same words, but not the same number.
+
+INVOICE_DEDUP decides what happens to a duplicate; either way there is no LLM
+call and no second row in invoices.db:
+- reuse (default): the first extraction is returned as the result,
+- flag: it is reported as a duplicate for review, with no result,
+- 0: detection off.
+
+The index lives in a sidecar database next to invoices.db (invoices.dedup.db).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from duplicates import DuplicateInvoice
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+MAX_BUCKET = 32           # newest documents checked per band bucket
+THRESHOLD = float(os.getenv("INVOICE_DEDUP_THRESHOLD", "0.85"))
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+(?:[.,/-]\w+)*")
+
+
+def dedup_mode() -> str | None:
+    """'reuse', 'flag', or None when INVOICE_DEDUP turns detection off."""
+    mode = os.getenv("INVOICE_DEDUP", "reuse").strip().lower()
+    if mode in ("0", "false", "off", ""):
+        return None
+    if mode not in ("reuse", "flag"):
+        logging.warning(f"🟡 Unknown INVOICE_DEDUP={mode!r}, using 'reuse'")
+        return "reuse"
+    return mode
+
+
+def sidecar_path(db_path: str = "invoices.db") -> str:
+    root, _ = os.path.splitext(db_path)
+    return f"{root}.dedup.db"
+
+
+# ========== MinHash ==========
+def _permutations(seed: int = 1) -> list[tuple[int, int]]:
+    import random
+
+    rng = random.Random(seed)
+    return [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+_PERMS = _permutations()
+
+
+def normalize(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def shingles(text: str) -> set[int]:
+    words = normalize(text)
+    if len(words) < SHINGLE:
+        words = words + [""] * (SHINGLE - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE]).encode(), digest_size=4).digest(), "big")
+        for i in range(len(words) - SHINGLE + 1)
+    }
+
+
+def signature(text: str) -> array:
+    hashes = shingles(text)
+    return array("Q", [min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMS])
+
+
+def band_keys(sig: array) -> list[int]:
+    """One signed 64-bit key per band (sqlite INTEGER), the band number mixed in."""
+    keys = []
+    for band in range(BANDS):
+        data = array("Q", [band]) + sig[band * ROWS:(band + 1) * ROWS]
+        keys.append(int.from_bytes(hashlib.blake2b(data.tobytes(), digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def similarity(a: array, b: array) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(normalize(text)).encode()).hexdigest()
+
+
+def _mentions(text: str, value) -> bool:
+    words = normalize(str(value or ""))
+    if not words:
+        return True  # nothing to compare against
+    return f" {' '.join(words)} " in f" {' '.join(normalize(text))} "
+
+
+# ========== Index ==========
+@dataclass
+class DedupMatch:
+    doc_id: int
+    similarity: float
+    source: str | None
+    invoice_json: str
+
+    @property
+    def invoice(self):
+        from models import Invoice
+        return Invoice.model_validate_json(self.invoice_json)
+
+
+class DedupIndex:
+    """MinHash/LSH index in the sidecar database; safe to share between worker threads."""
+
+    def __init__(self, db_path: str = "invoices.db", threshold: float = THRESHOLD, mode: str = "reuse"):
+        self.threshold = threshold
+        self.mode = mode
+        self.path = sidecar_path(db_path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS dedup_documents (
+                    id INTEGER PRIMARY KEY,
+                    text_sha256 TEXT NOT NULL UNIQUE,
+                    signature BLOB NOT NULL,
+                    invoice TEXT NOT NULL,
+                    source TEXT,
+                    created_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS dedup_bands (
+                    band_key INTEGER NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    PRIMARY KEY (band_key, doc_id)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS dedup_duplicates (
+                    id INTEGER PRIMARY KEY,
+                    doc_id INTEGER NOT NULL,
+                    source TEXT,
+                    similarity REAL NOT NULL,
+                    action TEXT NOT NULL,
+                    seen_at TEXT
+                );
+            ''')
+        self.stats = {"exact": 0, "near": 0, "rejected": 0, "misses": 0, "added": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def find(self, text: str, sig: array | None = None) -> DedupMatch | None:
+        """The best already-processed document this text is a copy of, or None."""
+        with self._lock:
+            row = self.conn.execute("SELECT id, source, invoice FROM dedup_documents WHERE text_sha256 = ?",
+                                    (text_hash(text),)).fetchone()
+        if row is not None:
+            self._count("exact")
+            return DedupMatch(row[0], 1.0, row[1], row[2])
+
+        sig = sig or signature(text)
+        with self._lock:
+            candidates = {doc_id for key in band_keys(sig) for (doc_id,) in self.conn.execute(
+                "SELECT doc_id FROM dedup_bands WHERE band_key = ? ORDER BY doc_id DESC LIMIT ?", (key, MAX_BUCKET))}
+            placeholders = ",".join("?" * len(candidates))
+            rows = self.conn.execute(
+                f"SELECT id, signature, source, invoice FROM dedup_documents WHERE id IN ({placeholders})",
+                tuple(candidates)).fetchall() if candidates else []
+        scored = sorted(((similarity(sig, array("Q", blob)), doc_id, source, invoice)
+                         for doc_id, blob, source, invoice in rows), reverse=True)
+        for score, doc_id, source, invoice in scored:
+            if score < self.threshold:
+                break
+            fields = json.loads(invoice)
+            if _mentions(text, fields.get("invoiceNumber")) and _mentions(text, fields.get("vendor", {}).get("taxId")):
+                self._count("near")
+                return DedupMatch(doc_id, score, source, invoice)
+            self._count("rejected")  # same layout, different invoice
+        self._count("misses")
+        return None
+
+    def add(self, text: str, invoice_obj, source: str | None = None, sig: array | None = None) -> None:
+        sig = sig or signature(text)
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock, self.conn:
+            cursor = self.conn.execute('''
+                INSERT INTO dedup_documents (text_sha256, signature, invoice, source, created_at)
+                VALUES (?, ?, ?, ?, ?) ON CONFLICT(text_sha256) DO NOTHING
+            ''', (text_hash(text), sig.tobytes(), invoice_obj.model_dump_json(), source, now))
+            if cursor.rowcount:
+                self.conn.executemany("INSERT OR IGNORE INTO dedup_bands (band_key, doc_id) VALUES (?, ?)",
+                                      [(key, cursor.lastrowid) for key in band_keys(sig)])
+                self.stats["added"] += 1
+
+    def record(self, match: DedupMatch, source: str | None) -> None:
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT INTO dedup_duplicates (doc_id, source, similarity, action, seen_at) VALUES (?, ?, ?, ?, ?)
+            ''', (match.doc_id, source, match.similarity, self.mode, now))
+
+    def check(self, text: str, source: str | None = None):
+        """Raise DuplicateInvoice when `text` is a copy of a processed document; returns its signature otherwise."""
+        sig = signature(text)
+        match = self.find(text, sig)
+        if match is None:
+            return sig
+        self.record(match, source)
+        logging.info(f"🔵 {source or 'Document'} is a near-duplicate ({match.similarity:.0%}) of "
+                     f"{match.source or f'document {match.doc_id}'}: "
+                     f"{'reusing its extraction' if self.mode == 'reuse' else 'flagged'}, no LLM call")
+        raise DuplicateInvoice(match, reuse=self.mode == "reuse")
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def duplicates(self) -> list[tuple]:
+        with self._lock:
+            return self.conn.execute('''
+                SELECT d.seen_at, d.source, d.similarity, d.action, o.source
+                FROM dedup_duplicates d LEFT JOIN dedup_documents o ON o.id = d.doc_id ORDER BY d.id
+            ''').fetchall()
+
+    def size(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM dedup_documents").fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate invoice index next to invoices.db.")
+    parser.add_argument("--db", default="invoices.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check_cmd = commands.add_parser("check")
+    check_cmd.add_argument("pdf")
+    commands.add_parser("duplicates")
+    commands.add_parser("stats")
+    args = parser.parse_args()
+
+    index = DedupIndex(args.db)
+    if args.command == "check":
+        from main import get_pdf_content
+
+        match = index.find(get_pdf_content(args.pdf))
+        if match is None:
+            print(f"No near-duplicate of {args.pdf} (threshold {index.threshold:.0%})")
+        else:
+            invoice = json.loads(match.invoice_json)
+            print(f"{args.pdf} is a near-duplicate ({match.similarity:.0%}) of "
+                  f"{match.source or f'document {match.doc_id}'}: invoice {invoice.get('invoiceNumber')}")
+    elif args.command == "duplicates":
+        header = f"{'seen':<27}{'similarity':>11}  {'action':<7}{'document':<34}original"
+        print(header)
+        print("-" * len(header))
+        for seen_at, source, score, action, original in index.duplicates():
+            print(f"{seen_at or '':<27}{score:>10.0%}  {action:<7}{(source or '-')[-33:]:<34}{original or '-'}")
+    else:
+        print(f"{index.size()} documents indexed in {index.path}, {len(index.duplicates())} duplicates seen")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
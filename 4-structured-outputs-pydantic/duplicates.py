@@ -0,0 +1,10 @@
+# No imports, so main.py can catch DuplicateInvoice without loading dedup.py (sqlite3, MinHash setup) at startup.
+
+
+class DuplicateInvoice(Exception):
+    """Raised by `extract_invoice` instead of calling the LLM; `reuse` says whether to use `match.invoice`."""
+
+    def __init__(self, match, reuse: bool):
+        super().__init__(f"near-duplicate ({match.similarity:.0%}) of {match.source or f'document {match.doc_id}'}")
+        self.match = match  # dedup.DedupMatch
+        self.reuse = reuse
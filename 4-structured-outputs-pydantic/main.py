@@ -1,14 +1,19 @@
-import json
+from __future__ import annotations
+
 import sys
 import os
-import sqlite3
-import google.generativeai as genai
-
-from pypdf import PdfReader
-from dotenv import load_dotenv
-import requests
 import logging
-from pydantic import BaseModel, Field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from rate_limit import rate_limited_generate
+from structured import build_field_reprompt, merge_fields, optional_schema, parse_lenient
+from chunking import PAGE_BREAK, map_concurrently, merge_partial_records, split_text
+from tracing import span, traced
+from profiling import profile_from_argv
+from prompting import PromptBuilder
+
+from duplicates import DuplicateInvoice
+from schema import INVOICE_RESPONSE_SCHEMA
 
 
 # --- Setup logging ---
@@ -19,40 +24,11 @@ logging.basicConfig(
 )
 
 
-
-# ========== Pydantic models ==========
-class Vendor(BaseModel):
-    name: str = Field(...,
-                      description="The name of the vendor or company issuing the invoice.")
-    address: str = Field(..., description="The address of the vendor.")
-    taxId: str = Field(...,
-                       description="The tax identification number of the vendor.")
-
-
-class Customer(BaseModel):
-    name: str = Field(..., description="The name of the customer or client.")
-    address: str = Field(..., description="The address of the customer.")
-    taxId: str = Field(...,
-                       description="The tax identification number of the customer.")
-
-
-class Invoice(BaseModel):
-    vendor: Vendor = Field(...,
-                           description="Details of the vendor issuing the invoice.")
-    customer: Customer = Field(...,
-                               description="Details of the customer receiving the invoice.")
-    invoiceNumber: str = Field(...,
-                               description="Unique identifier for the invoice.")
-    date: str = Field(..., description="Date when the invoice was issued.")
-    totalAmount: float = Field(...,
-                               description="Total amount due on the invoice.")
-    tax: float = Field(...,
-                       description="Total tax amount applied to the invoice.")
-    
-
 # ========== DB ==========
-def setup_database():
-    conn = sqlite3.connect("invoices.db")
+def setup_database(db_path: str = "invoices.db", check_same_thread: bool = True):
+    import sqlite3
+    from query import setup_query_tables
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS invoices (
@@ -66,22 +42,26 @@ def setup_database():
             invoice_number TEXT,
             date TEXT,
             total_amount REAL,
-            tax REAL
+            tax REAL,
+            date_iso TEXT
         )
     ''')
-    conn.commit()
+    setup_query_tables(conn)
     return conn
 
 
-def insert_invoice_data(conn, invoice_obj):
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO invoices (
-            vendor_name, vendor_address, vendor_tax_id,
-            customer_name, customer_address, customer_tax_id,
-            invoice_number, "date", total_amount, tax
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+INSERT_INVOICE_SQL = '''
+    INSERT INTO invoices (
+        vendor_name, vendor_address, vendor_tax_id,
+        customer_name, customer_address, customer_tax_id,
+        invoice_number, "date", total_amount, tax, date_iso
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def invoice_row(invoice_obj) -> tuple:
+    from query import date_iso  # query.py imports sqlite3; entry points that never store shouldn't pay for it
+    return (
         invoice_obj.vendor.name,
         invoice_obj.vendor.address,
         invoice_obj.vendor.taxId,
@@ -91,45 +71,22 @@ def insert_invoice_data(conn, invoice_obj):
         invoice_obj.invoiceNumber,
         invoice_obj.date,
         invoice_obj.totalAmount,
-        invoice_obj.tax
-    ))
-    conn.commit()
+        invoice_obj.tax,
+        date_iso(invoice_obj.date)
+    )
 
 
-# --- Define JSON Schema ---
-INVOICE_RESPONSE_SCHEMA = {
-    "type": "object",
-    "properties": {
-        "vendor": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string", "description": "Vendor name"},
-                "address": {"type": "string", "description": "Vendor address"},
-                "taxId": {"type": "string", "description": "Vendor tax ID"}
-            },
-            "required": ["name", "address", "taxId"]
-        },
-        "customer": {
-            "type": "object",
-            "properties": {
-                "name": {"type": "string", "description": "Customer name"},
-                "address": {"type": "string", "description": "Customer address"},
-                "taxId": {"type": "string", "description": "Customer tax ID"}
-            },
-            "required": ["name", "address", "taxId"]
-        },
-        "invoiceNumber": {"type": "string", "description": "Invoice ID"},
-        "date": {"type": "string", "description": "Invoice date"},
-        "totalAmount": {"type": "number", "description": "Total amount"},
-        "tax": {"type": "number", "description": "Tax amount"}
-    },
-    "required": ["vendor", "customer", "invoiceNumber", "date", "totalAmount", "tax"]
-}
+@traced
+def insert_invoice_data(conn, invoice_obj):
+    cursor = conn.cursor()
+    cursor.execute(INSERT_INVOICE_SQL, invoice_row(invoice_obj))
+    conn.commit()
 
 
 # ========== Gemini ==========
 def load_api_key() -> str:
     logging.info("🔑 Loading API key...")
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -141,53 +98,175 @@ def load_api_key() -> str:
 
 def configure_genai(api_key: str):
     logging.info("⚙️ Configuring Gemini client...")
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     logging.info("🟢 Gemini client configured")
 
 
 # ========== PDF ==========
+@traced
 def get_pdf_content(pdf_path: str) -> str:
     with open(pdf_path, "rb") as f:
-        reader = PdfReader(f)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+        return read_pdf_text(f)
+
+
+def read_pdf_text(stream) -> str:
+    from pypdf import PdfReader
+    reader = PdfReader(stream)
+    # keep page boundaries so oversized invoices can be chunked per page
+    return PAGE_BREAK.join(page.extract_text() for page in reader.pages)
+
+
+INVOICE_MODEL_NAME = "gemini-1.5-flash"
+INVOICE_GENERATION_CONFIG = {
+    "response_schema": INVOICE_RESPONSE_SCHEMA,
+    "response_mime_type": "application/json",
+}
+PARTIAL_GENERATION_CONFIG = {
+    "response_schema": optional_schema(INVOICE_RESPONSE_SCHEMA),
+    "response_mime_type": "application/json",
+}
+# Invoices above this (estimated) size are split per page and extracted concurrently.
+INVOICE_CHUNK_TOKENS = 30_000
+# A chunk plus the instructions and tags around it; a bigger prompt is a bug in the splitting, not a truncation.
+INVOICE_PROMPT_TOKENS = INVOICE_CHUNK_TOKENS + 1_000
+# Totals are printed at the end of an invoice, so for these the last chunk wins.
+INVOICE_TOTAL_FIELDS = ("totalAmount", "tax")
+
+
+def build_extraction_prompt(pdf_content: str, budget: int | None = INVOICE_PROMPT_TOKENS) -> str:
+    return (
+        PromptBuilder("build_extraction_prompt", budget=budget)
+        .text("""
+            You are an expert data extractor who excels at analyzing invoices.
+
+            Extract all relevant data from the below invoice content (which was extracted from a PDF document).
+            Make sure to capture data like vendor name, date, amount, tax, tax IDs etc.
+        """)
+        .block("invoice-content", pdf_content)
+        .text("Return your response as a JSON object without any extra text or explanation.")
+        .build()
+    )
+
+
+def build_partial_extraction_prompt(chunk: str, index: int, total: int) -> str:
+    return (
+        PromptBuilder(f"build_partial_extraction_prompt[{index}/{total}]", budget=INVOICE_PROMPT_TOKENS)
+        .text(f"""
+            You are an expert data extractor who excels at analyzing invoices.
+
+            Below is part {index} of {total} of a long invoice (text extracted from a PDF document).
+            Extract the invoice data that appears in THIS part: vendor name, date, amount, tax, tax IDs etc.
+            Leave out any field that does not appear in this part.
+        """)
+        .block("invoice-content", chunk)
+        .text("Return your response as a JSON object without any extra text or explanation.")
+        .build()
+    )
 
 
-def extract_invoice_details(pdf_content: str) -> Invoice:
-    prompt = f"""
-    You are an expert data extractor who excels at analyzing invoices.
+def extract_from_chunks(chunks: list[str], model_name: str = INVOICE_MODEL_NAME) -> dict:
+    import google.generativeai as genai
 
-    Extract all relevant data from the below invoice content (which was extracted from a PDF document).
-    Make sure to capture data like vendor name, date, amount, tax, tax IDs etc.
+    logging.info(f"🔵 Large invoice: extracting from {len(chunks)} chunks concurrently...")
+
+    def extract_chunk(numbered_chunk):
+        index, chunk = numbered_chunk
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=PARTIAL_GENERATION_CONFIG
+        )
+        response = rate_limited_generate(model, build_partial_extraction_prompt(chunk, index, len(chunks)))
+        return parse_lenient(response.text)
+
+    partials = map_concurrently(extract_chunk, list(enumerate(chunks, start=1)))
+    logging.info("🟢 Chunk responses received from Gemini API")
+    return merge_partial_records(partials, prefer_last=INVOICE_TOTAL_FIELDS)
+
+
+@traced
+def extract_invoice_details(pdf_content: str, model_name: str = INVOICE_MODEL_NAME, reprompt: bool = True) -> Invoice:
+    import google.generativeai as genai
+    from validation import parse_invoice, validate_data
+
+    chunks = split_text(pdf_content, INVOICE_CHUNK_TOKENS, [PAGE_BREAK, "\n\n", "\n"])
+    if len(chunks) > 1:
+        invoice_obj, invoice_dict, invalid_fields = validate_data(extract_from_chunks(chunks, model_name))
+        # re-prompts only need where header fields and totals live
+        pdf_content = PAGE_BREAK.join([chunks[0], chunks[-1]])
+    else:
+        prompt = build_extraction_prompt(pdf_content)
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=INVOICE_GENERATION_CONFIG
+        )
+        response = rate_limited_generate(model, prompt)
+        logging.info("🟢 Response received from Gemini API")
+        invoice_obj, invoice_dict, invalid_fields = parse_invoice(response.text)
+    if invalid_fields and invoice_dict is not None and reprompt:
+        invoice_obj, invoice_dict, invalid_fields = reprompt_invalid_fields(pdf_content, invoice_dict, invalid_fields,
+                                                                            model_name)
+    if invalid_fields:
+        raise ValueError(f"Invalid invoice fields in Gemini response: {', '.join(invalid_fields)}")
+    return invoice_obj
 
-    <invoice-content>
-    {pdf_content}
-    </invoice-content>
 
-    Return your response as a JSON object without any extra text or explanation.
+def extract_invoice(pdf_content: str, templates=None, extract=extract_invoice_details, dedup=None,
+                    source: str | None = None) -> Invoice:
+    """Template fast path when the vendor's layout is known (see templates.py), `extract` (the LLM) otherwise.
+
+    With a `dedup` index, a near-duplicate of a document already processed raises DuplicateInvoice first.
+    The caller adds the document to the index (`dedup.add`) once its row is stored, so a failed or
+    skipped insert doesn't turn the next attempt into a "duplicate" of nothing.
     """
-    
+    if dedup is not None:
+        with span("dedup_check"):
+            dedup.check(pdf_content, source)
+    invoice_obj = None
+    if templates is not None:
+        with span("template_extract"):
+            invoice_obj = templates.apply(pdf_content)
+        if invoice_obj is not None:
+            logging.info(f"🟢 Extracted with the template for vendor {invoice_obj.vendor.taxId}, no LLM call")
+    if invoice_obj is None:
+        invoice_obj = extract(pdf_content)
+        if templates is not None:
+            templates.learn(pdf_content, invoice_obj)
+    return invoice_obj
+
+
+def open_templates(db_path: str = "invoices.db"):
+    from templates import TemplateStore, templates_enabled
+    return TemplateStore(db_path) if templates_enabled() else None
+
+
+def open_dedup(db_path: str = "invoices.db"):
+    from dedup import DedupIndex, dedup_mode
+    mode = dedup_mode()
+    return DedupIndex(db_path, mode=mode) if mode else None
+
+
+def reprompt_invalid_fields(pdf_content: str, invoice_dict: dict, invalid_fields: list[str],
+                            model_name: str = INVOICE_MODEL_NAME):
+    import google.generativeai as genai
+    from validation import validate_data
+
+    logging.info(f"🟡 Re-prompting Gemini for invalid fields only: {', '.join(invalid_fields)}")
+    prompt, schema = build_field_reprompt(pdf_content, INVOICE_RESPONSE_SCHEMA, invalid_fields)
     model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash",
+        model_name=model_name,
         generation_config={
-            "response_schema": INVOICE_RESPONSE_SCHEMA,
+            "response_schema": schema,
             "response_mime_type": "application/json",
         }
     )
-    response = model.generate_content(prompt)
-    logging.info("🟢 Response received from Gemini API")
-    invoice_dict = json.loads(response.text)
-    invoice_obj = Invoice(**invoice_dict)
-    return invoice_obj
+    response = rate_limited_generate(model, prompt)
+    patch = parse_lenient(response.text)
+    return validate_data(merge_fields(invoice_dict, patch, invalid_fields))
 
 
 def main():
-    api_key = load_api_key()
-    configure_genai(api_key)
-    
-    if len(sys.argv) < 2:
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
         print("Usage: python main.py /path/to/file_or_folder")
         return
     
@@ -213,25 +292,45 @@ def main():
         print("No PDF files found.")
         return
 
+    # only now pay for dotenv / the Gemini SDK: usage errors and empty folders exit before this
+    api_key = load_api_key()
+    configure_genai(api_key)
     conn = setup_database()
+    templates = open_templates()
+    dedup = open_dedup()
     
 
     for pdf_file in pdf_files:
         print(f"Processing {pdf_file}...")
         try:
-            pdf_content = get_pdf_content(pdf_file)
-            invoices = extract_invoice_details(pdf_content)
-            insert_invoice_data(conn, invoices)
+            with span("process_invoice", file=pdf_file):
+                pdf_content = get_pdf_content(pdf_file)
+                invoices = extract_invoice(pdf_content, templates, dedup=dedup, source=pdf_file)
+                insert_invoice_data(conn, invoices)
+                if dedup is not None:
+                    dedup.add(pdf_content, invoices, pdf_file)
             print("Extracted Invoice Details:")
             print(invoices.model_dump())
+        except DuplicateInvoice as e:
+            print(f"Not stored again, {pdf_file} is a {e}")
+            if e.reuse:
+                print("Extracted Invoice Details (reused):")
+                print(e.match.invoice.model_dump())
         except Exception as e:
             print(f"An error occurred while processing {pdf_file}: {e}")
 
+    if templates is not None:
+        logging.info(f"🔵 Templates: {templates.stats}")
+        templates.close()
+    if dedup is not None:
+        logging.info(f"🔵 Duplicates: {dedup.stats}")
+        dedup.close()
     conn.close()
     
 
 if __name__ == "__main__":
-    main()
+    with profile_from_argv():
+        main()
 
 
 
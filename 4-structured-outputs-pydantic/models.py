@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+
+from schema import INVOICE_RESPONSE_SCHEMA  # noqa: F401  (re-exported)
+
+
+# ========== Pydantic models ==========
+class Vendor(BaseModel):
+    name: str = Field(...,
+                      description="The name of the vendor or company issuing the invoice.")
+    address: str = Field(..., description="The address of the vendor.")
+    taxId: str = Field(...,
+                       description="The tax identification number of the vendor.")
+
+
+class Customer(BaseModel):
+    name: str = Field(..., description="The name of the customer or client.")
+    address: str = Field(..., description="The address of the customer.")
+    taxId: str = Field(...,
+                       description="The tax identification number of the customer.")
+
+
+class Invoice(BaseModel):
+    vendor: Vendor = Field(...,
+                           description="Details of the vendor issuing the invoice.")
+    customer: Customer = Field(...,
+                               description="Details of the customer receiving the invoice.")
+    invoiceNumber: str = Field(...,
+                               description="Unique identifier for the invoice.")
+    date: str = Field(..., description="Date when the invoice was issued.")
+    totalAmount: float = Field(...,
+                               description="Total amount due on the invoice.")
+    tax: float = Field(...,
+                       description="Total tax amount applied to the invoice.")
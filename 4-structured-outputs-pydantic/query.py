@@ -0,0 +1,224 @@
+"""Read side of invoices.db: aggregates and columnar export.
+
+    python query.py totals vendor                 # invoice count, total amount and tax per vendor
+    python query.py totals month --from 2025-01 --to 2025-06
+    python query.py export invoices.parquet       # or invoices.arrow; needs `pyarrow`
+    python query.py rebuild                       # recompute date_iso + summaries from scratch
+
+`date_iso` is the free-text `date` normalised to YYYY-MM-DD when the row is
+written (NULL when it can't be parsed), so date filters and monthly grouping
+sort correctly. Totals per vendor, customer and month live in
+`invoice_summary`, kept up to date by triggers on every insert, update and
+delete, so reading them never scans `invoices`. The export streams the table
+in chunks of --chunk-rows, so memory stays flat however big the table is.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from structured import normalize_date
+
+SUMMARY_DIMENSIONS = {
+    "vendor": "COALESCE({row}.vendor_name, '')",
+    "customer": "COALESCE({row}.customer_name, '')",
+    "month": "COALESCE(substr({row}.date_iso, 1, 7), 'unknown')",
+}
+EXPORT_COLUMNS = [
+    ("id", "int64"), ("vendor_name", "string"), ("vendor_address", "string"), ("vendor_tax_id", "string"),
+    ("customer_name", "string"), ("customer_address", "string"), ("customer_tax_id", "string"),
+    ("invoice_number", "string"), ("date", "string"), ("date_iso", "date32"),
+    ("total_amount", "float64"), ("tax", "float64"),
+]
+EXPORT_CHUNK_ROWS = 50_000
+
+
+def date_iso(value) -> str | None:
+    try:
+        return normalize_date(value)
+    except (ValueError, TypeError):
+        return None
+
+
+# ========== Schema ==========
+def _summary_trigger_sql() -> str:
+    def apply(row: str, sign: str) -> str:
+        return "\n".join(
+            f"INSERT INTO invoice_summary (dimension, key, invoice_count, total_amount, tax) "
+            f"VALUES ('{dimension}', {key.format(row=row)}, {sign}1, {sign}COALESCE({row}.total_amount, 0), "
+            f"{sign}COALESCE({row}.tax, 0)) "
+            f"ON CONFLICT(dimension, key) DO UPDATE SET invoice_count = invoice_count + excluded.invoice_count, "
+            f"total_amount = total_amount + excluded.total_amount, tax = tax + excluded.tax;"
+            for dimension, key in SUMMARY_DIMENSIONS.items()
+        )
+
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS invoice_summary_insert AFTER INSERT ON invoices BEGIN
+            {apply("NEW", "")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS invoice_summary_delete AFTER DELETE ON invoices BEGIN
+            {apply("OLD", "-")}
+        END;
+        CREATE TRIGGER IF NOT EXISTS invoice_summary_update
+        AFTER UPDATE OF vendor_name, customer_name, date_iso, total_amount, tax ON invoices BEGIN
+            {apply("OLD", "-")}
+            {apply("NEW", "")}
+        END;
+    '''
+
+
+def setup_query_tables(conn) -> None:
+    """Add date_iso and the summary table + triggers to an invoices table (idempotent)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(invoices)")}
+    migrating = "date_iso" not in columns
+    if migrating:
+        conn.execute("ALTER TABLE invoices ADD COLUMN date_iso TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS invoices_date_iso ON invoices (date_iso)")
+    has_summary = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoice_summary'").fetchone()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS invoice_summary (
+            dimension TEXT,
+            key TEXT,
+            invoice_count INTEGER,
+            total_amount REAL,
+            tax REAL,
+            PRIMARY KEY (dimension, key)
+        )
+    ''')
+    conn.executescript(_summary_trigger_sql())
+    if migrating or not has_summary:
+        # rows written before the triggers existed aren't counted yet
+        rebuild(conn)
+    conn.commit()
+
+
+def rebuild(conn) -> None:
+    """Recompute date_iso for every row and the summaries from the invoices table."""
+    rows = conn.execute("SELECT id, date FROM invoices").fetchall()
+    with conn:
+        conn.executemany("UPDATE invoices SET date_iso = ? WHERE id = ?",
+                         [(date_iso(date), invoice_id) for invoice_id, date in rows])
+        conn.execute("DELETE FROM invoice_summary")
+        for dimension, key in SUMMARY_DIMENSIONS.items():
+            conn.execute(f'''
+                INSERT INTO invoice_summary (dimension, key, invoice_count, total_amount, tax)
+                SELECT '{dimension}', {key.format(row="invoices")}, COUNT(*),
+                       COALESCE(SUM(total_amount), 0), COALESCE(SUM(tax), 0)
+                FROM invoices GROUP BY 2
+            ''')
+
+
+# ========== Aggregates ==========
+def totals(conn, dimension: str, start: str | None = None, end: str | None = None,
+           limit: int | None = None) -> list[dict]:
+    """Count, total amount and tax per vendor / customer / month, largest total first (months in order).
+
+    `start` / `end` (YYYY-MM, inclusive) only apply to dimension="month".
+    """
+    if dimension not in SUMMARY_DIMENSIONS:
+        raise ValueError(f"unknown dimension {dimension!r}, expected one of {', '.join(SUMMARY_DIMENSIONS)}")
+    sql = "SELECT key, invoice_count, total_amount, tax FROM invoice_summary WHERE dimension = ? AND invoice_count > 0"
+    params: list = [dimension]
+    if dimension == "month":
+        if start or end:
+            sql += " AND key != 'unknown'"
+        if start:
+            sql += " AND key >= ?"
+            params.append(start)
+        if end:
+            sql += " AND key <= ?"
+            params.append(end)
+        sql += " ORDER BY key"
+    else:
+        sql += " ORDER BY total_amount DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [{"key": key, "invoices": count, "total_amount": round(total, 2), "tax": round(tax, 2)}
+            for key, count, total, tax in conn.execute(sql, params)]
+
+
+def invoices_between(conn, start: str, end: str) -> list[tuple]:
+    """Invoice rows dated start..end (ISO, inclusive), served by the date_iso index."""
+    return conn.execute("SELECT * FROM invoices WHERE date_iso BETWEEN ? AND ? ORDER BY date_iso",
+                        (start, end)).fetchall()
+
+
+# ========== Export ==========
+def export(conn, out_path: str, file_format: str | None = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    """Stream the invoices table to Parquet or Arrow IPC, `chunk_rows` at a time; returns rows written."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Export needs pyarrow: uv add pyarrow") from None
+
+    file_format = file_format or ("parquet" if out_path.endswith(".parquet") else "arrow")
+    schema = pa.schema([(name, getattr(pa, kind)()) for name, kind in EXPORT_COLUMNS])
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(out_path, schema)
+    else:
+        writer = pa.ipc.new_file(out_path, schema)
+
+    names = [name for name, _ in EXPORT_COLUMNS]
+    # date32 wants a date object or days since epoch; let SQLite do the conversion
+    select = ", ".join("CAST(julianday(date_iso) - 2440587.5 AS INTEGER)" if n == "date_iso" else f'"{n}"'
+                       for n in names)
+    cursor = conn.execute(f"SELECT {select} FROM invoices ORDER BY id")
+    written = 0
+    try:
+        while rows := cursor.fetchmany(chunk_rows):
+            columns = list(zip(*rows))
+            batch = pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                                    schema=schema)
+            writer.write_batch(batch)
+            written += len(rows)
+    finally:
+        writer.close()
+    return written
+
+
+# ========== CLI ==========
+def main():
+    parser = argparse.ArgumentParser(description="Aggregates and columnar export over invoices.db.")
+    parser.add_argument("--db", default="invoices.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    totals_cmd = commands.add_parser("totals", help="totals and tax by vendor, customer or month")
+    totals_cmd.add_argument("dimension", choices=list(SUMMARY_DIMENSIONS))
+    totals_cmd.add_argument("--from", dest="start", help="first month (YYYY-MM), month only")
+    totals_cmd.add_argument("--to", dest="end", help="last month (YYYY-MM), month only")
+    totals_cmd.add_argument("--limit", type=int)
+    export_cmd = commands.add_parser("export", help="write the invoices table to Parquet / Arrow")
+    export_cmd.add_argument("out", help="output file (.parquet or .arrow)")
+    export_cmd.add_argument("--format", choices=["parquet", "arrow"])
+    export_cmd.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    commands.add_parser("rebuild", help="recompute date_iso and the summary table")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Error: The database '{args.db}' does not exist.")
+        return
+    conn = sqlite3.connect(args.db)
+    try:
+        setup_query_tables(conn)
+        if args.command == "totals":
+            rows = totals(conn, args.dimension, args.start, args.end, args.limit)
+            print(f"{args.dimension:<40}{'invoices':>10}{'total':>16}{'tax':>14}")
+            for row in rows:
+                print(f"{row['key'][:39]:<40}{row['invoices']:>10}{row['total_amount']:>16,.2f}{row['tax']:>14,.2f}")
+        elif args.command == "export":
+            written = export(conn, args.out, args.format, args.chunk_rows)
+            logging.info(f"✅ Exported {written} invoices to {args.out}")
+        else:
+            rebuild(conn)
+            logging.info("✅ Rebuilt date_iso and invoice_summary")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+    main()
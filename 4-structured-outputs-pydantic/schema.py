@@ -0,0 +1,30 @@
+# --- Define JSON Schema ---
+# Plain dict (no pydantic), so main.py can import it without paying for pydantic at startup.
+INVOICE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "vendor": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "Vendor name"},
+                "address": {"type": "string", "description": "Vendor address"},
+                "taxId": {"type": "string", "description": "Vendor tax ID"}
+            },
+            "required": ["name", "address", "taxId"]
+        },
+        "customer": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string", "description": "Customer name"},
+                "address": {"type": "string", "description": "Customer address"},
+                "taxId": {"type": "string", "description": "Customer tax ID"}
+            },
+            "required": ["name", "address", "taxId"]
+        },
+        "invoiceNumber": {"type": "string", "description": "Invoice ID"},
+        "date": {"type": "string", "description": "Invoice date"},
+        "totalAmount": {"type": "number", "description": "Total amount"},
+        "tax": {"type": "number", "description": "Tax amount"}
+    },
+    "required": ["vendor", "customer", "invoiceNumber", "date", "totalAmount", "tax"]
+}
@@ -0,0 +1,373 @@
+"""Long-running invoice extraction service.
+
+    python service.py                          # http://127.0.0.1:8765
+    python service.py --socket /tmp/invoices.sock --workers 8
+    python service.py --fake                   # offline, against the mock LLM
+
+    curl -s localhost:8765/extract -H 'Content-Type: application/pdf' --data-binary @pdfs/invoice1.pdf
+    curl -s localhost:8765/extract -d '{"path": "pdfs/invoice1.pdf"}'
+    curl -s localhost:8765/health
+
+Imports, the Gemini client, the pydantic validator and the invoices.db
+connection are set up once at startup, so a request only pays for PDF parsing
+and the LLM call. Jobs wait in a bounded queue in front of a fixed pool of
+worker threads; when it is full the request is rejected right away with 503 +
+Retry-After instead of piling up. SIGTERM / Ctrl+C stop accepting jobs, finish
+the queued and running ones, then exit.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import queue
+import signal
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from main import (
+    INSERT_INVOICE_SQL,
+    DuplicateInvoice,
+    configure_genai,
+    extract_invoice,
+    invoice_row,
+    load_api_key,
+    open_dedup,
+    open_templates,
+    read_pdf_text,
+    setup_database,
+)
+
+
+# ========== Storage ==========
+class InvoiceStore:
+    """One connection for the whole process; writes are serialised (SQLite has a single writer anyway)."""
+
+    def __init__(self, db_path: str):
+        self.conn = setup_database(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # readers of invoices.db don't block the service
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+
+    def insert(self, invoice_obj) -> int:
+        with self._lock, self.conn:
+            return self.conn.execute(INSERT_INVOICE_SQL, invoice_row(invoice_obj)).lastrowid
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+
+# ========== Jobs ==========
+class Job:
+    def __init__(self, pdf_bytes: bytes | None = None, path: str | None = None, store: bool = True):
+        self.pdf_bytes = pdf_bytes
+        self.path = path
+        self.store = store
+        self.created = time.monotonic()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.result: dict | None = None
+        self.error: Exception | None = None
+        self.done = threading.Event()
+
+    def timings(self) -> dict:
+        return {
+            "queue_ms": round(((self.started or self.created) - self.created) * 1000, 1),
+            "extract_ms": round(((self.finished or self.started or 0) - (self.started or 0)) * 1000, 1),
+        }
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Draining(Exception):
+    pass
+
+
+class InvoiceService:
+    def __init__(self, store: InvoiceStore, workers: int = 4, queue_size: int = 32, templates=None, dedup=None):
+        self.store = store
+        self.templates = templates
+        self.dedup = dedup
+        self.jobs: queue.Queue[Job | None] = queue.Queue(maxsize=queue_size)
+        self.workers = [threading.Thread(target=self._work, name=f"invoice-worker-{i}", daemon=True)
+                        for i in range(workers)]
+        self.draining = False
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.open_requests = 0  # HTTP requests that still owe their client a response
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, job: Job) -> Job:
+        if self.draining:
+            raise Draining()
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull() from None
+        return job
+
+    def track_request(self, delta: int) -> None:
+        with self._lock:
+            self.open_requests += delta
+
+    def _work(self) -> None:
+        while (job := self.jobs.get()) is not None:
+            with self._lock:
+                self.in_flight += 1
+            job.started = time.monotonic()
+            try:
+                job.result = self._process(job)
+                with self._lock:
+                    self.processed += 1
+            except Exception as e:
+                job.error = e
+                with self._lock:
+                    self.failed += 1
+                logging.error(f"🔴 Extraction failed for {job.path or 'uploaded PDF'}: {e}")
+            finally:
+                job.finished = time.monotonic()
+                with self._lock:
+                    self.in_flight -= 1
+                self.jobs.task_done()
+                job.done.set()
+        self.jobs.task_done()
+
+    def _process(self, job: Job) -> dict:
+        if job.path is not None:
+            with open(job.path, "rb") as f:
+                pdf_content = read_pdf_text(f)
+        else:
+            pdf_content = read_pdf_text(io.BytesIO(job.pdf_bytes))
+        try:
+            invoice_obj = extract_invoice(pdf_content, self.templates, dedup=self.dedup, source=job.path)
+        except DuplicateInvoice as e:
+            if not e.reuse:
+                raise
+            # already extracted (and stored) once: hand back that extraction, no second row
+            return {"id": None, "invoice": e.match.invoice.model_dump(),
+                    "duplicate_of": {"source": e.match.source, "similarity": round(e.match.similarity, 3)}}
+        invoice_id = None
+        if job.store:
+            invoice_id = self.store.insert(invoice_obj)
+            if self.dedup is not None:
+                self.dedup.add(pdf_content, invoice_obj, job.path)
+        return {"id": invoice_id, "invoice": invoice_obj.model_dump()}
+
+    def health(self) -> dict:
+        with self._lock:
+            return {
+                "status": "draining" if self.draining else "ok",
+                "workers": len(self.workers),
+                "queued": self.jobs.qsize(),
+                "queue_size": self.jobs.maxsize,
+                "in_flight": self.in_flight,
+                "processed": self.processed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "uptime_s": round(time.monotonic() - self.started, 1),
+                "templates": dict(self.templates.stats) if self.templates else None,
+                "duplicates": dict(self.dedup.stats) if self.dedup else None,
+            }
+
+    def drain(self, timeout: float) -> bool:
+        """Stop taking jobs and wait for queued + running ones; returns False on timeout."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while (self.jobs.unfinished_tasks or self.open_requests) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        drained = not self.jobs.unfinished_tasks
+        for _ in self.workers:
+            try:
+                self.jobs.put_nowait(None)  # one stop marker per worker
+            except queue.Full:
+                break  # timed out with a full queue; the daemon workers die with the process
+        return drained
+
+
+# ========== HTTP ==========
+class RequestHandler(BaseHTTPRequestHandler):
+    server_version = "InvoiceService/1.0"
+    service: InvoiceService  # set by make_server
+    request_timeout: float
+    max_body_bytes: int
+
+    def address_string(self) -> str:
+        # Unix-socket clients have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args) -> None:
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status: int, body: dict, headers: dict | None = None) -> None:
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self) -> None:
+        if self.path != "/health":
+            self._send_json(404, {"error": "not found"})
+            return
+        health = self.service.health()
+        self._send_json(200 if health["status"] == "ok" else 503, health)
+
+    def do_POST(self) -> None:
+        if self.path.split("?", 1)[0] != "/extract":
+            self._send_json(404, {"error": "not found"})
+            return
+        self.service.track_request(+1)
+        try:
+            self._extract()
+        finally:
+            self.service.track_request(-1)
+
+    def _extract(self) -> None:
+        try:
+            job = self._read_job()
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except OverflowError:
+            self._send_json(413, {"error": f"body larger than {self.max_body_bytes} bytes"})
+            return
+
+        try:
+            self.service.submit(job)
+        except QueueFull:
+            self._send_json(503, {"error": "queue full, retry later"}, {"Retry-After": "1"})
+            return
+        except Draining:
+            self._send_json(503, {"error": "service is shutting down"}, {"Connection": "close"})
+            return
+
+        if not job.done.wait(self.request_timeout):
+            self._send_json(504, {"error": f"extraction did not finish within {self.request_timeout:.0f}s"})
+            return
+        if job.error is not None:
+            # ValueError: the model's answer failed validation even after the re-prompt
+            status = 422 if isinstance(job.error, ValueError) else 500
+            if isinstance(job.error, DuplicateInvoice):
+                status = 409  # INVOICE_DEDUP=flag
+            self._send_json(status, {"error": str(job.error), "timings": job.timings()})
+            return
+        self._send_json(200, {**job.result, "timings": job.timings()})
+
+    def _read_job(self) -> Job:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.max_body_bytes:
+            raise OverflowError()
+        body = self.rfile.read(length)
+        store = "store=0" not in self.path
+        if self.headers.get("Content-Type", "").startswith("application/pdf"):
+            if not body:
+                raise ValueError("empty PDF body")
+            return Job(pdf_bytes=body, store=store)
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise ValueError("body must be a PDF (Content-Type: application/pdf) or JSON {\"path\": ...}") from None
+        path = request.get("path") if isinstance(request, dict) else None
+        if not path or not os.path.isfile(path):
+            raise ValueError(f"no such PDF file: {path!r}")
+        return Job(path=path, store=request.get("store", store))
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: InvoiceService, host: str, port: int, socket_path: str | None,
+                request_timeout: float, max_body_bytes: int):
+    handler = type("BoundRequestHandler", (RequestHandler,), {
+        "service": service, "request_timeout": request_timeout, "max_body_bytes": max_body_bytes})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# ========== Startup ==========
+def warm_up(fake: bool, fake_latency: float = 0.0) -> None:
+    """Pay every one-off cost before the first request: SDK, client config, validator, PDF parser."""
+    if fake:
+        import mock_llm
+        mock_llm.install_genai(mock_llm.MockConfig(latency=fake_latency))
+    else:
+        configure_genai(load_api_key())
+    import google.generativeai  # noqa: F401
+    import pypdf  # noqa: F401
+    import validation  # noqa: F401  (builds the pydantic TypeAdapter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invoice extraction service (PDF in, Invoice JSON out).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent extractions")
+    parser.add_argument("--queue-size", type=int, default=32, help="jobs waiting beyond this get 503")
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="max seconds to finish jobs on shutdown")
+    parser.add_argument("--max-body-mb", type=float, default=20.0)
+    parser.add_argument("--db", default="invoices.db")
+    parser.add_argument("--fake", action="store_true", help="use the mock LLM (offline)")
+    parser.add_argument("--fake-latency", type=float, default=0.0, help="simulated LLM latency with --fake")
+    args = parser.parse_args()
+
+    warm_up(args.fake, args.fake_latency)
+    store = InvoiceStore(args.db)
+    templates = open_templates(args.db)
+    dedup = open_dedup(args.db)
+    service = InvoiceService(store, workers=args.workers, queue_size=args.queue_size, templates=templates,
+                             dedup=dedup)
+    service.start()
+    server = make_server(service, args.host, args.port, args.socket,
+                         args.request_timeout, int(args.max_body_mb * 1024 * 1024))
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    # serve from a thread: server.shutdown() deadlocks when called from the serve_forever thread
+    server_thread = threading.Thread(target=server.serve_forever, name="http", daemon=True)
+    server_thread.start()
+    logging.info(f"🟢 Invoice service listening on {args.socket or f'http://{args.host}:{args.port}'} "
+                 f"({args.workers} workers, queue {args.queue_size})")
+    stop.wait()
+
+    logging.info("🟡 Shutting down: draining queued and running jobs...")
+    if not service.drain(args.drain_timeout):
+        logging.warning(f"🟡 Drain timed out after {args.drain_timeout:.0f}s, {service.jobs.unfinished_tasks} jobs dropped")
+    server.shutdown()  # waiting clients got their responses during the drain
+    server.server_close()
+    store.close()
+    if templates is not None:
+        templates.close()
+    if dedup is not None:
+        dedup.close()
+    if args.socket and os.path.exists(args.socket):
+        os.remove(args.socket)
+    logging.info("✅ Invoice service stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""Per-vendor extraction templates: invoices from known layouts skip the LLM.
+
+    python main.py pdfs/                 # templates are used and learned as invoices go by
+    python templates.py list             # vendors with a template, how often each was used
+    python templates.py forget V123      # drop one vendor's template (relearned from the next LLM extraction)
+
+After a successful LLM extraction, `learn()` records where each field sits in
+the PDF text as anchor rules: the label in front of the value on its line
+("Tax ID:", 2nd occurrence), the line right above it, or the document's
+first line, plus any text after it. A layout is only kept if the rules
+reproduce the LLM's answer on that same text. Templates are keyed by
+`vendor.taxId` and stored in the `invoice_templates` table of invoices.db.
+
+On a new PDF, `apply()` finds the vendor cheaply (one regex over the text for
+every known vendor tax ID), runs that vendor's rules and checks the result:
+all fields present, the vendor tax ID is the template's, the invoice number
+has the learned shape, pydantic validation passes, and so do the cross-field
+checks in `validation.consistency_errors` (0 <= tax <= total, well-formed tax
+IDs, a parseable date). Any failed check returns None and the caller falls back to
+the LLM, whose result then confirms or replaces the template.
+
+A template is only trusted after `min_support` LLM extractions agreed with it
+(INVOICE_TEMPLATE_MIN_SUPPORT, default 2), so one odd invoice can't teach a
+bad layout. INVOICE_TEMPLATES=0 turns the fast path off.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from structured import get_path, normalize_date, parse_number, set_path
+
+MIN_SUPPORT = int(os.getenv("INVOICE_TEMPLATE_MIN_SUPPORT", "2"))
+FIELDS = {
+    "vendor.name": "text",
+    "vendor.address": "text",
+    "vendor.taxId": "text",
+    "customer.name": "text",
+    "customer.address": "text",
+    "customer.taxId": "text",
+    "invoiceNumber": "text",
+    "date": "date",
+    "totalAmount": "amount",
+    "tax": "amount",
+}
+_AMOUNT = re.compile(r"[-+]?\d[\d,.' ]*\d|[-+]?\d")
+_DATE = re.compile(r"\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}|[A-Za-z]{3,9}\.? \d{1,2},? \d{4}|\d{1,2} [A-Za-z]{3,9}\.? \d{4}")
+_CURRENCY = "$€£¥₫ "
+
+
+def templates_enabled() -> bool:
+    return os.getenv("INVOICE_TEMPLATES", "1") not in ("0", "false", "")
+
+
+# ========== Values ==========
+def shape(value: str) -> str:
+    """Regex for values like this one: 'INV-2024-001' -> '[A-Za-z]+-\\d+-\\d+'."""
+    parts = []
+    for run in re.finditer(r"[A-Za-z]+|\d+|\s+|.", value):
+        token = run.group()
+        if token.isalpha():
+            parts.append("[A-Za-z]+")
+        elif token.isdigit():
+            parts.append(r"\d+")
+        elif token.isspace():
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def _same(kind: str, a, b) -> bool:
+    if kind == "amount":
+        return a is not None and b is not None and abs(float(a) - float(b)) < 0.005
+    return str(a).strip() == str(b).strip()
+
+
+def _norm_id(value: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "", str(value)).upper()
+
+
+# ========== Learning ==========
+def _candidates(kind: str, line: str, value) -> list[tuple[int, int]]:
+    """(start, end) spans of `value` in `line`."""
+    if kind == "text":
+        value = str(value).strip()
+        return [(m.start(), m.end()) for m in re.finditer(re.escape(value), line)] if value else []
+    pattern = _DATE if kind == "date" else _AMOUNT
+    spans = []
+    for m in pattern.finditer(line):
+        try:
+            found = normalize_date(m.group()) if kind == "date" else parse_number(m.group())
+        except ValueError:
+            continue
+        if _same(kind, found, value):
+            spans.append((m.start(), m.end()))
+    return spans
+
+
+def _anchor_of(prefix: str) -> str:
+    return prefix.strip().rstrip(_CURRENCY).strip()
+
+
+def learn_rule(lines: list[str], kind: str, value) -> dict | None:
+    for i, line in enumerate(lines):
+        for start, end in _candidates(kind, line, value):
+            anchor = _anchor_of(line[:start])
+            suffix = line[end:].strip()
+            if anchor:
+                nth = sum(1 for previous in lines[:i] if previous.strip().startswith(anchor))
+                return {"mode": "inline", "anchor": anchor, "nth": nth, "suffix": suffix}
+            if start != len(line) - len(line.lstrip()):
+                continue  # unlabelled text in the middle of a line: no stable anchor
+            above = next((j for j in range(i - 1, -1, -1) if lines[j].strip()), None)
+            if above is None:  # first line of the document, e.g. the vendor's letterhead
+                return {"mode": "line", "anchor": "", "nth": 0, "suffix": suffix}
+            anchor = lines[above].strip()
+            nth = sum(1 for previous in lines[:above] if previous.strip() == anchor)
+            return {"mode": "below", "anchor": anchor, "nth": nth, "suffix": suffix}
+    return None
+
+
+def learn_rules(text: str, invoice: dict) -> dict | None:
+    """Anchor rules that reproduce `invoice` from `text`, or None if the layout can't be described."""
+    lines = text.splitlines()
+    rules = {}
+    for path, kind in FIELDS.items():
+        rule = learn_rule(lines, kind, get_path(invoice, path))
+        if rule is None:
+            return None
+        rules[path] = {"kind": kind, **rule}
+    rules["invoiceNumber"]["shape"] = shape(str(invoice["invoiceNumber"]))
+    extracted = apply_rules(text, rules)
+    if extracted is None or any(not _same(kind, get_path(extracted, path), get_path(invoice, path))
+                                for path, kind in FIELDS.items()):
+        return None
+    return rules
+
+
+# ========== Applying ==========
+def _locate(lines: list[str], rule: dict) -> str | None:
+    if rule["mode"] == "line":
+        return next((line.strip() for line in lines if line.strip()), None)
+    seen = 0
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if rule["mode"] == "inline" and stripped.startswith(rule["anchor"]):
+            if seen == rule["nth"]:
+                return stripped[len(rule["anchor"]):].strip()
+            seen += 1
+        elif rule["mode"] == "below" and stripped == rule["anchor"]:
+            if seen == rule["nth"]:
+                return next((lines[j].strip() for j in range(i + 1, len(lines)) if lines[j].strip()), None)
+            seen += 1
+    return None
+
+
+def apply_rules(text: str, rules: dict) -> dict | None:
+    lines = text.splitlines()
+    invoice: dict = {}
+    for path, rule in rules.items():
+        raw = _locate(lines, rule)
+        if raw is None:
+            return None
+        if rule["suffix"]:
+            if not raw.endswith(rule["suffix"]):
+                return None
+            raw = raw[: -len(rule["suffix"])].strip()
+        raw = raw.lstrip(_CURRENCY) if rule["kind"] == "amount" else raw
+        try:
+            if rule["kind"] == "amount":
+                value = parse_number(raw)
+            elif rule["kind"] == "date":
+                value = normalize_date(raw)
+            else:
+                value = raw
+        except ValueError:
+            return None
+        set_path(invoice, path, value)
+    return invoice
+
+
+def check(invoice: dict, rules: dict, vendor_tax_id: str) -> str | None:
+    """Why a template result can't be trusted, or None if it passes."""
+    for path in FIELDS:
+        value = get_path(invoice, path)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return f"missing {path}"
+    if _norm_id(invoice["vendor"]["taxId"]) != _norm_id(vendor_tax_id):
+        return "vendor tax ID mismatch"
+    if not re.fullmatch(rules["invoiceNumber"]["shape"], str(invoice["invoiceNumber"])):
+        return "invoice number shape"
+    return None
+
+
+# ========== Store ==========
+class TemplateStore:
+    """invoice_templates table + an in-memory copy; safe to share between worker threads."""
+
+    def __init__(self, db_path: str = "invoices.db", min_support: int = MIN_SUPPORT):
+        self.min_support = min_support
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS invoice_templates (
+                    vendor_tax_id TEXT PRIMARY KEY,
+                    vendor_name TEXT,
+                    rules TEXT NOT NULL,
+                    support INTEGER NOT NULL DEFAULT 1,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT
+                )
+            ''')
+            rows = self.conn.execute("SELECT vendor_tax_id, rules, support FROM invoice_templates").fetchall()
+        self.templates = {tax_id: {"rules": json.loads(rules), "support": support} for tax_id, rules, support in rows}
+        self._vendor_pattern: re.Pattern | None = None
+        self.stats = {"hits": 0, "fallbacks": 0, "no_template": 0, "learned": 0, "confirmed": 0, "replaced": 0}
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+    def _pattern(self) -> re.Pattern | None:
+        if self._vendor_pattern is None and self.templates:
+            ids = sorted(self.templates, key=len, reverse=True)  # longest first: 'V12' mustn't shadow 'V123'
+            self._vendor_pattern = re.compile(
+                r"(?<![0-9A-Za-z])(?:" + "|".join(re.escape(i) for i in ids) + r")(?![0-9A-Za-z])")
+        return self._vendor_pattern
+
+    def identify(self, text: str) -> list[str]:
+        """Known vendor tax IDs in the text, in order of appearance (the customer's may be one too)."""
+        with self._lock:
+            pattern = self._pattern()
+        if pattern is None:
+            return []
+        return list(dict.fromkeys(m.group() for m in pattern.finditer(text)))
+
+    def apply(self, text: str):
+        """Invoice from a trusted template, or None (unknown vendor, untrusted template, failed check)."""
+        from validation import consistency_errors, validate_data
+
+        candidates = [tax_id for tax_id in self.identify(text)
+                      if self.templates[tax_id]["support"] >= self.min_support]
+        if not candidates:
+            with self._lock:
+                self.stats["no_template"] += 1
+            return None
+        reason = "no match"
+        for tax_id in candidates:
+            rules = self.templates[tax_id]["rules"]
+            data = apply_rules(text, rules)
+            reason = "anchor not found" if data is None else check(data, rules, tax_id)
+            if reason is None:
+                invoice_obj, _, invalid = validate_data(data)
+                errors = [f"invalid {path}" for path in invalid] or consistency_errors(invoice_obj)
+                if not errors:
+                    self._bump(tax_id, "hits")
+                    return invoice_obj
+                reason = "; ".join(errors)
+            self._bump(tax_id, "failures")
+        logging.info(f"🟡 Template check failed ({reason}), falling back to the LLM")
+        with self._lock:
+            self.stats["fallbacks"] += 1
+        return None
+
+    def learn(self, text: str, invoice_obj) -> None:
+        """Confirm, create or replace the vendor's template from an LLM extraction of `text`."""
+        from validation import consistency_errors
+
+        if consistency_errors(invoice_obj):
+            return  # never learn from (or confirm with) an answer that fails the checks itself
+        invoice = invoice_obj.model_dump()
+        tax_id = str(invoice["vendor"]["taxId"]).strip()
+        if not tax_id:
+            return
+        with self._lock:
+            known = self.templates.get(tax_id)
+        if known is not None:
+            data = apply_rules(text, known["rules"])
+            if data is not None and all(_same(kind, get_path(data, path), get_path(invoice, path))
+                                        for path, kind in FIELDS.items()):
+                self._save(tax_id, invoice["vendor"]["name"], known["rules"], known["support"] + 1, "confirmed")
+                return
+        rules = learn_rules(text, invoice)
+        if rules is None:
+            logging.info(f"🔵 No template for vendor {tax_id}: layout not describable by anchors")
+            return
+        self._save(tax_id, invoice["vendor"]["name"], rules, 1, "learned" if known is None else "replaced")
+
+    def _save(self, tax_id: str, vendor_name: str, rules: dict, support: int, outcome: str) -> None:
+        now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock, self.conn:
+            self.conn.execute('''
+                INSERT INTO invoice_templates (vendor_tax_id, vendor_name, rules, support, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(vendor_tax_id) DO UPDATE SET vendor_name = excluded.vendor_name,
+                    rules = excluded.rules, support = excluded.support, updated_at = excluded.updated_at
+            ''', (tax_id, vendor_name, json.dumps(rules), support, now))
+            if tax_id not in self.templates:
+                self._vendor_pattern = None
+            self.templates[tax_id] = {"rules": rules, "support": support}
+            self.stats[outcome] += 1
+        if outcome != "confirmed":
+            logging.info(f"🔵 Template {outcome} for vendor {tax_id} ({vendor_name})")
+
+    def _bump(self, tax_id: str, column: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE invoice_templates SET {column} = {column} + 1 WHERE vendor_tax_id = ?",
+                              (tax_id,))
+            if column == "hits":
+                self.stats["hits"] += 1
+
+    def forget(self, tax_id: str) -> bool:
+        with self._lock, self.conn:
+            deleted = self.conn.execute("DELETE FROM invoice_templates WHERE vendor_tax_id = ?", (tax_id,)).rowcount
+            self.templates.pop(tax_id, None)
+            self._vendor_pattern = None
+        return bool(deleted)
+
+    def rows(self) -> list[tuple]:
+        with self._lock:
+            return self.conn.execute('''
+                SELECT vendor_tax_id, vendor_name, support, hits, failures, updated_at
+                FROM invoice_templates ORDER BY hits DESC, vendor_tax_id
+            ''').fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-vendor extraction templates in invoices.db.")
+    parser.add_argument("--db", default="invoices.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    forget_cmd = commands.add_parser("forget")
+    forget_cmd.add_argument("vendor_tax_id")
+    args = parser.parse_args()
+
+    store = TemplateStore(args.db)
+    if args.command == "list":
+        header = f"{'vendor tax ID':<18}{'vendor':<28}{'support':>8}{'hits':>8}{'failures':>10}  updated"
+        print(header)
+        print("-" * len(header))
+        for tax_id, name, support, hits, failures, updated in store.rows():
+            trusted = "" if support >= store.min_support else " (learning)"
+            print(f"{tax_id[:17]:<18}{(name or '')[:27]:<28}{support:>8}{hits:>8}{failures:>10}  {updated}{trusted}")
+    elif store.forget(args.vendor_tax_id):
+        print(f"Forgot the template for {args.vendor_tax_id}")
+    else:
+        print(f"No template for {args.vendor_tax_id}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
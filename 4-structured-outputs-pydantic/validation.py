@@ -0,0 +1,82 @@
+import logging
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from models import Invoice, INVOICE_RESPONSE_SCHEMA
+from structured import normalize_date, normalize_date_or_keep, parse_lenient, repair_against_schema
+
+
+# Built once: pydantic compiles the validator (and its JSON parser) up front.
+INVOICE_ADAPTER = TypeAdapter(Invoice)
+# Letters/digits with the usual separators ("DE 123 456 789", "0101-234/5"), and at least one digit.
+TAX_ID = re.compile(r"(?=.*\d)[A-Za-z0-9][A-Za-z0-9 .\-/]{1,24}")
+
+
+def _error_paths(error: ValidationError) -> list[str]:
+    paths = []
+    for err in error.errors():
+        path = ".".join(str(part) for part in err["loc"])
+        if path and path not in paths:
+            paths.append(path)
+    return paths
+
+
+def parse_invoice(text: str) -> tuple[Invoice | None, dict | None, list[str]]:
+    """Validate a model response as an Invoice, repairing it locally if needed.
+
+    Returns (invoice, raw_data, invalid_paths); invoice is None while
+    invalid_paths is non-empty.
+    """
+    try:
+        # fast path: pydantic-core parses and validates the JSON in one go
+        invoice = INVOICE_ADAPTER.validate_json(text)
+        invoice.date = normalize_date_or_keep(invoice.date)
+        return invoice, None, []
+    except ValidationError:
+        pass
+
+    try:
+        data = parse_lenient(text)
+    except ValueError:
+        return None, None, ["$"]
+    invoice, data, invalid = validate_data(data)
+    if invoice is not None:
+        logging.info("🟡 Invoice JSON needed local repair")
+    return invoice, data, invalid
+
+
+def validate_data(data) -> tuple[Invoice | None, dict | None, list[str]]:
+    data, invalid = repair_against_schema(data, INVOICE_RESPONSE_SCHEMA)
+    if invalid:
+        return None, data, invalid
+    try:
+        invoice = INVOICE_ADAPTER.validate_python(data)
+    except ValidationError as e:
+        return None, data, _error_paths(e)
+    return invoice, data, []
+
+
+def consistency_errors(invoice: Invoice) -> list[str]:
+    """Cross-field problems a schema-valid invoice can still have; empty when it looks right."""
+    errors = []
+    if invoice.totalAmount <= 0:
+        errors.append("totalAmount is not positive")
+    if invoice.tax < 0:
+        errors.append("tax is negative")
+    elif invoice.tax > invoice.totalAmount:
+        errors.append("tax exceeds totalAmount")
+    for party in ("vendor", "customer"):
+        if not TAX_ID.fullmatch(getattr(invoice, party).taxId.strip()):
+            errors.append(f"{party}.taxId is malformed")
+    if _tax_key(invoice.vendor.taxId) == _tax_key(invoice.customer.taxId):
+        errors.append("vendor and customer share a tax ID")
+    try:
+        normalize_date(invoice.date)
+    except (ValueError, TypeError):
+        errors.append("date is not a date")
+    return errors
+
+
+def _tax_key(tax_id: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]", "", tax_id).upper()
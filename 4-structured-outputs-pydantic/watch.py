@@ -0,0 +1,408 @@
+"""Watch a folder tree and ingest new invoice PDFs as they land.
+
+    python watch.py archive/                 # keep watching, rescans every --interval seconds
+    python watch.py archive/ --once          # one incremental pass, then exit
+    python watch.py archive/ --once --fake   # offline, against the mock LLM
+
+Every file is recorded in the `ingested_files` manifest in invoices.db (path,
+size, mtime, sha256, status), so unchanged files are never re-extracted, and a
+byte-identical copy of an already loaded invoice is marked as a duplicate
+instead of being sent to Gemini again.
+
+A rescan stays cheap on a huge archive: each directory's mtime is cached in
+`scanned_dirs`, and a directory whose mtime hasn't moved (nothing was added,
+removed or renamed in it) is not listed again; only its known subdirectories
+are visited. So the cost of a pass grows with the number of directories and new
+files, not with the number of PDFs already in the archive. Files edited in
+place don't bump their directory's mtime; `--full` re-lists everything.
+
+With the optional `watchdog` package installed, file system events (inotify
+on Linux) wake the scanner right away instead of waiting for the next poll.
+"""
+import argparse
+import hashlib
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from main import (
+    INSERT_INVOICE_SQL,
+    DuplicateInvoice,
+    configure_genai,
+    extract_invoice,
+    invoice_row,
+    load_api_key,
+    open_dedup,
+    open_templates,
+    read_pdf_text,
+    setup_database,
+)
+
+# Files modified more recently than this may still be being copied in.
+SETTLE_SECONDS = 2.0
+
+
+# ========== Manifest ==========
+class Manifest:
+    """ingested_files + scanned_dirs, on one connection shared by the scanner and the workers."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._in_progress: dict[str, threading.Event] = {}
+        with self._lock, conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ingested_files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    sha256 TEXT,
+                    status TEXT,
+                    invoice_id INTEGER,
+                    duplicate_of TEXT,
+                    error TEXT,
+                    updated_at TEXT
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS ingested_files_sha256 ON ingested_files (sha256)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS scanned_dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS scanned_dirs_parent ON scanned_dirs (parent)")
+
+    # --- directories ---
+    def dir_mtime(self, path: str) -> int | None:
+        with self._lock:
+            row = self.conn.execute("SELECT mtime_ns FROM scanned_dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def child_dirs(self, path: str) -> list[str]:
+        with self._lock:
+            return [p for (p,) in self.conn.execute("SELECT path FROM scanned_dirs WHERE parent = ?", (path,))]
+
+    def save_dir(self, path: str, mtime_ns: int | None, subdirs: list[str]) -> None:
+        """Remember a listed directory and its subdirectories (whose own mtimes stay as they were)."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO scanned_dirs (path, parent, mtime_ns) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+                (path, os.path.dirname(path), mtime_ns))
+            self.conn.executemany("INSERT OR IGNORE INTO scanned_dirs (path, parent, mtime_ns) VALUES (?, ?, NULL)",
+                                  [(sub, path) for sub in subdirs])
+            placeholders = ",".join("?" * len(subdirs))
+            self.conn.execute(f"DELETE FROM scanned_dirs WHERE parent = ? AND path NOT IN ({placeholders})",
+                              (path, *subdirs))
+
+    # --- files ---
+    def is_known(self, path: str, size: int, mtime_ns: int) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime_ns FROM ingested_files WHERE path = ?", (path,)).fetchone()
+        return row is not None and (row[0], row[1]) == (size, mtime_ns)
+
+    def mark_queued(self, path: str, size: int, mtime_ns: int) -> None:
+        # recorded before processing: if we crash, the next run picks queued files up again
+        self._upsert(path, size=size, mtime_ns=mtime_ns, status="queued", error=None)
+
+    def queued(self) -> list[str]:
+        with self._lock:
+            return [p for (p,) in self.conn.execute("SELECT path FROM ingested_files WHERE status = 'queued'")]
+
+    def failed(self, root: str) -> list[str]:
+        """Failed files under `root`, straight from the manifest: their directories may not be listed again."""
+        prefix = os.path.join(os.path.abspath(root), "")
+        with self._lock:
+            rows = self.conn.execute("SELECT path FROM ingested_files WHERE status = 'failed'").fetchall()
+        return [p for (p,) in rows if p.startswith(prefix)]
+
+    def entry(self, path: str) -> tuple[str | None, int | None, str | None] | None:
+        """(sha256, invoice_id, duplicate_of) from the last time `path` was ingested."""
+        with self._lock:
+            return self.conn.execute("SELECT sha256, invoice_id, duplicate_of FROM ingested_files WHERE path = ?",
+                                     (path,)).fetchone()
+
+    def loaded_hash(self, sha256: str, path: str) -> tuple[str, int] | None:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT path, invoice_id FROM ingested_files WHERE sha256 = ? AND status = 'loaded' AND path != ? "
+                "LIMIT 1", (sha256, path)).fetchone()
+
+    def record_loaded(self, path: str, sha256: str, invoice_obj, replaces: int | None = None) -> int:
+        # the invoice row and its manifest entry commit together
+        with self._lock, self.conn:
+            if replaces is not None:  # the PDF was edited: its new extraction supersedes the old row
+                self.conn.execute("DELETE FROM invoices WHERE id = ?", (replaces,))
+            invoice_id = self.conn.execute(INSERT_INVOICE_SQL, invoice_row(invoice_obj)).lastrowid
+            self._upsert_locked(path, sha256=sha256, status="loaded", invoice_id=invoice_id,
+                                duplicate_of=None, error=None)
+        return invoice_id
+
+    def claim(self, sha256: str) -> threading.Event | None:
+        """Reserve a content hash for this worker; returns the owner's event to wait on if it's taken."""
+        with self._lock:
+            if sha256 in self._in_progress:
+                return self._in_progress[sha256]
+            self._in_progress[sha256] = threading.Event()
+            return None
+
+    def release(self, sha256: str) -> None:
+        with self._lock:
+            self._in_progress.pop(sha256).set()
+
+    def record(self, path: str, **fields) -> None:
+        self._upsert(path, **fields)
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM ingested_files GROUP BY status"))
+
+    def _upsert(self, path: str, **fields) -> None:
+        with self._lock, self.conn:
+            self._upsert_locked(path, **fields)
+
+    def _upsert_locked(self, path: str, **fields) -> None:
+        fields["updated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        columns = ", ".join(fields)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in fields)
+        self.conn.execute(
+            f"INSERT INTO ingested_files (path, {columns}) VALUES (?{', ?' * len(fields)}) "
+            f"ON CONFLICT(path) DO UPDATE SET {updates}",
+            (path, *fields.values()))
+
+
+# ========== Scanning ==========
+class ScanStats:
+    def __init__(self):
+        self.dirs_visited = 0
+        self.dirs_listed = 0
+        self.files_seen = 0
+        self.new_files = 0
+        self.deferred = 0
+
+    def __str__(self) -> str:
+        return (f"{self.new_files} new files, {self.dirs_listed}/{self.dirs_visited} dirs listed, "
+                f"{self.files_seen} PDFs checked, {self.deferred} still settling")
+
+
+def scan(root: str, manifest: Manifest, stats: ScanStats, full: bool = False, settle: float = SETTLE_SECONDS):
+    """Yield (path, size, mtime_ns) for PDFs under `root` that aren't in the manifest yet (or changed)."""
+    stack = [os.path.abspath(root)]
+    while stack:
+        directory = stack.pop()
+        stats.dirs_visited += 1
+        try:
+            dir_mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if not full and manifest.dir_mtime(directory) == dir_mtime:
+            stack.extend(manifest.child_dirs(directory))
+            continue
+
+        stats.dirs_listed += 1
+        subdirs, settling = [], False
+        now = time.time()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except (FileNotFoundError, PermissionError) as e:
+            logging.warning(f"🟡 Can't list {directory}: {e}")
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not (entry.name.lower().endswith(".pdf") and entry.is_file()):
+                    continue
+                st = entry.stat()  # cached by scandir on Windows, one stat() call elsewhere
+            except FileNotFoundError:
+                continue
+            stats.files_seen += 1
+            if manifest.is_known(entry.path, st.st_size, st.st_mtime_ns):
+                continue
+            if now - st.st_mtime < settle:
+                stats.deferred += 1
+                settling = True
+                continue
+            stats.new_files += 1
+            yield entry.path, st.st_size, st.st_mtime_ns
+
+        # a directory with files still being written must be listed again next pass
+        manifest.save_dir(directory, None if settling else dir_mtime, subdirs)
+        stack.extend(subdirs)
+
+
+# ========== Ingestion ==========
+def ingest_file(manifest: Manifest, path: str, templates=None, dedup=None) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    # two copies of one PDF in the same pass: the second waits and then sees the first as loaded
+    while (owner := manifest.claim(sha256)) is not None:
+        owner.wait()
+    try:
+        return _ingest_content(manifest, path, data, sha256, templates, dedup)
+    finally:
+        manifest.release(sha256)
+
+
+def _ingest_content(manifest: Manifest, path: str, data: bytes, sha256: str, templates=None, dedup=None) -> str:
+    previous_sha, previous_invoice, duplicate_of = manifest.entry(path) or (None, None, None)
+    if previous_sha == sha256 and previous_invoice is not None:
+        # only touched (mtime changed, same bytes): nothing to re-extract
+        status = "duplicate" if duplicate_of else "loaded"
+        manifest.record(path, status=status, error=None)
+        return status
+    if original := manifest.loaded_hash(sha256, path):
+        manifest.record(path, sha256=sha256, status="duplicate", invoice_id=original[1],
+                        duplicate_of=original[0], error=None)
+        logging.info(f"🔵 {path} is a copy of {original[0]}, skipped")
+        return "duplicate"
+
+    try:
+        pdf_content = read_pdf_text(io.BytesIO(data))
+        # edited in place: the index would match the file's own earlier version, same number and tax ID
+        edited = previous_invoice is not None and not duplicate_of
+        invoice_obj = extract_invoice(pdf_content, templates, dedup=None if edited else dedup, source=path)
+    except DuplicateInvoice as e:
+        # a re-sent scan or reminder copy: not byte-identical, but the same invoice
+        original = manifest.entry(e.match.source) if e.match.source else None
+        manifest.record(path, sha256=sha256, status="duplicate", invoice_id=original[1] if original else None,
+                        duplicate_of=e.match.source, error=None)
+        return "duplicate"
+    invoice_id = manifest.record_loaded(path, sha256, invoice_obj,
+                                        replaces=None if duplicate_of else previous_invoice)
+    if dedup is not None:
+        dedup.add(pdf_content, invoice_obj, path)
+    logging.info(f"✅ {path} -> invoice {invoice_id}")
+    return "loaded"
+
+
+def worker(manifest: Manifest, jobs: queue.Queue, templates=None, dedup=None) -> None:
+    while (path := jobs.get()) is not None:
+        try:
+            ingest_file(manifest, path, templates, dedup)
+        except Exception as e:
+            manifest.record(path, status="failed", error=str(e))
+            logging.error(f"🔴 {path}: {e}")
+        finally:
+            jobs.task_done()
+    jobs.task_done()
+
+
+def start_watchdog(root: str, wake: threading.Event):
+    """Wake the scanner on file system events; None when `watchdog` isn't installed."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class WakeOnChange(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    observer.schedule(WakeOnChange(), root, recursive=True)
+    observer.start()
+    return observer
+
+
+def watch(root: str, workers: int = 4, interval: float = 10.0, once: bool = False, full: bool = False,
+          retry_failed: bool = False, settle: float = SETTLE_SECONDS) -> None:
+    manifest = Manifest(setup_database(check_same_thread=False))
+    manifest.conn.execute("PRAGMA journal_mode=WAL")
+    templates = open_templates()
+    dedup = open_dedup()
+    # bounded, so the scanner streams files to the workers instead of listing the whole archive first
+    jobs: queue.Queue[str | None] = queue.Queue(maxsize=workers * 4)
+    threads = [threading.Thread(target=worker, args=(manifest, jobs, templates, dedup), daemon=True)
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    for path in manifest.queued():  # left over from an interrupted run
+        jobs.put(path)
+    if retry_failed:
+        failed = manifest.failed(root)
+        logging.info(f"🔵 Retrying {len(failed)} failed files")
+        for path in failed:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            manifest.mark_queued(path, st.st_size, st.st_mtime_ns)
+            jobs.put(path)
+
+    wake = threading.Event()
+    observer = None if once else start_watchdog(root, wake)
+    if not once:
+        logging.info(f"👀 Watching {root} ({'file system events' if observer else f'polling every {interval:.0f}s'})")
+    try:
+        while True:
+            wake.clear()
+            stats, start = ScanStats(), time.monotonic()
+            for path, size, mtime_ns in scan(root, manifest, stats, full, settle):
+                manifest.mark_queued(path, size, mtime_ns)
+                jobs.put(path)
+            log = logging.info if stats.new_files or once else logging.debug  # idle polls stay quiet
+            log(f"🔵 Scan of {root} in {time.monotonic() - start:.2f}s: {stats}")
+            full = False  # only the first pass
+            if once:
+                if stats.deferred:
+                    logging.info("🟡 Some files were still being written; they'll be picked up next run")
+                break
+            # an event (or settling files) means rescan soon; otherwise wait for the next poll
+            wake.wait(settle if stats.deferred else interval)
+            if observer:
+                time.sleep(0.5)  # let a burst of events from one copy finish before rescanning
+        jobs.join()
+    except KeyboardInterrupt:
+        logging.info("🟡 Stopping: files still queued are picked up on the next run")
+    finally:
+        if observer:
+            observer.stop()
+        for _ in threads:
+            try:
+                jobs.put_nowait(None)
+            except queue.Full:
+                break
+        logging.info(f"📒 Manifest: {manifest.counts()}")
+        if templates is not None:
+            logging.info(f"🔵 Templates: {templates.stats}")
+        if dedup is not None:
+            logging.info(f"🔵 Duplicates: {dedup.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest invoice PDFs from a folder tree.")
+    parser.add_argument("path", help="folder to watch (searched recursively)")
+    parser.add_argument("--once", action="store_true", help="one pass, then exit")
+    parser.add_argument("--interval", type=float, default=10.0, help="seconds between polls")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent extractions")
+    parser.add_argument("--full", action="store_true", help="re-list every directory (catches files edited in place)")
+    parser.add_argument("--retry-failed", action="store_true", help="retry files that failed before")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="skip files modified less than this ago")
+    parser.add_argument("--fake", action="store_true", help="use the mock LLM (offline)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.path):
+        print(f"Error: The folder '{args.path}' does not exist.")
+        return
+    if args.fake:
+        import mock_llm
+        mock_llm.install_genai()
+    else:
+        configure_genai(load_api_key())
+    watch(args.path, args.workers, args.interval, args.once, args.full, args.retry_failed, args.settle)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
-import json
 import sys
 import os
-import sqlite3
-import google.generativeai as genai
-
-from pypdf import PdfReader
-from dotenv import load_dotenv
-import requests
 import logging
-from pydantic import BaseModel, Field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from rate_limit import rate_limited_generate
+from tracing import traced
+from profiling import profile_from_argv
+from prompting import PromptBuilder
+
+# Whole prompt; example posts are dropped from the end to fit.
+ARTICLE_PROMPT_TOKENS = int(os.getenv("ARTICLE_PROMPT_TOKENS", "100000"))
 
 
 # --- Setup logging ---
@@ -22,6 +23,7 @@ logging.basicConfig(
 # ========== Gemini ==========
 def load_api_key() -> str:
     logging.info("🔑 Loading API key...")
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -33,6 +35,7 @@ def load_api_key() -> str:
 
 def configure_genai(api_key: str):
     logging.info("⚙️ Configuring Gemini client...")
+    import google.generativeai as genai
     genai.configure(api_key=api_key)
     logging.info("🟢 Gemini client configured")
 
@@ -53,7 +56,10 @@ def save_file(path: str, content: str) -> None:
         file.write(content)
         
         
+@traced
 def generate_article_draft(outline: str, existing_draft: str | None = None, feedback: str | None = None) -> str:
+    import google.generativeai as genai
+
     logging.info("Generating article draft...")
     example_posts_path = "example_posts"
 
@@ -62,7 +68,7 @@ def generate_article_draft(outline: str, existing_draft: str | None = None, feed
             f"The directory '{example_posts_path}' does not exist.")
         
     example_posts = []
-    for filename in os.listdir(example_posts_path):
+    for filename in sorted(os.listdir(example_posts_path)):
         if filename.lower().endswith(".md") or filename.lower().endswith(".mdx"):
             with open(os.path.join(example_posts_path, filename), 'r', encoding='utf-8') as file:
                 example_posts.append(file.read())
@@ -70,89 +76,45 @@ def generate_article_draft(outline: str, existing_draft: str | None = None, feed
     if not example_posts:
         raise ValueError("No example blog posts found in the 'example_posts' directory.")
     
-    example_posts_str = "\n\n".join(
-        f"<example-post-{i+1}>\n{post}\n</example-post-{i+1}>"
-        for i, post in enumerate(example_posts)
-    )
-    
-    prompt = f"""
-                Write a detailed blog post based on the following outline:
-
-                <outline>
-                {outline}
-                </outline>
-
-                Below are some example blog posts I wrote in the past:
-                <example-posts>
-                {example_posts_str}
-                </example-posts>
-
-                Use the language, tone, style and way of writing from the example posts to generate your draft for the new blog post.
-                DON'T use the content from those example posts!
-
-                Return the blog post draft in raw markdown format so that I can directly use it in my markdown-processing pipeline.
-                Don't add any additional text or explanations, just return the raw markdown content.
-            """
-            
-    if existing_draft and feedback:
-        example_posts_str += f"\n\n<existing-draft>\n{existing_draft}\n</existing-draft>"
-        example_posts_str += f"\n\n<feedback>\n{feedback}\n</feedback>"
-
-        prompt = f"""
-            Write an improved version of the following blog post draft:
-
-            <existing-draft>
-            {existing_draft}
-            </existing-draft>
-
-            The following feedback should be taken into account when writing the improved draft:
-
-            <feedback>
-            {feedback}
-            </feedback>
-
-            The original draft AND your improved version should be based on the following outline:
-
-            <outline>
-            {outline}
-            </outline>
-
-            Below are some example blog posts I wrote in the past:
-            <example-posts>
-            {example_posts_str}
-            </example-posts>
-
-            Use the language, tone, style and way of writing from the example posts to generate your draft for the new blog post.
-            DON'T use the content from those example posts!
-
-            Return the blog post draft in raw markdown format so that I can directly use it in my markdown-processing pipeline.
-            Don't add any additional text or explanations, just return the raw markdown content.
-        """
-        
-    
-    
-            
-    
-    
-        
-        
-
     logging.info("Example posts loaded successfully")
-    return example_posts
+    builder = PromptBuilder("generate_article_draft", budget=ARTICLE_PROMPT_TOKENS, overflow="truncate")
+    if existing_draft and feedback:
+        builder.text("Write an improved version of the following blog post draft:")
+        builder.block("existing-draft", existing_draft)
+        builder.text("The following feedback should be taken into account when writing the improved draft:")
+        builder.block("feedback", feedback)
+        builder.text("The original draft AND your improved version should be based on the following outline:")
+    else:
+        builder.text("Write a detailed blog post based on the following outline:")
+    builder.block("outline", outline)
+    builder.text("Below are some example blog posts I wrote in the past:")
+    builder.examples("example-posts", example_posts, item_tag="example-post")
+    builder.text("""
+        Use the language, tone, style and way of writing from the example posts to generate your draft for the new blog post.
+        DON'T use the content from those example posts!
+
+        Return the blog post draft in raw markdown format so that I can directly use it in my markdown-processing pipeline.
+        Don't add any additional text or explanations, just return the raw markdown content.
+    """)
+    prompt = builder.build()
+
+    model = genai.GenerativeModel("gemini-1.5-flash")
+    response = rate_limited_generate(model, prompt)
+    logging.info("🟢 Response received from Gemini API")
+    return response.text
 
 
 def main():
-    
-    api_key = load_api_key()
-    configure_genai(api_key)
-    
-    if len(sys.argv) != 2:
+    if len(sys.argv) != 2 or sys.argv[1] in ("-h", "--help"):
         print("Usage: python main.py <outline_file>")
         sys.exit(1)
 
     outline_file = sys.argv[1]
     outline = load_file(outline_file)
 
+    api_key = load_api_key()
+    configure_genai(api_key)
+
     blog_post_draft = generate_article_draft(outline)
     print("Generated blog post draft:")
     print(blog_post_draft)
@@ -169,4 +131,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile_from_argv():
+        main()
\ No newline at end of file
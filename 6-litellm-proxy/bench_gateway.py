@@ -0,0 +1,190 @@
+"""Load test for gateway.py against a local stub provider (no API calls).
+
+    uv run python bench_gateway.py
+    uv run python bench_gateway.py --requests 5000 --jobs 4 --concurrency 32 --prompts 300 --json
+
+Several jobs (each with its own connection pool, like separate processes) send
+chat completions, with prompts drawn from a Zipf-like popularity curve so the
+same prompt is often in flight twice. The same load runs three times:
+
+- direct: every job calls the stub provider itself,
+- gateway: through the gateway, coalescing off (pooling and the limit only),
+- gateway + coalescing: identical in-flight requests share one upstream call.
+
+The stub counts upstream calls, the TCP connections it accepted and the
+highest number of calls it had in flight per model.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+from aiohttp import web
+
+from gateway import Gateway, make_app
+
+MODEL = "stub-chat"
+
+
+# ========== Stub provider ==========
+class StubProvider:
+    def __init__(self, latency: float, seed: int = 7):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections: set = set()
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        self.connections.add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency * self.rng.lognormvariate(0.0, 0.25))
+        finally:
+            self.in_flight -= 1
+        prompt = body["messages"][-1]["content"]
+        return web.json_response({
+            "id": f"stub-{self.calls}",
+            "object": "chat.completion",
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"answer to {prompt}"}}],
+            "usage": {"prompt_tokens": len(prompt) // 4 + 1, "completion_tokens": 8,
+                      "total_tokens": len(prompt) // 4 + 9},
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([web.post("/v1/chat/completions", self.chat_completions)])
+        return app
+
+
+async def serve(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/v1"
+
+
+# ========== Load ==========
+def make_prompts(n_requests: int, n_prompts: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(n_prompts)]
+    return [f"Summarize document #{i}" for i in rng.choices(range(n_prompts), weights, k=n_requests)]
+
+
+async def run_jobs(base_url: str, model: str, prompts: list[str], jobs: int, concurrency: int) -> dict:
+    import aiohttp
+
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for prompt in prompts:
+        queue.put_nowait(prompt)
+
+    async def worker(session) -> None:
+        nonlocal errors
+        while not queue.empty():
+            prompt = queue.get_nowait()
+            body = {"model": model, "messages": [{"role": "user", "content": prompt}], "temperature": 0}
+            start = time.monotonic()
+            async with session.post(f"{base_url}/chat/completions", json=body) as response:
+                await response.read()
+                errors += response.status != 200
+            latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    sessions = [aiohttp.ClientSession() for _ in range(jobs)]  # one pool per job, as separate processes have
+    try:
+        per_job = max(1, concurrency // jobs)
+        await asyncio.gather(*(worker(session) for session in sessions for _ in range(per_job)))
+    finally:
+        for session in sessions:
+            await session.close()
+    wall = time.monotonic() - start
+    latencies.sort()
+    return {
+        "wall_s": wall,
+        "errors": errors,
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p99_ms": 1000 * latencies[max(0, math.ceil(len(latencies) * 0.99) - 1)],
+    }
+
+
+async def bench(args) -> dict:
+    stub = StubProvider(args.latency, args.seed)
+    stub_runner, stub_url = await serve(stub.app())
+    prompts = make_prompts(args.requests, args.prompts, args.seed)
+    config = {"model_list": [
+        {"model_name": MODEL, "litellm_params": {"model": f"openai/stub-{i}", "api_base": stub_url,
+                                                 "api_key": "stub", "max_parallel_requests": args.limit // 2}}
+        for i in range(2)
+    ]}
+
+    results = {}
+    try:
+        stub.reset()
+        direct = await run_jobs(stub_url, "stub-direct", prompts, args.jobs, args.concurrency)
+        results["direct"] = {**direct, "upstream_calls": stub.calls, "connections": len(stub.connections),
+                             "max_in_flight": stub.max_in_flight}
+
+        for name, coalesce in (("gateway", False), ("gateway + coalescing", True)):
+            stub.reset()
+            gateway = Gateway(config, coalesce=coalesce)
+            runner, gateway_url = await serve(make_app(gateway))
+            try:
+                run = await run_jobs(gateway_url, MODEL, prompts, args.jobs, args.concurrency)
+            finally:
+                await runner.cleanup()
+            results[name] = {**run, "upstream_calls": stub.calls, "connections": len(stub.connections),
+                             "max_in_flight": stub.max_in_flight, "coalesced": gateway.stats[MODEL].coalesced}
+    finally:
+        await stub_runner.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test gateway.py against a local stub provider.")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--jobs", type=int, default=3, help="concurrent client jobs, each with its own pool")
+    parser.add_argument("--concurrency", type=int, default=48, help="requests in flight over all jobs")
+    parser.add_argument("--prompts", type=int, default=200, help="distinct prompts (Zipf-like popularity)")
+    parser.add_argument("--latency", type=float, default=0.1, help="median stub latency, seconds")
+    parser.add_argument("--limit", type=int, default=16, help="gateway limit for the model (split over 2 deployments)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.requests} requests from {args.jobs} jobs, {args.concurrency} in flight, "
+          f"{args.prompts} distinct prompts, gateway limit {args.limit}\n")
+    header = (f"{'':<22}{'upstream':>10}{'saved':>8}{'conns':>7}{'max in flight':>15}"
+              f"{'p50 ms':>9}{'p99 ms':>9}{'wall s':>8}")
+    print(header)
+    print("-" * len(header))
+    baseline = results["direct"]["upstream_calls"]
+    for name, r in results.items():
+        saved = 1 - r["upstream_calls"] / baseline if baseline else 0.0
+        print(f"{name:<22}{r['upstream_calls']:>10}{100 * saved:>7.1f}%{r['connections']:>7}{r['max_in_flight']:>15}"
+              f"{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['wall_s']:>8.2f}")
+    errors = sum(r["errors"] for r in results.values())
+    if errors:
+        print(f"\n🔴 {errors} requests failed")
+
+
+if __name__ == "__main__":
+    main()
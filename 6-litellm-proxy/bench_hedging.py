@@ -0,0 +1,115 @@
+"""Tail latency with and without hedging, against the heavy-tailed fake provider.
+
+    uv run python bench_hedging.py --requests 2000 --concurrency 32
+    uv run python bench_hedging.py --tail-prob 0.1 --max-hedge-rate 0.2 --json
+
+Both runs see the same latency distribution (same seed). The report shows
+p50/p95/p99/max, the hedge rate, how often the backup won, and the extra
+cost of hedging as booked by track_cost_callback.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+
+import track_cost_callback
+from fake_provider import FakeProvider, FakeProviderConfig
+from hedging import Hedger
+
+MESSAGES = [{"role": "user", "content": "Summarize today's invoices in one sentence."}]
+MODEL = "gemini/gemini-1.5-flash"
+HEDGE_MODEL = "gemini/gemini-1.5-flash-8b"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+async def run(config: FakeProviderConfig, requests: int, concurrency: int, hedger: Hedger | None,
+              hedge_model: str | None) -> dict:
+    track_cost_callback.COST_STATS.reset()
+    provider = FakeProvider(config, success_callbacks=[track_cost_callback.track_cost_callback])
+    if hedger is not None:
+        hedger._acompletion = provider.acompletion
+        hedger.prompt_cost = provider.prompt_cost
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one():
+        async with semaphore:
+            start = time.monotonic()
+            if hedger is None:
+                await provider.acompletion(model=MODEL, messages=MESSAGES)
+            else:
+                await hedger.acompletion(MODEL, MESSAGES, hedge_model=hedge_model)
+            latencies.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.monotonic() - start
+    await asyncio.sleep(0)  # let cancelled losers settle
+
+    costs = track_cost_callback.COST_STATS
+    result = {
+        "mode": "hedged" if hedger else "single",
+        "requests": requests,
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "provider_calls": provider.started,
+        "cancelled": provider.cancelled,
+        "cost": costs.total_cost(),
+        "cost_by_role": {role: round(t["cost"], 6) for role, t in costs.by_role.items()},
+    }
+    if hedger is not None:
+        result.update({k: v for k, v in hedger.stats().items() if k != "delays"})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedged vs single requests against a heavy-tailed fake provider.")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--median", type=float, default=0.05, help="median provider latency (s)")
+    parser.add_argument("--tail-prob", type=float, default=0.05)
+    parser.add_argument("--tail-scale", type=float, default=10.0)
+    parser.add_argument("--tail-alpha", type=float, default=1.5)
+    parser.add_argument("--percentile", type=float, default=95, help="hedge after this latency percentile")
+    parser.add_argument("--max-hedge-rate", type=float, default=0.10)
+    parser.add_argument("--same-model", action="store_true", help="hedge to the same model, not the alternate")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    track_cost_callback.VERBOSE = False
+    config = FakeProviderConfig(median=args.median, tail_prob=args.tail_prob, tail_scale=args.tail_scale,
+                                tail_alpha=args.tail_alpha, seed=args.seed)
+    hedger = Hedger(percentile=args.percentile, max_hedge_rate=args.max_hedge_rate, default_delay=4 * args.median)
+    results = [
+        asyncio.run(run(config, args.requests, args.concurrency, None, None)),
+        asyncio.run(run(config, args.requests, args.concurrency, hedger, None if args.same_model else HEDGE_MODEL)),
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = f"{'mode':<8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'calls':>8}{'hedge %':>9}{'wins':>6}{'cost $':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        hedge_rate = f"{100 * r['hedge_rate']:.1f}" if "hedge_rate" in r else "-"
+        print(f"{r['mode']:<8}{1000 * r['p50']:>9.1f}{1000 * r['p95']:>9.1f}{1000 * r['p99']:>9.1f}"
+              f"{1000 * r['max']:>9.1f}{r['provider_calls']:>8}{hedge_rate:>9}{r.get('hedge_wins', '-'):>6}"
+              f"{r['cost']:>11.6f}")
+    single, hedged = results
+    print(f"\np99 {1000 * single['p99']:.0f} -> {1000 * hedged['p99']:.0f} ms, "
+          f"extra provider calls {hedged['provider_calls'] - single['provider_calls']} "
+          f"({hedged['cancelled']} cancelled), cost by role: {hedged['cost_by_role']}")
+
+
+if __name__ == "__main__":
+    main()
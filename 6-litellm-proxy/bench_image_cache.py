@@ -0,0 +1,231 @@
+"""Perceptual-hash image cache on a synthetic feed of re-uploads (no AWS calls).
+
+    uv run python bench_image_cache.py
+    uv run python bench_image_cache.py --images 500 --copies 4 --latency 0.1 --index-size 200000 --json
+
+Writes a folder of synthetic images: `--images` originals (random shapes on a
+gradient), `--copies` augmented re-uploads of each (resized, JPEG re-encoded
+at low quality, cropped by a few percent, brightened, converted to PNG, or a
+mix), and for each original a sibling: new shapes on the same background and
+canvas (a different product shot on the same backdrop), which must not hit. The folder is
+then classified in shuffled order through `classify_image`, against a fake
+endpoint that sleeps `--latency` per call, with and without the cache.
+
+It reports the hit rate, re-upload recall, false hits (labels of another
+image), endpoint calls and wall time saved, the hashing and lookup cost, the
+multi-index lookup against a linear scan on an index of `--index-size`
+random hashes, and that a save/load round trip gives the same answers.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageEnhance
+
+from image_cache import ImageCache, ImageHashes, hamming, image_hashes
+from image_classification_litellm_sagemaker import classify_image, find_images
+
+AUGMENTATIONS = ("resize", "jpeg", "crop", "brightness", "png", "mix")
+
+
+# ========== Synthetic feed ==========
+def draw_scene(rng: random.Random, shapes: list[tuple], size: tuple[int, int]) -> Image.Image:
+    top, bottom = [tuple(rng.randrange(256) for _ in range(3)) for _ in range(2)]
+    image = Image.new("RGB", size)
+    draw = ImageDraw.Draw(image)
+    for y in range(size[1]):
+        t = y / size[1]
+        draw.line([(0, y), (size[0], y)], fill=tuple(int(a + (b - a) * t) for a, b in zip(top, bottom)))
+    for kind, box, color in shapes:
+        box = [int(v * size[i % 2]) for i, v in enumerate(box)]
+        (draw.ellipse if kind == "ellipse" else draw.rectangle)(box, fill=color)
+    return image
+
+
+def random_shapes(rng: random.Random) -> list[tuple]:
+    shapes = []
+    for _ in range(rng.randint(4, 8)):
+        x, y = rng.random() * 0.7, rng.random() * 0.7
+        w, h = 0.1 + rng.random() * 0.3, 0.1 + rng.random() * 0.3
+        shapes.append((rng.choice(("ellipse", "rectangle")), (x, y, x + w, y + h),
+                       tuple(rng.randrange(256) for _ in range(3))))
+    return shapes
+
+
+def augment(rng: random.Random, image: Image.Image, kind: str) -> tuple[Image.Image, str, dict]:
+    """(image, format, save options) for one re-upload."""
+    if kind == "mix":
+        image, _, _ = augment(rng, image, "resize")
+        image, _, _ = augment(rng, image, "crop")
+        return image, "JPEG", {"quality": rng.randint(40, 80)}
+    if kind == "resize":
+        scale = rng.choice((0.4, 0.6, 0.75, 1.5, 2.0))
+        return image.resize((int(image.width * scale), int(image.height * scale))), "JPEG", {"quality": 90}
+    if kind == "jpeg":
+        return image, "JPEG", {"quality": rng.randint(20, 50)}
+    if kind == "crop":
+        w, h = image.size
+        c = rng.uniform(0.01, 0.04)
+        return image.crop((int(w * c), int(h * c), w - int(w * c), h - int(h * c))), "JPEG", {"quality": 85}
+    if kind == "brightness":
+        return ImageEnhance.Brightness(image).enhance(rng.uniform(0.85, 1.15)), "JPEG", {"quality": 85}
+    return image, "PNG", {}
+
+
+def write_feed(folder: str, images: int, copies: int, seed: int) -> dict[str, int]:
+    """Image file -> scene id; siblings get their own scene ids."""
+    rng = random.Random(seed)
+    truth = {}
+    for i in range(images):
+        size = (rng.randint(240, 640), rng.randint(240, 640))
+        shapes = random_shapes(rng)
+        original = draw_scene(random.Random(seed * 100_003 + i), shapes, size)
+        path = os.path.join(folder, f"img{i:05d}-original.jpg")
+        original.save(path, "JPEG", quality=92)
+        truth[path] = i
+        for c in range(copies):
+            kind = AUGMENTATIONS[(i + c) % len(AUGMENTATIONS)]
+            copy, fmt, options = augment(rng, original, kind)
+            path = os.path.join(folder, f"img{i:05d}-copy{c}-{kind}.{fmt.lower()}")
+            copy.save(path, fmt, **options)
+            truth[path] = i
+        sibling = draw_scene(random.Random(seed * 100_003 + i), random_shapes(rng), size)
+        path = os.path.join(folder, f"img{i:05d}-sibling.jpg")
+        sibling.save(path, "JPEG", quality=92)
+        truth[path] = images + i
+    return truth
+
+
+# ========== Runs ==========
+class FakeEndpoint:
+    """Answers the top-5 labels of the scene a file was drawn from, after `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.current = 0
+
+    def __call__(self, image_b64: str) -> list:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [{"label": f"scene-{self.current}-{k}", "score": round(0.9 / (k + 1), 3)} for k in range(5)]
+
+
+def run_feed(feed: list[str], truth: dict[str, int], latency: float, cache: ImageCache | None) -> dict:
+    endpoint = FakeEndpoint(latency)
+    seen: set[int] = set()
+    reuploads = recalled = false_hits = 0
+    start = time.perf_counter()
+    for path in feed:
+        scene = truth[path]
+        endpoint.current = scene
+        labels, cached = classify_image(path, cache, classify=endpoint)
+        if scene in seen:
+            reuploads += 1
+            recalled += cached
+        if cached and labels[0]["label"].split("-")[1] != str(scene):
+            false_hits += 1
+        seen.add(scene)
+    wall = time.perf_counter() - start
+    return {"endpoint_calls": endpoint.calls, "reuploads": reuploads, "recalled": recalled,
+            "false_hits": false_hits, "wall_s": wall,
+            **({"cache": cache.stats()} if cache is not None else {})}
+
+
+def bench_index(cache: ImageCache, index_size: int, queries: int, seed: int) -> dict:
+    """Multi-index lookup vs a linear scan over `index_size` random hashes, with the cache's thresholds."""
+    rng = random.Random(seed)
+    padded = ImageCache(capacity=index_size, max_distance=cache.max_distance, dhash_distance=cache.dhash_distance)
+    stored = [ImageHashes(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(index_size)]
+    for hashes in stored:
+        padded._store(hashes, [], None)
+    probes = []
+    for hashes in rng.sample(stored, queries // 2):  # near copies of stored hashes, and unseen hashes
+        flips = sum(1 << b for b in rng.sample(range(64), rng.randint(0, cache.max_distance)))
+        probes.append(ImageHashes(hashes.phash ^ flips, hashes.dhash))
+    probes += [ImageHashes(rng.getrandbits(64), rng.getrandbits(64)) for _ in range(queries - len(probes))]
+
+    start = time.perf_counter()
+    indexed = [padded.get(p) is not None for p in probes]
+    indexed_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scanned = [any(hamming(p.phash, s.phash) <= padded.max_distance
+                   and hamming(p.dhash, s.dhash) <= padded.dhash_distance for s in stored) for p in probes]
+    scan_s = time.perf_counter() - start
+    return {"entries": len(padded), "queries": queries, "same_answers": indexed == scanned,
+            "indexed_ms": 1000 * indexed_s / queries, "scan_ms": 1000 * scan_s / queries}
+
+
+def bench(args) -> dict:
+    with tempfile.TemporaryDirectory() as folder:
+        truth = write_feed(folder, args.images, args.copies, args.seed)
+        feed = find_images([folder])
+        random.Random(args.seed).shuffle(feed)
+
+        start = time.perf_counter()
+        for path in feed[:200]:
+            image_hashes(path)
+        hash_ms = 1000 * (time.perf_counter() - start) / min(200, len(feed))
+
+        results = {"files": len(feed), "hash_ms": hash_ms}
+        results["no cache"] = run_feed(feed, truth, args.latency, None)
+        cache = ImageCache(capacity=args.capacity)
+        results["cache"] = run_feed(feed, truth, args.latency, cache)
+
+        cache_file = os.path.join(folder, "image_cache.json")
+        cache.save(cache_file)
+        loaded = ImageCache.load(cache_file)
+        sample = [image_hashes(path) for path in feed[:200]]
+        results["persistence"] = {
+            "file_kb": os.path.getsize(cache_file) / 1024,
+            "entries": len(loaded),
+            "same_answers": [getattr(cache.get(h), "labels", None) for h in sample]
+                            == [getattr(loaded.get(h), "labels", None) for h in sample],
+        }
+        results["index"] = bench_index(cache, args.index_size, args.queries, args.seed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual-hash image cache on a synthetic feed of re-uploads.")
+    parser.add_argument("--images", type=int, default=300, help="original images")
+    parser.add_argument("--copies", type=int, default=3, help="augmented re-uploads per original")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake endpoint latency, seconds")
+    parser.add_argument("--capacity", type=int, default=50_000)
+    parser.add_argument("--index-size", type=int, default=100_000, help="random hashes for the lookup benchmark")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = bench(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    base, cached = results["no cache"], results["cache"]
+    stats = cached["cache"]
+    print(f"{results['files']} files: {args.images} originals, {args.copies} re-uploads each, "
+          f"{args.images} siblings (different images)\n")
+    header = f"{'':<10}{'endpoint calls':>16}{'hit rate':>10}{'recall':>9}{'false hits':>12}{'wall s':>9}"
+    print(header)
+    print("-" * len(header))
+    print(f"{'no cache':<10}{base['endpoint_calls']:>16}{'-':>10}{'-':>9}{'-':>12}{base['wall_s']:>9.2f}")
+    recall = cached["recalled"] / cached["reuploads"] if cached["reuploads"] else 0.0
+    print(f"{'cache':<10}{cached['endpoint_calls']:>16}{100 * stats['hit_rate']:>9.1f}%{100 * recall:>8.1f}%"
+          f"{cached['false_hits']:>12}{cached['wall_s']:>9.2f}")
+    print(f"\nhashing {results['hash_ms']:.1f} ms/image, lookup {stats['mean_lookup_ms']:.3f} ms, "
+          f"{stats['exact_hits']} exact + {stats['near_hits']} near hits, {stats['size']} entries")
+    index = results["index"]
+    print(f"lookup at {index['entries']} entries: multi-index {index['indexed_ms']:.3f} ms, "
+          f"linear scan {index['scan_ms']:.1f} ms, same answers: {index['same_answers']}")
+    persistence = results["persistence"]
+    print(f"saved {persistence['entries']} entries ({persistence['file_kb']:.0f} KB), "
+          f"same answers after load: {persistence['same_answers']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Offline stand-in for `litellm.acompletion` with heavy-tailed latency.
+
+Most calls take about `median` seconds (lognormal spread). A `tail_prob`
+share of them also stalls for a Pareto-distributed extra delay, the way real
+providers occasionally sit on a request. Every call is independent, which is
+what makes hedging work. Like LiteLLM, completed calls are passed to the
+callables in `success_callbacks` with a `response_cost`.
+"""
+import asyncio
+import random
+from dataclasses import dataclass
+from datetime import datetime
+
+
+@dataclass
+class FakeProviderConfig:
+    median: float = 0.2            # seconds
+    sigma: float = 0.25            # lognormal spread of normal calls
+    tail_prob: float = 0.05        # share of calls that stall
+    tail_scale: float = 10.0       # a stall adds tail_scale * median * Pareto(alpha)
+    tail_alpha: float = 1.5
+    price_per_1k_tokens: float = 0.0004
+    seed: int | None = None
+
+
+class FakeProvider:
+    def __init__(self, config: FakeProviderConfig | None = None, success_callbacks: list | None = None):
+        self.config = config or FakeProviderConfig()
+        self.success_callbacks = list(success_callbacks or [])
+        self._rng = random.Random(self.config.seed)
+        self.started = 0
+        self.cancelled = 0
+
+    def prompt_tokens(self, messages: list[dict]) -> int:
+        return sum(len(m.get("content", "")) for m in messages) // 4 + 1
+
+    def prompt_cost(self, model: str, messages: list[dict]) -> float:
+        return self.prompt_tokens(messages) / 1000 * self.config.price_per_1k_tokens
+
+    def sample_latency(self) -> float:
+        c = self.config
+        latency = c.median * self._rng.lognormvariate(0.0, c.sigma)
+        if self._rng.random() < c.tail_prob:
+            latency += c.tail_scale * c.median * self._rng.paretovariate(c.tail_alpha)
+        return latency
+
+    async def acompletion(self, model: str, messages: list[dict], metadata: dict | None = None, **kwargs) -> dict:
+        self.started += 1
+        start = datetime.now()
+        try:
+            await asyncio.sleep(self.sample_latency())
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        prompt_tokens = self.prompt_tokens(messages)
+        completion_tokens = 40
+        cost = (prompt_tokens + completion_tokens) / 1000 * self.config.price_per_1k_tokens
+        response = {
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"Hello from {model}!"}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+        callback_kwargs = {"model": model, "messages": messages, "response_cost": cost,
+                           "litellm_params": {"metadata": metadata or {}}}
+        for callback in self.success_callbacks:
+            callback(callback_kwargs, response, start, datetime.now())
+        return response
@@ -0,0 +1,340 @@
+"""Local LLM gateway: pooled connections, coalesced identical requests, per-model concurrency limits.
+
+    uv run python gateway.py                                    # litellm.config.yaml on http://127.0.0.1:4001
+    uv run python gateway.py --max-concurrency 8 --no-coalesce
+
+Jobs send OpenAI-style chat completions to the gateway instead of the provider,
+using a `model_name` from the config:
+
+    litellm.completion(model="openai/gemini-flash", api_base="http://127.0.0.1:4001/v1",
+                       api_key="local", messages=[...])
+
+- Connections: deployments with an `api_base` (OpenAI-compatible servers,
+  another LiteLLM proxy, the benchmark's stub) get one aiohttp pool of
+  keep-alive connections each, shared by every job. Other deployments go
+  through `litellm.acompletion`, which keeps its own client per provider.
+- Coalescing: identical requests (same model, messages and parameters) that
+  arrive while one is in flight wait for that one upstream call and all get its
+  response (singleflight). `X-No-Coalesce: 1` opts a request out.
+- Concurrency: at most `max_parallel_requests` (summed over a model's
+  deployments, else --max-concurrency) upstream calls per model at once, for
+  all jobs together; the rest queue in the gateway. Deployments of a model
+  are used round robin.
+
+GET /stats has the counters per model; `bench_gateway.py` load-tests the
+gateway against a local stub provider.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "litellm.config.yaml")
+DEFAULT_PORT = 4001
+DEFAULT_MAX_CONCURRENCY = 16
+KEEPALIVE_SECONDS = 60
+# request fields that don't change the answer, left out of the coalescing key
+IGNORED_FIELDS = ("stream", "user", "metadata")
+# where and how to reach the provider comes from the config only, whatever the client sends
+DEPLOYMENT_FIELDS = ("model", "stream", "api_base", "base_url", "api_key", "api_version", "custom_llm_provider",
+                     "aws_access_key_id", "aws_secret_access_key", "aws_region_name")
+
+
+class UpstreamError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ========== Config ==========
+@dataclass
+class Deployment:
+    model_name: str
+    params: dict                      # litellm_params, env references resolved
+    max_parallel: int | None = None
+
+    @property
+    def api_base(self) -> str | None:
+        return self.params.get("api_base")
+
+    @property
+    def upstream_model(self) -> str:
+        # "openai/gpt-4o-mini" -> "gpt-4o-mini" for a server that speaks the OpenAI API itself;
+        # a model without a provider prefix is sent as it is
+        model = self.params["model"]
+        if not self.api_base:
+            return model
+        _, slash, name = model.partition("/")
+        return name if slash else model
+
+
+def resolve_env(value):
+    """LiteLLM config convention: "os.environ/NAME" is read from the environment."""
+    if isinstance(value, str) and value.startswith("os.environ/"):
+        return os.getenv(value.removeprefix("os.environ/"))
+    if isinstance(value, dict):
+        return {k: resolve_env(v) for k, v in value.items()}
+    return value
+
+
+def load_config(path: str = DEFAULT_CONFIG) -> dict:
+    import yaml
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    with open(path, encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def parse_deployments(config: dict) -> list[Deployment]:
+    deployments = []
+    for entry in config.get("model_list", []):
+        params = entry.get("litellm_params") or {}
+        if not entry.get("model_name") or not params.get("model"):
+            logging.warning(f"🟡 Skipping {entry.get('model_name', '?')}: no litellm_params.model")
+            continue
+        params = resolve_env(params)
+        max_parallel = params.pop("max_parallel_requests", None)
+        deployments.append(Deployment(entry["model_name"], params, int(max_parallel) if max_parallel else None))
+    return deployments
+
+
+def request_key(body: dict) -> str:
+    canonical = {k: v for k, v in body.items() if k not in IGNORED_FIELDS}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+# ========== Singleflight ==========
+class SingleFlight:
+    """One in-flight call per key; callers arriving meanwhile share its result (or its error)."""
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn) -> tuple[object, bool]:
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: a caller that disconnects must not cancel the call the others are waiting on
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even when every waiter has gone
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+# ========== Gateway ==========
+@dataclass
+class ModelStats:
+    requests: int = 0
+    upstream: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    queued_seconds: float = 0.0
+    upstream_seconds: float = 0.0
+    latencies: list = field(default_factory=list, repr=False)
+
+
+class Gateway:
+    def __init__(self, config: dict, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, coalesce: bool = True,
+                 acompletion=None):
+        self.coalesce = coalesce
+        self.groups: dict[str, list[Deployment]] = {}
+        for deployment in parse_deployments(config):
+            self.groups.setdefault(deployment.model_name, []).append(deployment)
+        self.limits = {
+            name: sum(d.max_parallel for d in group) if all(d.max_parallel for d in group) else max_concurrency
+            for name, group in self.groups.items()
+        }
+        self.max_concurrency = max_concurrency
+        self._acompletion = acompletion
+        self._next = {name: itertools.cycle(group) for name, group in self.groups.items()}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._sessions: dict[int, object] = {}
+        self.flight = SingleFlight()
+        self.stats = {name: ModelStats() for name in self.groups}
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def _session(self, deployment: Deployment):
+        session = self._sessions.get(id(deployment))
+        if session is None:
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=deployment.max_parallel or self.max_concurrency,
+                                             keepalive_timeout=KEEPALIVE_SECONDS, ttl_dns_cache=300)
+            session = self._sessions[id(deployment)] = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=600))
+        return session
+
+    async def complete(self, body: dict, coalesce: bool = True) -> tuple[dict, bool]:
+        """The completion for an OpenAI-style request body, and whether it was shared with another caller."""
+        model = body.get("model")
+        if model not in self.groups:
+            raise KeyError(model)
+        stats = self.stats[model]
+        stats.requests += 1
+        start = time.monotonic()
+        try:
+            if self.coalesce and coalesce:
+                response, shared = await self.flight.do(request_key(body), lambda: self._upstream(model, body))
+            else:
+                response, shared = await self._upstream(model, body), False
+        except Exception:
+            stats.errors += 1
+            raise
+        stats.coalesced += shared
+        stats.latencies.append(time.monotonic() - start)
+        if len(stats.latencies) > 10_000:
+            del stats.latencies[:5_000]
+        return response, shared
+
+    async def _upstream(self, model: str, body: dict) -> dict:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = self._semaphores[model] = asyncio.Semaphore(self.limits[model])
+        stats = self.stats[model]
+        queued = time.monotonic()
+        async with semaphore:
+            start = time.monotonic()
+            stats.queued_seconds += start - queued
+            stats.upstream += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            deployment = next(self._next[model])
+            try:
+                if deployment.api_base:
+                    return await self._post(deployment, body)
+                return await self._litellm(deployment, body)
+            finally:
+                stats.in_flight -= 1
+                stats.upstream_seconds += time.monotonic() - start
+
+    async def _post(self, deployment: Deployment, body: dict) -> dict:
+        api_key = deployment.params.get("api_key")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        payload = {**body, "model": deployment.upstream_model, "stream": False}
+        async with self._session(deployment).post(f"{deployment.api_base.rstrip('/')}/chat/completions",
+                                                  json=payload, headers=headers) as response:
+            if response.status >= 400:
+                raise UpstreamError(response.status, await response.text())
+            return await response.json()
+
+    async def _litellm(self, deployment: Deployment, body: dict) -> dict:
+        if self._acompletion is None:
+            from litellm import acompletion
+            self._acompletion = acompletion
+        # the client's settings (temperature, max_tokens, ...) override the deployment's defaults
+        params = {k: v for k, v in body.items() if k not in DEPLOYMENT_FIELDS}
+        response = await self._acompletion(**{**deployment.params, **params})
+        return response.model_dump() if hasattr(response, "model_dump") else dict(response)
+
+    def report(self) -> dict:
+        report = {}
+        for name, s in self.stats.items():
+            ordered = sorted(s.latencies)
+            report[name] = {
+                "limit": self.limits[name],
+                "deployments": len(self.groups[name]),
+                "requests": s.requests,
+                "upstream_calls": s.upstream,
+                "coalesced": s.coalesced,
+                "errors": s.errors,
+                "in_flight": s.in_flight,
+                "max_in_flight": s.max_in_flight,
+                "avg_queue_ms": 1000 * s.queued_seconds / s.upstream if s.upstream else 0.0,
+                "avg_upstream_ms": 1000 * s.upstream_seconds / s.upstream if s.upstream else 0.0,
+                "p50_ms": 1000 * ordered[len(ordered) // 2] if ordered else 0.0,
+                "p99_ms": 1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else 0.0,
+            }
+        return {"models": report, "in_flight_keys": len(self.flight)}
+
+
+# ========== HTTP server ==========
+def make_app(gateway: Gateway):
+    from aiohttp import web
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return _error(web, 400, "Request body is not JSON")
+        if not isinstance(body, dict):
+            return _error(web, 400, "Request body must be a JSON object")
+        if body.get("stream"):
+            return _error(web, 400, "Streaming isn't supported by the gateway")
+        try:
+            response, shared = await gateway.complete(body, coalesce=request.headers.get("X-No-Coalesce") != "1")
+        except KeyError:
+            return _error(web, 404, f"Unknown model {body.get('model')!r}, expected one of {sorted(gateway.groups)}")
+        except UpstreamError as e:
+            return _error(web, e.status, str(e))
+        except Exception as e:
+            logging.error(f"🔴 Upstream call for {body.get('model')} failed: {e}")
+            return _error(web, 502, f"{type(e).__name__}: {e}")
+        return web.json_response(response, headers={"X-Coalesced": "1" if shared else "0"})
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(gateway.report())
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "models": sorted(gateway.groups)})
+
+    async def on_cleanup(app) -> None:
+        await gateway.close()
+
+    app = web.Application()
+    app.add_routes([
+        web.post("/v1/chat/completions", chat_completions),
+        web.post("/chat/completions", chat_completions),
+        web.get("/stats", stats),
+        web.get("/health", health),
+    ])
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def _error(web, status: int, message: str):
+    return web.json_response({"error": {"message": message, "code": status}}, status=status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local gateway: pooled connections, coalesced requests, limits.")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help="upstream calls per model at once, when its deployments set no max_parallel_requests")
+    parser.add_argument("--no-coalesce", action="store_true")
+    args = parser.parse_args()
+
+    from aiohttp import web
+
+    gateway = Gateway(load_config(args.config), args.max_concurrency, coalesce=not args.no_coalesce)
+    for name, group in gateway.groups.items():
+        logging.info(f"🟢 {name}: {', '.join(d.params['model'] for d in group)} (max {gateway.limits[name]} at once)")
+    logging.info(f"🚀 Gateway on http://{args.host}:{args.port}/v1")
+    web.run_app(make_app(gateway), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
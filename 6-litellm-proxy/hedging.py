@@ -0,0 +1,212 @@
+"""Hedged LiteLLM completions: cut tail latency by racing a backup request.
+
+    from hedging import Hedger, alternate_deployment
+
+    hedger = Hedger()
+    response = await hedger.acompletion(
+        model="gemini/gemini-1.5-flash",
+        messages=[{"role": "user", "content": "Hello!"}],
+        hedge_model=alternate_deployment("litellm.config.yaml", "gemini-flash", "gemini/gemini-1.5-flash"),
+    )
+
+The first request is sent as usual. If it hasn't answered by the model's
+recent p95 latency, a second one goes out (to `hedge_model`, or the same
+model); whichever answers first wins and the other is cancelled, as are both
+when the caller itself is cancelled. So only ~5% of calls are hedged, and only
+the slow ones. `max_hedge_rate` caps that share, so an overloaded provider
+doesn't get its load doubled.
+
+Cost: both attempts carry `metadata.hedge_role` ("primary" / "hedge"), so
+track_cost_callback, registered as a LiteLLM success callback, books completed
+attempts by role. A cancelled loser never reaches LiteLLM's callbacks; the
+hedger reports it to the same callback with its estimated prompt cost
+(providers bill input tokens once a request is accepted).
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime
+
+from track_cost_callback import track_cost_callback
+
+DEFAULT_HEDGE_DELAY = 2.0   # seconds, until a model has enough latency samples
+MIN_SAMPLES = 20
+WINDOW = 500                 # latency samples kept per model
+HEDGE_PERCENTILE = 95
+MAX_HEDGE_RATE = 0.10
+
+
+def alternate_deployment(config_path: str, model_name: str, exclude: str | None = None) -> str | None:
+    """First `litellm_params.model` listed under `model_name` in a LiteLLM config, other than `exclude`."""
+    import yaml
+
+    with open(config_path, encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    for deployment in config.get("model_list", []):
+        if deployment.get("model_name") != model_name:
+            continue
+        model = (deployment.get("litellm_params") or {}).get("model")
+        if model and model != exclude:
+            return model
+    return None
+
+
+class LatencyTracker:
+    """Rolling latency window for one model; its p95 is when a request counts as slow."""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples: deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+class Hedger:
+    def __init__(self, percentile: float = HEDGE_PERCENTILE, max_hedge_rate: float = MAX_HEDGE_RATE,
+                 default_delay: float = DEFAULT_HEDGE_DELAY, acompletion=None, cost_callback=track_cost_callback,
+                 prompt_cost=None):
+        self.percentile = percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.default_delay = default_delay
+        self._acompletion = acompletion
+        self.cost_callback = cost_callback
+        self.prompt_cost = prompt_cost or estimate_prompt_cost
+        self.latency: dict[str, LatencyTracker] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_by_budget = 0
+
+    # ---- policy ----
+    def hedge_delay(self, model: str) -> float:
+        tracker = self.latency.setdefault(model, LatencyTracker())
+        threshold = tracker.percentile(self.percentile)
+        return self.default_delay if threshold is None else threshold
+
+    def _within_budget(self) -> bool:
+        return self.hedged < self.max_hedge_rate * max(self.calls, 1)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": self.hedged / self.calls if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "skipped_by_budget": self.skipped_by_budget,
+            "delays": {model: round(self.hedge_delay(model), 3) for model in self.latency},
+        }
+
+    # ---- calls ----
+    def _call(self, model: str, messages: list[dict], role: str, kwargs: dict):
+        if self._acompletion is None:
+            from litellm import acompletion
+            self._acompletion = acompletion
+        metadata = {**(kwargs.pop("metadata", None) or {}), "hedge_role": role}
+        return asyncio.ensure_future(self._acompletion(model=model, messages=messages, metadata=metadata, **kwargs))
+
+    async def acompletion(self, model: str, messages: list[dict], hedge_model: str | None = None, **kwargs):
+        self.calls += 1
+        delay = self.hedge_delay(model)
+        hedge_model = hedge_model or model
+        start, started_at = time.monotonic(), datetime.now()
+        primary = self._call(model, messages, "primary", dict(kwargs))
+        backup, hedge_start = None, None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                self.latency[model].add(time.monotonic() - start)
+                return primary.result()  # raises the primary's error, hedging doesn't retry failures
+            if not self._within_budget():
+                self.skipped_by_budget += 1
+                response = await primary
+                self.latency[model].add(time.monotonic() - start)
+                return response
+
+            self.hedged += 1
+            hedge_start = datetime.now()
+            backup = self._call(hedge_model, messages, "hedge", dict(kwargs))
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for winner in done:
+                    if winner.exception() is not None:
+                        error = error or winner.exception()
+                        continue
+                    # the primary's latency is at least `elapsed` either way: record it as such
+                    self.latency[model].add(time.monotonic() - start)
+                    if winner is backup:
+                        self.hedge_wins += 1
+                    return winner.result()
+            raise error
+        finally:
+            # the race's loser, or every call still running when the caller is cancelled: stop it, book its cost
+            for task, task_model, started in ((primary, model, started_at), (backup, hedge_model, hedge_start)):
+                if task is not None and (not task.done() or task.cancelled()):
+                    self._cancel(task, task_model, messages, started)
+
+    def _cancel(self, task: asyncio.Future, model: str, messages: list[dict], started: datetime) -> None:
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # don't warn about unretrieved errors
+        if self.cost_callback is None:
+            return
+        cost = self.prompt_cost(model, messages)
+        kwargs = {"model": model, "response_cost": cost, "metadata": {"hedge_role": "cancelled"}}
+        try:
+            self.cost_callback(kwargs, None, started, datetime.now())
+        except Exception as e:
+            logging.warning(f"🟡 Cost callback failed for cancelled hedge: {e}")
+
+
+def estimate_prompt_cost(model: str, messages: list[dict]) -> float:
+    """Input-token cost of a request that was cancelled mid-flight (0 when LiteLLM doesn't know the model)."""
+    try:
+        import litellm
+        prompt_tokens = litellm.token_counter(model=model, messages=messages)
+        prompt_cost, _ = litellm.cost_per_token(model=model, prompt_tokens=prompt_tokens, completion_tokens=0)
+        return prompt_cost
+    except Exception:
+        return 0.0
+
+
+async def hedged_acompletion(model: str, messages: list[dict], hedge_model: str | None = None, **kwargs):
+    return await _default_hedger().acompletion(model, messages, hedge_model=hedge_model, **kwargs)
+
+
+def hedged_completion(model: str, messages: list[dict], hedge_model: str | None = None, **kwargs):
+    """Blocking wrapper for scripts; a long-lived event loop should use Hedger.acompletion directly."""
+    return asyncio.run(hedged_acompletion(model, messages, hedge_model=hedge_model, **kwargs))
+
+
+_hedger: Hedger | None = None
+
+
+def _default_hedger() -> Hedger:
+    global _hedger
+    if _hedger is None:
+        _hedger = Hedger()
+    return _hedger
+
+
+if __name__ == "__main__":
+    import litellm
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    litellm.success_callback = [track_cost_callback]
+    primary = "gemini/gemini-1.5-flash"
+    response = hedged_completion(
+        model=primary,
+        messages=[{"role": "user", "content": "Hello!"}],
+        hedge_model=alternate_deployment("litellm.config.yaml", "gemini-flash", exclude=primary),
+    )
+    print(response["choices"][0]["message"]["content"])
+    print(_default_hedger().stats())
@@ -0,0 +1,271 @@
+"""Perceptual-hash cache for image classification: a re-uploaded image reuses the stored top-5 labels.
+
+    from image_cache import ImageCache, image_hashes
+
+    cache = ImageCache.load("image_cache.json")      # empty cache if the file doesn't exist
+    hashes = image_hashes("cat.jpg")
+    hit = cache.get(hashes)
+    if hit is None:
+        labels = classify_with_endpoint(load_image_as_base64("cat.jpg"))
+        cache.put(hashes, labels, source="cat.jpg")
+    cache.save("image_cache.json")
+
+A resized, re-encoded or slightly cropped copy of an image has different bytes
+but almost the same picture, so each image is reduced to two 64-bit
+perceptual hashes, computed locally with Pillow:
+- pHash: the 8x8 lowest frequencies of the DCT of a 32x32 grayscale version,
+  one bit per coefficient above their median (robust to scaling and JPEG),
+- dHash: whether each pixel of a 9x8 grayscale version is brighter than its
+  right neighbour (cheap, and fails on different images differently).
+
+A lookup is a Hamming-radius search over the pHashes with multi-index
+hashing: the hash is cut into 4 chunks of 16 bits, each chunk indexed in its
+own table. Two hashes within `max_distance` bits differ in at most
+max_distance // 4 bits in at least one chunk, so probing every chunk value
+within that many bit flips (137 probes per table at the default distance of
+10) finds all of them without scanning the cache. Candidates must also be
+within `dhash_distance` on the dHash; the closest one wins.
+
+On bench_image_cache.py's feed, re-uploads land within 12 pHash bits of their
+original and different images 22 or more away. An edit that only moves one
+small object can stay within the distance too; lower IMAGE_CACHE_DISTANCE if
+such edits have to be classified again.
+
+Size is bounded by `capacity` with LRU eviction; the cache is saved as JSON
+(hashes in hex, least recently used first) and loaded back in that order.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import combinations
+
+CAPACITY = int(os.getenv("IMAGE_CACHE_SIZE", "50000"))
+MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_DISTANCE", "10"))   # pHash bits, out of 64
+DHASH_DISTANCE = 12
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# DCT-II basis for the 8 lowest frequencies of 32 samples
+_DCT = [[math.cos((2 * x + 1) * u * math.pi / 64) for x in range(32)] for u in range(8)]
+
+
+# ========== Hashing ==========
+@dataclass(frozen=True)
+class ImageHashes:
+    phash: int
+    dhash: int
+
+    def __str__(self) -> str:
+        return f"{self.phash:016x}:{self.dhash:016x}"
+
+
+def _grayscale(image):
+    """Path, bytes or PIL image -> grayscale PIL image, EXIF rotation applied."""
+    import io
+
+    from PIL import Image, ImageOps
+
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    elif isinstance(image, (str, os.PathLike)):
+        image = Image.open(image)
+    return ImageOps.exif_transpose(image).convert("L")
+
+
+def _bits(flags) -> int:
+    value = 0
+    for flag in flags:
+        value = (value << 1) | bool(flag)
+    return value
+
+
+def phash(gray) -> int:
+    from PIL import Image
+
+    pixels = list(gray.resize((32, 32), Image.Resampling.LANCZOS).getdata())
+    rows = [pixels[y * 32:(y + 1) * 32] for y in range(32)]
+    # separable DCT, only the 8 lowest frequencies in each direction
+    row_freqs = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    coeffs = [sum(_DCT[v][y] * row_freqs[y][u] for y in range(32)) for v in range(8) for u in range(8)]
+    median = sorted(coeffs)[32]
+    return _bits(c > median for c in coeffs)
+
+
+def dhash(gray) -> int:
+    from PIL import Image
+
+    pixels = list(gray.resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    return _bits(pixels[y * 9 + x] > pixels[y * 9 + x + 1] for y in range(8) for x in range(8))
+
+
+def image_hashes(image) -> ImageHashes:
+    gray = _grayscale(image)
+    return ImageHashes(phash(gray), dhash(gray))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def _flip_masks(radius: int) -> list[int]:
+    """Every CHUNK_BITS-bit mask with at most `radius` bits set, 0 first."""
+    return [sum(1 << bit for bit in bits) for r in range(radius + 1) for bits in combinations(range(CHUNK_BITS), r)]
+
+
+def _chunks(value: int) -> list[int]:
+    return [(value >> (i * CHUNK_BITS)) & _CHUNK_MASK for i in range(CHUNKS)]
+
+
+@dataclass
+class CacheHit:
+    labels: list
+    distance: int       # pHash bits between the query and the cached image
+    source: str | None  # the cached image that matched
+
+
+@dataclass
+class _Entry:
+    hashes: ImageHashes
+    labels: list
+    source: str | None
+
+
+# ========== Cache ==========
+class ImageCache:
+    def __init__(self, capacity: int = CAPACITY, max_distance: int = MAX_DISTANCE,
+                 dhash_distance: int = DHASH_DISTANCE):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.dhash_distance = dhash_distance
+        self._masks = _flip_masks(max_distance // CHUNKS)
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._tables: list[dict[int, set[int]]] = [{} for _ in range(CHUNKS)]
+        self._next_id = 0
+
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.evictions = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---- index ----
+    def _candidates(self, value: int) -> set[int]:
+        found: set[int] = set()
+        for table, chunk in zip(self._tables, _chunks(value)):
+            for mask in self._masks:
+                ids = table.get(chunk ^ mask)
+                if ids:
+                    found |= ids
+        return found
+
+    def _best(self, hashes: ImageHashes) -> tuple[int, int]:
+        best_id, best_score, best_distance = -1, None, -1
+        for entry_id in self._candidates(hashes.phash):
+            cached = self._entries[entry_id].hashes
+            distance = hamming(hashes.phash, cached.phash)
+            if distance > self.max_distance:
+                continue
+            d_distance = hamming(hashes.dhash, cached.dhash)
+            if d_distance > self.dhash_distance:
+                continue
+            if best_score is None or distance + d_distance < best_score:
+                best_id, best_score, best_distance = entry_id, distance + d_distance, distance
+        return best_id, best_distance
+
+    def _index(self, entry_id: int, value: int, add: bool) -> None:
+        for table, chunk in zip(self._tables, _chunks(value)):
+            if add:
+                table.setdefault(chunk, set()).add(entry_id)
+            else:
+                ids = table[chunk]
+                ids.discard(entry_id)
+                if not ids:
+                    del table[chunk]
+
+    def _store(self, hashes: ImageHashes, labels: list, source: str | None) -> None:
+        if len(self._entries) >= self.capacity:
+            evicted_id, evicted = self._entries.popitem(last=False)
+            self._index(evicted_id, evicted.hashes.phash, add=False)
+            self.evictions += 1
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = _Entry(hashes, labels, source)
+        self._index(entry_id, hashes.phash, add=True)
+
+    # ---- public API ----
+    def get(self, hashes: ImageHashes) -> CacheHit | None:
+        start = time.perf_counter()
+        with self._lock:
+            entry_id, distance = self._best(hashes)
+            self.lookups += 1
+            hit = None
+            if entry_id >= 0:
+                self.hits += 1
+                self.exact_hits += distance == 0
+                self._entries.move_to_end(entry_id)
+                entry = self._entries[entry_id]
+                hit = CacheHit(labels=entry.labels, distance=distance, source=entry.source)
+            self.lookup_seconds += time.perf_counter() - start
+            return hit
+
+    def put(self, hashes: ImageHashes, labels: list, source: str | None = None) -> None:
+        """Store the labels; a near-identical cached image gets them instead of a second entry."""
+        with self._lock:
+            entry_id, _ = self._best(hashes)
+            if entry_id >= 0:
+                self._entries[entry_id].labels = labels
+                self._entries.move_to_end(entry_id)
+                return
+            self._store(hashes, labels, source)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.hits - self.exact_hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "evictions": self.evictions,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / self.lookups if self.lookups else 0.0,
+            }
+
+    # ---- persistence ----
+    def save(self, path: str) -> None:
+        with self._lock:
+            data = {
+                "config": {"capacity": self.capacity, "max_distance": self.max_distance,
+                           "dhash_distance": self.dhash_distance},
+                # least recently used first, so loading restores the LRU order
+                "entries": [{"hashes": str(e.hashes), "labels": e.labels, "source": e.source}
+                            for e in self._entries.values()],
+            }
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **overrides) -> "ImageCache":
+        """Cache from `path`, or an empty one when it doesn't exist; `overrides` win over the saved config."""
+        if not os.path.exists(path):
+            return cls(**overrides)
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        cache = cls(**{**data["config"], **overrides})
+        for entry in data["entries"][-cache.capacity:]:
+            p, d = entry["hashes"].split(":")
+            cache._store(ImageHashes(int(p, 16), int(d, 16)), entry["labels"], entry.get("source"))
+        return cache
@@ -1,31 +1,119 @@
-import os 
-from litellm import completion
-import boto3
+"""Classify images with the SageMaker resnet18 endpoint through LiteLLM.
+
+    uv run python image_classification_litellm_sagemaker.py                  # cat.jpg
+    uv run python image_classification_litellm_sagemaker.py photos/ a.png   # files and folders
+    uv run python image_classification_litellm_sagemaker.py photos/ --no-cache
+
+A re-upload (same image resized, re-encoded or lightly cropped) gets the top-5
+labels stored for its first copy from image_cache.py, without calling the
+endpoint. The cache is saved to IMAGE_CACHE_FILE (image_cache.json here).
+"""
+import argparse
 import base64
-from dotenv import load_dotenv
-load_dotenv()
+import json
+import os
+
+ENDPOINT = "resnet18-endpoint"
+REGION = "ap-southeast-1"
+TOP_K = 5
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+CACHE_FILE = os.getenv("IMAGE_CACHE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache.json"))
+
+
+def check_aws() -> None:
+    import boto3
 
+    assert os.getenv("AWS_ACCESS_KEY_ID"), "Missing AWS_ACCESS_KEY_ID"
+    assert os.getenv("AWS_SECRET_ACCESS_KEY"), "Missing AWS_SECRET_ACCESS_KEY"
+    assert os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION"), "Missing region"
 
-assert os.getenv("AWS_ACCESS_KEY_ID"), "Missing AWS_ACCESS_KEY_ID"
-assert os.getenv("AWS_SECRET_ACCESS_KEY"), "Missing AWS_SECRET_ACCESS_KEY"
-assert os.getenv("AWS_DEFAULT_REGION") or os.getenv("AWS_REGION"), "Missing region"
+    sts = boto3.client("sts")
+    print("CallerIdentity:", sts.get_caller_identity())
 
-sts = boto3.client("sts")
-print("CallerIdentity:", sts.get_caller_identity())
+    sm = boto3.client("sagemaker")
+    print("DescribeEndpoint:", sm.describe_endpoint(EndpointName=ENDPOINT)["EndpointStatus"])
 
-sm = boto3.client("sagemaker")
-print("DescribeEndpoint:", sm.describe_endpoint(EndpointName="resnet18-endpoint")["EndpointStatus"])
 
 def load_image_as_base64(path):
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
-image_b64 = load_image_as_base64("cat.jpg")  # ảnh cần phân loại
 
-# Truyền ảnh qua “prompt”: LiteLLM sẽ nhét vào template input.content_handler ở trên
-resp = completion(
-    model="sagemaker/resnet18-endpoint",
-    messages=[{"role":"user","content":"Classify this image"}],
-    aws_region_name="ap-southeast-1"
-)
-print(resp["choices"][0]["message"]["content"])
+def top_labels(content: str, k: int = TOP_K) -> list:
+    """The endpoint's answer as at most `k` labels, best first; text answers are kept line by line."""
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        return [line.strip() for line in str(content).splitlines() if line.strip()][:k]
+    if isinstance(data, dict):
+        data = data.get("predictions", data.get("labels", [{"label": key, "score": value}
+                                                          for key, value in data.items()]))
+    if data and all(isinstance(item, dict) and "score" in item for item in data):
+        data = sorted(data, key=lambda item: item["score"], reverse=True)
+    return list(data)[:k]
+
+
+def classify_with_endpoint(image_b64: str) -> list:
+    from litellm import completion
+
+    # Truyền ảnh qua “prompt”: LiteLLM sẽ nhét vào template input.content_handler của endpoint
+    resp = completion(
+        model=f"sagemaker/{ENDPOINT}",
+        messages=[{"role": "user", "content": image_b64}],
+        aws_region_name=REGION,
+    )
+    return top_labels(resp["choices"][0]["message"]["content"])
+
+
+def classify_image(path: str, cache=None, classify=classify_with_endpoint) -> tuple[list, bool]:
+    """Top-5 labels for the image at `path`, and whether they came from the cache."""
+    if cache is None:
+        return classify(load_image_as_base64(path)), False
+    from image_cache import image_hashes
+
+    hashes = image_hashes(path)
+    hit = cache.get(hashes)
+    if hit is not None:
+        return hit.labels, True
+    labels = classify(load_image_as_base64(path))
+    cache.put(hashes, labels, source=path)
+    return labels, False
+
+
+def find_images(paths: list[str]) -> list[str]:
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images += sorted(os.path.join(path, name) for name in os.listdir(path)
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            images.append(path)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify images with the SageMaker resnet18 endpoint.")
+    parser.add_argument("paths", nargs="*", default=["cat.jpg"], help="images or folders of images")
+    parser.add_argument("--no-cache", action="store_true", help="call the endpoint for every image")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    check_aws()
+
+    cache = None
+    if not args.no_cache:
+        from image_cache import ImageCache
+        cache = ImageCache.load(CACHE_FILE)
+    try:
+        for path in find_images(args.paths):
+            labels, cached = classify_image(path, cache)
+            print(f"{path}{' (cached)' if cached else ''}: {json.dumps(labels, ensure_ascii=False)}")
+    finally:
+        if cache is not None:
+            cache.save(CACHE_FILE)
+            print("Cache:", cache.stats())
+
+
+if __name__ == "__main__":
+    main()
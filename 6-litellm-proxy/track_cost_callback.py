@@ -1,5 +1,37 @@
-import litellm
-from litellm import completion
+import threading
+from datetime import timedelta
+
+# Print one block per call; bench scripts turn this off and read COST_STATS instead.
+VERBOSE = True
+
+
+class CostStats:
+    """Running cost / call totals, per model and per hedge role (see hedging.py)."""
+
+    def __init__(self):
+        self.by_model: dict[str, dict] = {}
+        self.by_role: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, role: str, cost: float, duration: float) -> None:
+        with self._lock:
+            for table, key in ((self.by_model, model), (self.by_role, role)):
+                totals = table.setdefault(key, {"calls": 0, "cost": 0.0, "seconds": 0.0})
+                totals["calls"] += 1
+                totals["cost"] += cost
+                totals["seconds"] += duration
+
+    def total_cost(self) -> float:
+        return sum(t["cost"] for t in self.by_role.values())
+
+    def reset(self) -> None:
+        with self._lock:
+            self.by_model.clear()
+            self.by_role.clear()
+
+
+COST_STATS = CostStats()
+
 
 # Custom callback: track cost
 def track_cost_callback(
@@ -8,35 +40,52 @@ def track_cost_callback(
     start_time, end_time    # timestamps
 ):
     try:
-        response_cost = kwargs.get("response_cost", 0)
+        response_cost = kwargs.get("response_cost") or 0
         model = kwargs.get("model", "unknown")
         duration = end_time - start_time
+        if isinstance(duration, timedelta):
+            duration = duration.total_seconds()
+        metadata = (kwargs.get("litellm_params") or {}).get("metadata") or kwargs.get("metadata") or {}
+        role = metadata.get("hedge_role", "single")
+        COST_STATS.record(model, role, response_cost, duration)
 
-        print("\n=== Callback Info ===")
-        print(f"Model       : {model}")
-        print(f"Cost (USD)  : {response_cost:.6f}")
-        print(f"Duration    : {duration:.2f} sec")
-        print("=====================")
+        if VERBOSE:
+            print("\n=== Callback Info ===")
+            print(f"Model       : {model}")
+            print(f"Cost (USD)  : {response_cost:.6f}")
+            print(f"Duration    : {duration:.2f} sec")
+            if role != "single":
+                print(f"Hedge role  : {role}")
+            print("=====================")
     except Exception as e:
         print("Callback error:", e)
 
-# Gắn callback vào LiteLLM
-litellm.success_callback = [track_cost_callback]
-
-# Gọi completion với stream
-response = completion(
-    model="gemini/gemini-1.5-flash",   # đổi sang model khác nếu cần
-    messages=[
-        {"role": "user", "content": "Hello!"}
-    ],
-    stream=True
-)
-
-# In từng chunk streaming
-print("=== Streaming Output ===")
-for chunk in response:
-    if hasattr(chunk, "choices"):
-        delta = chunk.choices[0].delta
-        if "content" in delta:
-            print(delta["content"], end="", flush=True)
-print("\n=== End of Stream ===")
+
+def main():
+    import litellm
+    from litellm import completion
+
+    # Gắn callback vào LiteLLM
+    litellm.success_callback = [track_cost_callback]
+
+    # Gọi completion với stream
+    response = completion(
+        model="gemini/gemini-1.5-flash",   # đổi sang model khác nếu cần
+        messages=[
+            {"role": "user", "content": "Hello!"}
+        ],
+        stream=True
+    )
+
+    # In từng chunk streaming
+    print("=== Streaming Output ===")
+    for chunk in response:
+        if hasattr(chunk, "choices"):
+            delta = chunk.choices[0].delta
+            if "content" in delta:
+                print(delta["content"], end="", flush=True)
+    print("\n=== End of Stream ===")
+
+
+if __name__ == "__main__":
+    main()
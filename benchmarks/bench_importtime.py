@@ -0,0 +1,165 @@
+"""Startup cost of every script: import time and `main.py --help` wall time.
+
+Each script is imported in a fresh interpreter under `python -X importtime`,
+so the numbers are what a user pays before the first line of real work:
+
+    cd 4-structured-outputs-pydantic
+    uv run python ../benchmarks/bench_importtime.py --repeat 5
+    uv run python ../benchmarks/bench_importtime.py --max-ms 150 --no-heavy   # CI guard
+
+Heavy modules (the Gemini SDK, pypdf, pydantic, sqlite3, ...) should only load
+when a code path needs them; any that show up at import time are flagged.
+With `--max-ms` and/or `--no-heavy` the run is a cold-start check: it exits 1
+when a script's import time is over the budget or it imports a heavy module.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = {
+    "fewshot": "1-fewshot-prompting/main.py",
+    "multi_step": "2-multi-step-multi-model/main.py",
+    "structured_json": "3-structured-output/main.py",
+    "structured_pydantic": "4-structured-outputs-pydantic/main.py",
+    "article_draft": "5-generating-images/main.py",
+}
+
+HEAVY_MODULES = ("google.generativeai", "google.genai", "pypdf", "pydantic", "requests", "dotenv", "grpc", "numpy",
+                 "sqlite3")
+
+
+# ========== Measuring ==========
+def _import_snippet(script: str) -> str:
+    # import the script as a module (not __main__) so main() doesn't run
+    return (
+        "import importlib.util, sys\n"
+        f"sys.path.insert(0, {os.path.dirname(script)!r})\n"
+        f"spec = importlib.util.spec_from_file_location('bench_target', {script!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+    )
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """`-X importtime` lines -> {module: (self_us, cumulative_us)}."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            continue
+    return modules
+
+
+def measure_import(script: str) -> tuple[float, dict[str, tuple[int, int]]]:
+    """Wall ms for a fresh interpreter to import `script`, plus its importtime breakdown."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _import_snippet(script)],
+                          capture_output=True, text=True, cwd=os.path.dirname(script))
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        last = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        raise RuntimeError(last)
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def measure_help(script: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, script, "--help"], capture_output=True, text=True,
+                   cwd=os.path.dirname(script), stdin=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_baseline(repeat: int) -> tuple[float, set[str]]:
+    """Bare interpreter startup (ms and modules), subtracted so the report shows what each script adds."""
+    runs, modules = [], {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+        runs.append((time.perf_counter() - start) * 1000)
+        modules = parse_importtime(proc.stderr)
+    return statistics.median(runs), set(modules)
+
+
+def bench_script(name: str, script: str, repeat: int, top: int, startup_modules: set[str]) -> dict:
+    import_runs, help_runs, modules = [], [], {}
+    for _ in range(repeat):
+        elapsed, modules = measure_import(script)
+        import_runs.append(elapsed)
+        help_runs.append(measure_help(script))
+    modules = {m: times for m, times in modules.items() if m not in startup_modules}
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "script": name,
+        "import_ms": statistics.median(import_runs),
+        "help_ms": statistics.median(help_runs),
+        "modules": len(modules),
+        "heavy": sorted(m for m in modules if m in HEAVY_MODULES),
+        "top": [(module, cumulative / 1000) for module, (_, cumulative) in slowest[:top]],
+    }
+
+
+# ========== Reporting ==========
+def print_report(results: list[dict], interpreter_ms: float) -> None:
+    print(f"\nInterpreter startup: {interpreter_ms:.1f} ms (subtracted below)\n")
+    header = f"{'script':<22}{'import ms':>11}{'--help ms':>11}{'+modules':>9}  heavy at import"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        heavy = ", ".join(r["heavy"]) or "-"
+        print(f"{r['script']:<22}{r['import_ms'] - interpreter_ms:>11.1f}{r['help_ms'] - interpreter_ms:>11.1f}"
+              f"{r['modules']:>9}  {heavy}")
+    for r in results:
+        print(f"\n{r['script']}: slowest imports (cumulative ms)")
+        for module, ms in r["top"]:
+            print(f"  {ms:>8.1f}  {module}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time / startup benchmark for the project scripts.")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help="comma-separated, any of: " + ", ".join(SCRIPTS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per script; the median is reported")
+    parser.add_argument("--top", type=int, default=8, help="slowest modules to list per script")
+    parser.add_argument("--max-ms", type=float, default=0, help="fail when a script's import time exceeds this (0 = off)")
+    parser.add_argument("--no-heavy", action="store_true", help="fail when a script imports a heavy module")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    interpreter_ms, startup_modules = measure_baseline(args.repeat)
+    results = []
+    for name in args.scripts.split(","):
+        try:
+            results.append(bench_script(name, os.path.join(ROOT, SCRIPTS[name]), args.repeat, args.top,
+                                       startup_modules))
+        except RuntimeError as e:
+            print(f"🟡 Skipping {name}: {e}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({"interpreter_ms": interpreter_ms, "results": results}, indent=2))
+    else:
+        print_report(results, interpreter_ms)
+
+    failed = False
+    over = [r["script"] for r in results if args.max_ms and r["import_ms"] - interpreter_ms > args.max_ms]
+    if over:
+        print(f"\n🔴 Over the {args.max_ms:.0f} ms import budget: {', '.join(over)}", file=sys.stderr)
+        failed = True
+    heavy = [f"{r['script']} ({', '.join(r['heavy'])})" for r in results if args.no_heavy and r["heavy"]]
+    if heavy:
+        print(f"\n🔴 Heavy modules at import time: {'; '.join(heavy)}", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""End-to-end benchmark of every pipeline against the offline mock backend.
+
+Each project keeps its own virtualenv, so run this from the one whose
+dependencies you need; pipelines that fail to import are skipped:
+
+    cd 4-structured-outputs-pydantic
+    uv run python ../benchmarks/bench_pipelines.py --pipelines invoice_pydantic \
+        --iterations 50 --concurrency 8 --latency 0.3 --jitter 0.1 --error-rate 0.02
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "common"))
+
+import mock_llm  # noqa: E402
+import rate_limit  # noqa: E402
+
+
+SAMPLE_TOPIC = "AI is transforming healthcare"
+
+SAMPLE_HTML = """
+<html><head><title>News</title><script>var x = 1;</script></head>
+<body>
+  <nav><a href="/">Home</a> | <a href="/world">World</a></nav>
+  <article>
+    <h1>City rehearses the national day parade</h1>
+    <p>Thousands of people gathered downtown on Sunday to watch the final rehearsal.</p>
+    <p>Military vehicles, marching bands and floats moved along the main boulevard.</p>
+  </article>
+  <footer>Copyright 2025</footer>
+</body></html>
+"""
+
+SAMPLE_POSTS = {
+    "post-1.md": "# Why I write\n\nWriting clarifies thinking. Short sentences. Clear ideas.\n",
+    "post-2.md": "# Shipping small\n\nSmall releases beat big bangs. Here is why, in three points.\n",
+}
+
+
+# ========== Loading ==========
+def load_main(project: str, alias: str):
+    project_dir = os.path.join(ROOT, project)
+    if project_dir not in sys.path:
+        sys.path.insert(0, project_dir)
+    spec = importlib.util.spec_from_file_location(alias, os.path.join(project_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    mock_llm.patch_module(module)
+    # the scripts call logging.basicConfig(level=INFO) on import; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    return module
+
+
+@contextmanager
+def working_dir(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+# ========== Pipelines ==========
+# Each factory runs inside its own scratch directory (invoices.db, example_posts, report.md
+# land there), loads what it needs once and returns a `run()` callable for one iteration.
+def setup_generate_post():
+    mod = load_main("1-fewshot-prompting", "fewshot_main")
+    return lambda: mod.generate_post(mod.build_prompt(SAMPLE_TOPIC))
+
+
+def setup_summarizer():
+    mod = load_main("2-multi-step-multi-model", "summarizer_main")
+
+    def run():
+        core = mod.extract_core_website_content(SAMPLE_HTML)
+        summary = mod.summarize_content(core)
+        return mod.generate_x_post(summary)
+    return run
+
+
+def _setup_invoice(project: str, alias: str):
+    mod = load_main(project, alias)
+    pdf_path = os.path.join(ROOT, project, "pdfs", "invoice1.pdf")
+
+    def run():
+        conn = mod.setup_database()
+        try:
+            details = mod.extract_invoice_details(mod.get_pdf_content(pdf_path))
+            mod.insert_invoice_data(conn, details)
+        finally:
+            conn.close()
+        return details
+    return run
+
+
+def setup_invoice_json():
+    return _setup_invoice("3-structured-output", "invoice_json_main")
+
+
+def setup_invoice_pydantic():
+    return _setup_invoice("4-structured-outputs-pydantic", "invoice_pydantic_main")
+
+
+def setup_article_draft():
+    mod = load_main("5-generating-images", "article_main")
+    os.makedirs("example_posts", exist_ok=True)
+    for name, body in SAMPLE_POSTS.items():
+        with open(os.path.join("example_posts", name), "w", encoding="utf-8") as f:
+            f.write(body)
+    with open(os.path.join(ROOT, "5-generating-images", "new_post", "ai-workflows-vs-agents.txt"), encoding="utf-8") as f:
+        outline = f.read()
+
+    return lambda: mod.generate_article_draft(outline)
+
+
+def setup_research_crew():
+    sys.path.insert(0, os.path.join(ROOT, "xx-crewai", "research_crew", "src"))
+    from datetime import datetime
+    from research_crew.crew import ResearchCrew
+
+    inputs = {"topic": "AI LLMs", "current_year": str(datetime.now().year)}
+
+    def run():
+        crew = ResearchCrew().crew()
+        for agent in crew.agents:
+            agent.llm = mock_llm.make_crew_llm()
+        return crew.kickoff(inputs=inputs)
+    return run
+
+
+PIPELINES = {
+    "generate_post": setup_generate_post,
+    "summarizer": setup_summarizer,
+    "invoice_json": setup_invoice_json,
+    "invoice_pydantic": setup_invoice_pydantic,
+    "article_draft": setup_article_draft,
+    "research_crew": setup_research_crew,
+}
+
+# crewAI keeps per-crew global state (event bus, telemetry), so never fan it out
+SEQUENTIAL_ONLY = {"research_crew"}
+
+
+# ========== Measuring ==========
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def bench(name: str, run, backend: mock_llm.MockBackend, iterations: int, concurrency: int) -> dict:
+    latencies, overheads, errors = [], [], []
+
+    def one(_):
+        backend.reset_thread_clock()
+        start = time.perf_counter()
+        try:
+            run()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        overheads.append(elapsed - backend.thread_clock())
+
+    workers = 1 if name in SEQUENTIAL_ONLY else concurrency
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(iterations)))
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "pipeline": name,
+        "runs": iterations,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_per_s": len(latencies) / wall if wall else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "overhead_p50_s": percentile(overheads, 50),
+        "overhead_p95_s": percentile(overheads, 95),
+    }
+
+
+def print_report(results: list[dict]) -> None:
+    header = f"{'pipeline':<18}{'ok/runs':>10}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ovh p50':>10}{'ovh p95':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['pipeline']:<18}{r['ok']:>5}/{r['runs']:<4}{r['throughput_per_s']:>9.2f}"
+              f"{r['p50_s']:>9.3f}{r['p95_s']:>9.3f}{r['p99_s']:>9.3f}"
+              f"{r['overhead_p50_s']:>10.4f}{r['overhead_p95_s']:>10.4f}")
+        if r["first_error"]:
+            print(f"{'':<18}first error: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipelines against the offline mock LLM backend.")
+    parser.add_argument("--pipelines", default=",".join(PIPELINES), help="comma separated subset of: " + ", ".join(PIPELINES))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock time to first token (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- latency noise (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of a simulated 429")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="mock output speed, 0 = instant")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--quota-rpm", type=float, default=0.0, help="mock server-side quota, 0 = none")
+    parser.add_argument("--rpm", type=float, default=0.0, help="client-side requests/min limit, 0 = unlimited")
+    parser.add_argument("--tpm", type=float, default=0.0, help="client-side tokens/min limit, 0 = unlimited")
+    parser.add_argument("--max-concurrency", type=int, default=16, help="ceiling for the adaptive concurrency controller")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    config = mock_llm.MockConfig(args.latency, args.jitter, args.error_rate, args.tokens_per_sec, args.seed, args.quota_rpm)
+    backend = mock_llm.install_genai(config)
+    rate_limit.configure(args.rpm, args.tpm, args.max_concurrency)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.pipelines.split(","):
+            name = name.strip()
+            if name not in PIPELINES:
+                parser.error(f"unknown pipeline '{name}'")
+            workdir = os.path.join(tmp, name)
+            os.makedirs(workdir)
+            with working_dir(workdir):
+                try:
+                    run = PIPELINES[name]()
+                except ImportError as e:
+                    print(f"🟡 Skipping {name}: {e}")
+                    continue
+                results.append(bench(name, run, backend, args.iterations, args.concurrency))
+
+    print_report(results)
+    print(f"\nmock backend: {backend.stats()}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results, "backend": backend.stats()}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Tokens per prompt, before and after PromptBuilder, for every prompt call site (no API calls).
+
+    cd 4-structured-outputs-pydantic
+    uv run python ../benchmarks/bench_prompts.py
+    uv run python ../benchmarks/bench_prompts.py --json
+
+"before" is the prompt exactly as the call site used to write it (an
+indented f-string, copied below); "after" is the prompt the call site sends
+now, captured at the model call. Both are counted with tokens.estimate_tokens.
+The inputs are the samples bench_pipelines.py uses, the pypdf text of
+invoice1.pdf, a page of HTML as a CMS renders it (indented, blank lines), and
+example posts of which one is a second copy under another file name.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import textwrap
+
+from bench_pipelines import ROOT, SAMPLE_HTML, SAMPLE_POSTS, SAMPLE_TOPIC, load_main, working_dir
+
+import mock_llm  # noqa: E402
+from tokens import estimate_tokens  # noqa: E402
+
+SUMMARY = "- Thousands watched the final parade rehearsal downtown.\n- Vehicles, bands and floats on the main boulevard."
+FEEDBACK = "Shorter intro, and add a concrete example to the section on agents."
+
+
+# ========== Old prompts ==========
+def old_build_prompt(user_topic):
+    return f"""
+    You are an expert social media manager.
+    Write a short, engaging X (formerly Twitter) post about the following topic.
+    Keep it concise, avoid hashtags, use max 1–2 emojis, and format with line breaks if needed.
+
+    Here are some examples (topic → generated post):
+
+    <example>
+      <topic>AI transforms healthcare</topic>
+      <generated-post>AI is reshaping healthcare 🏥 Faster diagnoses, smarter hospitals, and better treatments.</generated-post>
+    </example>
+
+    <example>
+      <topic>Remote work is the new normal</topic>
+      <generated-post>Work from anywhere 🌍 Remote work is here to stay, bringing flexibility and global collaboration.</generated-post>
+    </example>
+
+    Please use the tone, structure, and style of the examples above
+    (but not the content) to generate a new post for the topic below.
+
+    <TOPIC>
+    {user_topic}
+    </TOPIC>
+    """
+
+
+def old_extract_html_chunk(html):
+    return f"""
+        You are an expert web content extractor. Your task is to extract the core content from a given HTML page.
+        The core content should be the main text, excluding navigation, footers, and other non-essential elements like scripts etc.
+
+        Here is the HTML content:
+        <html>
+        {html}
+        </html>
+
+        Please extract the core content and return it as plain text.
+    """
+
+
+def old_summarize_content(content):
+    return f"""
+    You are an expert summarizer. Your task is to summarize the provided content into a concise and clear summary.
+
+    Here is the content to summarize:
+    <content>
+    {content}
+    </content>
+
+    Please provide a brief summary of the main points in the content in Vietnamese language. Prefer bullet points and avoid unncessary explanations.
+    """
+
+
+def old_generate_x_post(summary):
+    return f"""
+    You are an expert content creator. Your task is to generate a social media post based on the provided summary.
+
+    Here is the summary to base the post on:
+    <summary>
+    {summary}
+    </summary>
+
+    Please create a catchy and engaging social media post in Vietnamese language.
+    """
+
+
+def old_extract_invoice_details(pdf_content):
+    return f"""
+    You are an expert data extractor who excels at analyzing invoices.
+
+    Extract all relevant data from the below invoice content (which was extracted from a PDF document).
+    Make sure to capture data like vendor name, date, amount, tax, tax IDs etc.
+
+    <invoice-content>
+    {pdf_content}
+    </invoice-content>
+
+    Return your response as a JSON object without any extra text or explanation.
+    """
+
+
+def old_extract_invoice_chunk(chunk, index, total):
+    return f"""
+    You are an expert data extractor who excels at analyzing invoices.
+
+    Below is part {index} of {total} of a long invoice (text extracted from a PDF document).
+    Extract the invoice data that appears in THIS part: vendor name, date, amount, tax, tax IDs etc.
+    Leave out any field that does not appear in this part.
+
+    <invoice-content>
+    {chunk}
+    </invoice-content>
+
+    Return your response as a JSON object without any extra text or explanation.
+    """
+
+
+def old_generate_article_draft(outline, example_posts, existing_draft=None, feedback=None):
+    example_posts_str = "\n\n".join(
+        f"<example-post-{i+1}>\n{post}\n</example-post-{i+1}>"
+        for i, post in enumerate(example_posts)
+    )
+    if not (existing_draft and feedback):
+        return f"""
+                Write a detailed blog post based on the following outline:
+
+                <outline>
+                {outline}
+                </outline>
+
+                Below are some example blog posts I wrote in the past:
+                <example-posts>
+                {example_posts_str}
+                </example-posts>
+
+                Use the language, tone, style and way of writing from the example posts to generate your draft for the new blog post.
+                DON'T use the content from those example posts!
+
+                Return the blog post draft in raw markdown format so that I can directly use it in my markdown-processing pipeline.
+                Don't add any additional text or explanations, just return the raw markdown content.
+            """
+    example_posts_str += f"\n\n<existing-draft>\n{existing_draft}\n</existing-draft>"
+    example_posts_str += f"\n\n<feedback>\n{feedback}\n</feedback>"
+    return f"""
+            Write an improved version of the following blog post draft:
+
+            <existing-draft>
+            {existing_draft}
+            </existing-draft>
+
+            The following feedback should be taken into account when writing the improved draft:
+
+            <feedback>
+            {feedback}
+            </feedback>
+
+            The original draft AND your improved version should be based on the following outline:
+
+            <outline>
+            {outline}
+            </outline>
+
+            Below are some example blog posts I wrote in the past:
+            <example-posts>
+            {example_posts_str}
+            </example-posts>
+
+            Use the language, tone, style and way of writing from the example posts to generate your draft for the new blog post.
+            DON'T use the content from those example posts!
+
+            Return the blog post draft in raw markdown format so that I can directly use it in my markdown-processing pipeline.
+            Don't add any additional text or explanations, just return the raw markdown content.
+        """
+
+
+# ========== Capture ==========
+class _Captured(Exception):
+    def __init__(self, prompt: str):
+        super().__init__("prompt captured")
+        self.prompt = prompt
+
+
+def capture(module, fn, *args, **kwargs) -> str:
+    """The prompt `fn` sends, taken at its rate_limited_generate call; the model is never called."""
+    def stop(model, prompt, *a, **kw):
+        raise _Captured(prompt)
+
+    module.rate_limited_generate = stop
+    try:
+        fn(*args, **kwargs)
+    except _Captured as captured:
+        return captured.prompt
+    raise RuntimeError(f"{fn.__name__} returned without calling the model")
+
+
+# ========== Inputs ==========
+def sample_pdf_text(module) -> str:
+    try:
+        return module.get_pdf_content(os.path.join(ROOT, "4-structured-outputs-pydantic", "pdfs", "invoice1.pdf"))
+    except ImportError:  # no pypdf: a text layer shaped like pypdf's
+        return textwrap.dedent("""
+            INVOICE                                   No. INV-2025-0142
+            Vendor:   Acme Supplies GmbH              Tax ID:   DE123456789
+            Date:     30.08.2025
+
+            Item                         Qty     Unit price       Amount
+            Paper A4 (box)                 4          24,90        99,60
+            Toner black                    2          79,00       158,00
+
+            Net                                                   257,60
+            VAT 19%                                                48,94
+            Total                                                 306,54
+        """) * 3
+
+
+def cms_html() -> str:
+    """SAMPLE_HTML as a templating engine emits it: deep indentation and blank lines."""
+    lines = []
+    for line in SAMPLE_HTML.strip().splitlines():
+        lines.append("            " + line.replace("  ", "        "))
+        lines.append("")
+    return "\n".join(lines) * 4
+
+
+def sample_posts() -> list[str]:
+    posts = list(SAMPLE_POSTS.values())
+    return posts + [posts[0]]  # the same post saved twice (post-1.md and post-1-copy.md)
+
+
+# ========== Bench ==========
+def run() -> list[dict]:
+    mock_llm.install_genai()
+    fewshot = load_main("1-fewshot-prompting", "fewshot_main")
+    summarizer = load_main("2-multi-step-multi-model", "summarizer_main")
+    invoice_json = load_main("3-structured-output", "invoice_json_main")
+    pydantic_main = load_main("4-structured-outputs-pydantic", "invoice_pydantic_main")
+    article = load_main("5-generating-images", "article_main")
+
+    pdf_text = sample_pdf_text(pydantic_main)
+    html = cms_html()
+    with open(os.path.join(ROOT, "5-generating-images", "new_post", "ai-workflows-vs-agents.txt"), encoding="utf-8") as f:
+        outline = f.read()
+    draft = f"# Draft\n\n{outline}\n\nAgents decide; workflows follow a script."
+    posts = sample_posts()
+
+    rows = [
+        ("1 build_prompt", old_build_prompt(SAMPLE_TOPIC), fewshot.build_prompt(SAMPLE_TOPIC)),
+        ("2 extract_html_chunk", old_extract_html_chunk(html),
+         capture(summarizer, summarizer.extract_html_chunk, html)),
+        ("2 summarize_content", old_summarize_content(html),
+         capture(summarizer, summarizer.summarize_content, html)),
+        ("2 generate_x_post", old_generate_x_post(SUMMARY),
+         capture(summarizer, summarizer.generate_x_post, SUMMARY)),
+        ("3 extract_invoice_details", old_extract_invoice_details(pdf_text),
+         capture(invoice_json, invoice_json.extract_invoice_details, pdf_text)),
+        ("3 extract_invoice_chunk", old_extract_invoice_chunk(pdf_text, 1, 2),
+         capture(invoice_json, invoice_json.extract_invoice_chunk, (1, 2, pdf_text))),
+        ("4 build_extraction_prompt", old_extract_invoice_details(pdf_text),
+         pydantic_main.build_extraction_prompt(pdf_text)),
+        ("4 build_partial_extraction_prompt", old_extract_invoice_chunk(pdf_text, 1, 2),
+         pydantic_main.build_partial_extraction_prompt(pdf_text, 1, 2)),
+    ]
+    with tempfile.TemporaryDirectory() as scratch, working_dir(scratch):
+        os.makedirs("example_posts")
+        for i, post in enumerate(posts):
+            with open(os.path.join("example_posts", f"post-{i}.md"), "w", encoding="utf-8") as f:
+                f.write(post)
+        rows.append(("5 generate_article_draft", old_generate_article_draft(outline, posts),
+                     capture(article, article.generate_article_draft, outline)))
+        rows.append(("5 generate_article_draft (revision)",
+                     old_generate_article_draft(outline, posts, draft, FEEDBACK),
+                     capture(article, article.generate_article_draft, outline, draft, FEEDBACK)))
+
+    results = []
+    for name, before, after in rows:
+        before_tokens, after_tokens = estimate_tokens(before), estimate_tokens(after)
+        results.append({"call_site": name, "before": before_tokens, "after": after_tokens,
+                        "saved": before_tokens - after_tokens,
+                        "saved_pct": 100 * (before_tokens - after_tokens) / before_tokens if before_tokens else 0.0})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens before and after PromptBuilder, per call site.")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run()
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    header = f"{'call site':<38}{'before':>8}{'after':>8}{'saved':>8}{'saved %':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['call_site']:<38}{r['before']:>8}{r['after']:>8}{r['saved']:>8}{r['saved_pct']:>8.1f}%")
+    before, after = sum(r["before"] for r in results), sum(r["after"] for r in results)
+    print("-" * len(header))
+    print(f"{'total':<38}{before:>8}{after:>8}{before - after:>8}{100 * (before - after) / before:>8.1f}%")
+
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+    sys.exit(main())
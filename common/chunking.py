@@ -0,0 +1,95 @@
+"""Split oversized prompt inputs on structural boundaries and fan them out.
+
+    chunks = split_text(pdf_text, 30_000, [PAGE_BREAK, "\\n\\n", "\\n"])
+    chunks = split_html(html, 30_000)
+    results = map_concurrently(extract, chunks)        # results keep chunk order
+
+Token counts are local estimates (tokens.estimate_tokens), so deciding
+whether to chunk costs no API call.
+"""
+import re
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+PAGE_BREAK = "\f"
+MAX_CHUNK_WORKERS = 8
+
+_HTML_NOISE = re.compile(r"<(script|style|noscript|svg)\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+_HTML_BLOCK = re.compile(r"(?=<(?:section|article|main|header|footer|aside|nav|div|table|h[1-6]|p|ul|ol)\b)", re.IGNORECASE)
+
+
+def _pack(units: list[str], max_tokens: int, joiner: str) -> list[str]:
+    """Greedily group consecutive units into chunks of at most max_tokens."""
+    chunks, current, current_tokens = [], [], 0
+    joiner_tokens = estimate_tokens(joiner)
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if current and current_tokens + joiner_tokens + tokens > max_tokens:
+            chunks.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens + (joiner_tokens if len(current) > 1 else 0)
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def split_text(text: str, max_tokens: int, separators: list[str]) -> list[str]:
+    """Split on the first separator; units that are still too big recurse into the next one."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    if not separators:
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    separator, rest = separators[0], separators[1:]
+    units = []
+    for unit in text.split(separator):
+        units.extend(split_text(unit, max_tokens, rest) if estimate_tokens(unit) > max_tokens else [unit])
+    return _pack(units, max_tokens, separator)
+
+
+def split_html(html: str, max_tokens: int) -> list[str]:
+    """Split HTML between block-level elements; scripts/styles/comments are dropped first."""
+    if estimate_tokens(html) <= max_tokens:
+        return [html]
+    html = _HTML_NOISE.sub("", html)
+    if estimate_tokens(html) <= max_tokens:
+        return [html]
+    units = []
+    for section in _HTML_BLOCK.split(html):
+        if not section.strip():
+            continue
+        units.extend(split_text(section, max_tokens, ["\n\n", "\n", " "]) if estimate_tokens(section) > max_tokens else [section])
+    return _pack(units, max_tokens, "")
+
+
+def map_concurrently(fn, items: list, max_workers: int = MAX_CHUNK_WORKERS) -> list:
+    if len(items) == 1:
+        return [fn(items[0])]
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        # run each item in a copy of the caller's context, so tracing spans nest under the caller
+        futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def merge_partial_records(records: list[dict], prefer_last: tuple[str, ...] = ()) -> dict:
+    """Field-level merge of per-chunk extractions, deterministic in chunk order.
+
+    A field takes its first non-empty value; fields named in `prefer_last`
+    (e.g. totals, which sit at the end of a document) take their last one.
+    """
+    merged: dict = {}
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        for key, value in record.items():
+            if value in (None, "", [], {}) or (key in prefer_last and value == 0):
+                continue
+            if isinstance(value, dict):
+                merged[key] = merge_partial_records([merged.get(key) or {}, value], prefer_last)
+            elif key in prefer_last or key not in merged:
+                merged[key] = value
+    return merged
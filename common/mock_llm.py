@@ -0,0 +1,327 @@
+"""Offline stand-in for the Gemini and LiteLLM backends.
+
+Speaks the same interface the scripts already use, so pipelines can run (and
+be benchmarked) without credentials or network:
+
+    import mock_llm
+    backend = mock_llm.install_genai(mock_llm.MockConfig(latency=0.2, jitter=0.05))
+    import google.generativeai as genai          # -> the fake module
+    genai.GenerativeModel("gemini-1.5-flash").generate_content("Hi").text
+
+    resp = mock_llm.completion(model="gemini/gemini-1.5-flash",
+                               messages=[{"role": "user", "content": "Hi"}])
+    resp["choices"][0]["message"]["content"]
+"""
+import asyncio
+import collections
+import json
+import random
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+
+from tokens import estimate_tokens
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0          # seconds before the first token
+    jitter: float = 0.0           # +/- uniform noise added to latency
+    error_rate: float = 0.0       # probability of a simulated 429
+    tokens_per_sec: float = 0.0   # output speed, 0 = whole answer at once
+    seed: int | None = None
+    quota_rpm: float = 0.0        # server-side quota: 429 past this many calls/minute, 0 = none
+    model_latency: dict[str, float] | None = None  # per-model latency, overrides `latency`
+    sloppiness: dict[str, float] | None = None     # per-model chance of a schema-valid but inconsistent answer
+
+
+class MockRateLimitError(Exception):
+    """Simulated quota error, shaped like google.api_core ResourceExhausted."""
+    code = 429
+
+
+class MockResponse:
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.usage_metadata = types.SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens,
+        )
+
+
+class _AttrDict(dict):
+    """dict that also allows attribute access, like litellm's ModelResponse."""
+
+    def __getattr__(self, name):
+        try:
+            value = self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return _wrap(value)
+
+    def __getitem__(self, key):
+        return _wrap(dict.__getitem__(self, key))
+
+
+def _wrap(value):
+    if isinstance(value, dict) and not isinstance(value, _AttrDict):
+        return _AttrDict(value)
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+
+# ========== Backend ==========
+class MockBackend:
+    def __init__(self, config: MockConfig | None = None, canned: dict[str, str] | None = None):
+        self.config = config or MockConfig()
+        # substring of the prompt -> response text, first match wins
+        self.canned = dict(canned or {})
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._recent_calls = collections.deque()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    # --- per-thread clock of simulated backend time, used to split out our own overhead
+    def reset_thread_clock(self) -> None:
+        self._local.simulated = 0.0
+
+    def thread_clock(self) -> float:
+        return getattr(self._local, "simulated", 0.0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+    def plan(self, prompt: str, schema: dict | None = None, model: str | None = None):
+        """Decide what the call will do: (delay_seconds, text or None on error, prompt_tokens)."""
+        cfg = self.config
+        with self._lock:
+            latency = (cfg.model_latency or {}).get(model, cfg.latency)
+            delay = latency + (self._rng.uniform(-cfg.jitter, cfg.jitter) if cfg.jitter else 0.0)
+            fail = (cfg.error_rate > 0 and self._rng.random() < cfg.error_rate) or self._over_quota()
+            sloppy = self._rng.random() < (cfg.sloppiness or {}).get(model, 0.0)
+            text = None if fail else self._render(prompt, schema, sloppy)
+        prompt_tokens = estimate_tokens(prompt)
+        if text is not None and cfg.tokens_per_sec > 0:
+            delay += estimate_tokens(text) / cfg.tokens_per_sec
+        return max(delay, 0.0), text, prompt_tokens
+
+    def _over_quota(self) -> bool:
+        if not self.config.quota_rpm:
+            return False
+        now = time.monotonic()
+        while self._recent_calls and now - self._recent_calls[0] > 60.0:
+            self._recent_calls.popleft()
+        if len(self._recent_calls) >= self.config.quota_rpm:
+            return True
+        self._recent_calls.append(now)
+        return False
+
+    def record(self, delay: float, text: str | None, prompt_tokens: int) -> MockResponse:
+        self._local.simulated = self.thread_clock() + delay
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            if text is None:
+                self.errors += 1
+            else:
+                self.output_tokens += estimate_tokens(text)
+        if text is None:
+            raise MockRateLimitError("429 Resource has been exhausted (mock backend)")
+        return MockResponse(text, prompt_tokens, estimate_tokens(text))
+
+    def respond(self, prompt: str, schema: dict | None = None, model: str | None = None) -> MockResponse:
+        delay, text, prompt_tokens = self.plan(prompt, schema, model)
+        if delay:
+            time.sleep(delay)
+        return self.record(delay, text, prompt_tokens)
+
+    async def arespond(self, prompt: str, schema: dict | None = None, model: str | None = None) -> MockResponse:
+        delay, text, prompt_tokens = self.plan(prompt, schema, model)
+        if delay:
+            await asyncio.sleep(delay)
+        return self.record(delay, text, prompt_tokens)
+
+    def _render(self, prompt: str, schema: dict | None, sloppy: bool = False) -> str:
+        for needle, answer in self.canned.items():
+            if needle in prompt:
+                return answer
+        if schema:
+            data = sample_from_schema(schema, self._rng)
+            if sloppy and isinstance(data, dict):
+                # the kind of slip a weak model makes: numbers swapped between fields, tax above the total
+                data = {k: v * 1000 if "tax" in k.lower() and isinstance(v, (int, float)) else v
+                        for k, v in data.items()}
+            return json.dumps(data)
+        first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "")
+        return f"Mock response ({len(prompt)} chars prompt): {first_line[:80]}"
+
+
+def sample_from_schema(schema: dict, rng: random.Random, key: str = ""):
+    """Build a value that conforms to a (Gemini-style) JSON schema."""
+    kind = schema.get("type", "object")
+    if kind == "object":
+        return {name: sample_from_schema(sub, rng, name) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {"type": "string"}), rng, key)]
+    if kind == "number":
+        # keep amounts plausible: tax is always a fraction of a total
+        if "tax" in key.lower():
+            return round(rng.uniform(1, 100), 2)
+        return round(rng.uniform(100, 10000), 2)
+    if kind == "integer":
+        return rng.randint(1, 1000)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if "date" in key.lower():
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    if "taxid" in key.lower():
+        return str(rng.randint(10**9, 10**10 - 1))
+    return f"Mock {schema.get('description') or key or 'value'}"
+
+
+# ========== google.generativeai lookalike ==========
+_backend: MockBackend | None = None
+
+
+def _schema_of(generation_config) -> dict | None:
+    if not generation_config:
+        return None
+    if isinstance(generation_config, dict):
+        schema = generation_config.get("response_schema")
+    else:
+        schema = getattr(generation_config, "response_schema", None)
+    return schema if isinstance(schema, dict) else None
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, dict):
+        return "\n".join(str(p.get("text", p)) if isinstance(p, dict) else str(p)
+                         for p in contents.get("parts", []))
+    return "\n".join(_prompt_text(c) for c in contents)
+
+
+class MockGenerativeModel:
+    def __init__(self, model_name: str = "gemini-1.5-flash", generation_config=None, **kwargs):
+        self.model_name = model_name
+        self._generation_config = generation_config
+
+    def generate_content(self, contents, generation_config=None, **kwargs) -> MockResponse:
+        schema = _schema_of(generation_config or self._generation_config)
+        return get_backend().respond(_prompt_text(contents), schema, self.model_name)
+
+    async def generate_content_async(self, contents, generation_config=None, **kwargs) -> MockResponse:
+        schema = _schema_of(generation_config or self._generation_config)
+        return await get_backend().arespond(_prompt_text(contents), schema, self.model_name)
+
+
+def get_backend() -> MockBackend:
+    global _backend
+    if _backend is None:
+        _backend = MockBackend()
+    return _backend
+
+
+def set_backend(backend: MockBackend) -> MockBackend:
+    global _backend
+    _backend = backend
+    return backend
+
+
+def make_genai_module() -> types.ModuleType:
+    module = types.ModuleType("google.generativeai")
+    module.configure = lambda **kwargs: None
+    module.GenerativeModel = MockGenerativeModel
+    module.MockRateLimitError = MockRateLimitError
+    return module
+
+
+def install_genai(config: MockConfig | None = None, canned: dict[str, str] | None = None) -> MockBackend:
+    """Make `import google.generativeai` (eager or lazy) return the fake module."""
+    backend = set_backend(MockBackend(config, canned))
+    fake = make_genai_module()
+    google = sys.modules.get("google")
+    if google is None:
+        try:
+            import google  # noqa: F401  (real namespace package, if installed)
+        except ImportError:
+            google = types.ModuleType("google")
+            google.__path__ = []
+            sys.modules["google"] = google
+        google = sys.modules["google"]
+    google.generativeai = fake
+    sys.modules["google.generativeai"] = fake
+    return backend
+
+
+def patch_module(module) -> None:
+    """Swap the fake in for a script that already imported the real SDK."""
+    if hasattr(module, "genai"):
+        module.genai = sys.modules["google.generativeai"]
+
+
+# ========== litellm lookalike ==========
+def _completion_response(model: str, response: MockResponse) -> _AttrDict:
+    usage = response.usage_metadata
+    return _AttrDict({
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": response.text}}],
+        "usage": {"prompt_tokens": usage.prompt_token_count,
+                  "completion_tokens": usage.candidates_token_count,
+                  "total_tokens": usage.total_token_count},
+    })
+
+
+def _messages_text(messages: list[dict]) -> str:
+    return "\n".join(str(m.get("content", "")) for m in messages)
+
+
+def completion(model: str, messages: list[dict], **kwargs) -> _AttrDict:
+    response = get_backend().respond(_messages_text(messages), None, model)
+    return _completion_response(model, response)
+
+
+async def acompletion(model: str, messages: list[dict], **kwargs) -> _AttrDict:
+    response = await get_backend().arespond(_messages_text(messages), None, model)
+    return _completion_response(model, response)
+
+
+# ========== crewAI lookalike ==========
+def make_crew_llm(model: str = "mock/gemini-1.5-flash"):
+    """A crewAI LLM that answers from the mock backend (imports crewai lazily)."""
+    from crewai.llms.base_llm import BaseLLM
+
+    class MockCrewLLM(BaseLLM):
+        def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+            if isinstance(messages, str):
+                messages = [{"role": "user", "content": messages}]
+            text = get_backend().respond(_messages_text(messages), None, self.model).text
+            # crewAI's ReAct parser expects this framing
+            return f"Thought: I now can give a great answer\nFinal Answer: {text}"
+
+        def supports_function_calling(self) -> bool:
+            return False
+
+        def supports_stop_words(self) -> bool:
+            return False
+
+        def get_context_window_size(self) -> int:
+            return 1_000_000
+
+    return MockCrewLLM(model=model)
@@ -0,0 +1,328 @@
+"""Built-in profiling for every entry point: CPU samples, memory and where the wall time went.
+
+    python main.py --profile                      # writes profiles/main-<time>.collapsed and .txt
+    python main.py invoice.pdf --profile=out/run  # out/run.collapsed and out/run.txt
+    PROFILE=1 crewai run                          # for entry points that don't take arguments
+
+    if __name__ == "__main__":
+        with profile_from_argv():
+            main()
+
+A background thread samples the stack of every thread each PROFILE_INTERVAL_MS
+(default 5 ms) with `sys._current_frames()`, so nothing needs instrumenting
+and the overhead stays around 1-2%. `tracemalloc` runs alongside for the peak
+and the top allocation sites (PROFILE_MEMORY=0 turns it off: it slows
+allocation-heavy code down noticeably).
+
+Every sample is put in one bucket: network (HTTP/gRPC clients, the mock LLM's
+simulated latency), rate-limit wait, imports, PDF parsing, HTML parsing, prompt
+building, JSON/Pydantic, SQLite, other local work, or idle (a pool thread
+waiting for work, the main thread waiting on its workers). The innermost
+frame that matches decides, see CATEGORIES. It's a heuristic, but it tells
+local work from waiting, which is what decides the next fix.
+
+Outputs:
+- `<name>.collapsed`: one `thread;module:function;... count` line per stack,
+  for flamegraph.pl, speedscope or inferno.
+- `<name>.txt`: the summary printed at exit (wall/CPU, time per bucket for the
+  main thread and for all busy threads, top functions, memory).
+"""
+import linecache
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL_MS = 5.0
+
+NETWORK, WAIT, IMPORTS, LOCAL, IDLE = "network", "rate-limit wait", "imports", "other local", "idle"
+# (bucket, module prefixes, function-name pattern, pattern for the source line of the innermost frame:
+#  a C call such as cursor.execute() has no Python frame of its own)
+CATEGORIES = [
+    (NETWORK, ("socket", "ssl", "http.client", "urllib3", "requests", "httpx", "httpcore", "aiohttp", "grpc",
+               "google.api_core", "google.auth", "google.ai", "google.genai", "openai", "litellm", "mock_llm"),
+     None, None),
+    ("pdf parsing", ("pypdf", "PyPDF2", "pdfplumber", "pdfminer", "fitz"), re.compile(r"pdf"), None),
+    ("html parsing", ("bs4", "lxml", "html.parser", "html5lib"), re.compile(r"html"), None),
+    ("sqlite", ("sqlite3",), re.compile(r"database|sqlite|_db$|^insert_"),
+     re.compile(r"\.(execute|executemany|executescript|commit|fetchone|fetchall)\(|sqlite3\.connect")),
+    ("json/pydantic", ("json", "pydantic", "pydantic_core", "structured", "jsonschema"),
+     re.compile(r"json|^validate|parse_lenient"), re.compile(r"json\.(loads|dumps)|model_validate|model_dump")),
+    ("prompt building", ("tokens", "chunking", "prompting"), re.compile(r"prompt"), None),
+]
+# a thread blocked in these is waiting on something else, not working
+IDLE_MODULES = ("threading", "queue", "concurrent.futures", "selectors", "asyncio")
+SLEEP_LINE = re.compile(r"\bsleep\(|\.wait\(")
+
+
+def _module(frame) -> str:
+    return frame.f_globals.get("__name__") or os.path.basename(frame.f_code.co_filename)
+
+
+def _line(frame) -> str:
+    return linecache.getline(frame.f_code.co_filename, frame.f_lineno)
+
+
+def _match(frame, innermost: bool) -> str | None:
+    module, function = _module(frame), frame.f_code.co_name
+    if innermost and module == "rate_limit" and SLEEP_LINE.search(_line(frame)):
+        return WAIT
+    for bucket, prefixes, function_pattern, line_pattern in CATEGORIES:
+        if module.startswith(prefixes) or (function_pattern is not None and function_pattern.search(function)):
+            return bucket
+        if innermost and line_pattern is not None and line_pattern.search(_line(frame)):
+            return bucket
+    return None
+
+
+def classify(frame) -> str:
+    """The bucket of one thread's current stack: the innermost frame that matches decides."""
+    outer = frame
+    while outer is not None:
+        if outer.f_code.co_filename == "<frozen importlib._bootstrap>":
+            return IMPORTS  # lazy imports run inside whatever first needs them
+        outer = outer.f_back
+    blocked = False
+    while frame is not None and _module(frame).startswith(IDLE_MODULES):
+        frame, blocked = frame.f_back, True
+    if frame is None:
+        return IDLE
+    if blocked:
+        # waiting on a lock, queue or future: busy only if it's the HTTP client or the rate limiter waiting
+        bucket = _match(frame, innermost=True)
+        return bucket if bucket in (NETWORK, WAIT) else IDLE
+    innermost = True
+    while frame is not None:
+        bucket = _match(frame, innermost)
+        if bucket is not None:
+            return bucket
+        frame, innermost = frame.f_back, False
+    return LOCAL
+
+
+# ========== Sampler ==========
+class Profiler:
+    """Samples every thread's stack from a daemon thread; `tracemalloc` for memory."""
+
+    def __init__(self, name: str = "profile", interval_ms: float | None = None, memory: bool | None = None):
+        self.name = name
+        self.interval = (interval_ms or float(os.getenv("PROFILE_INTERVAL_MS", DEFAULT_INTERVAL_MS))) / 1000
+        self.memory = os.getenv("PROFILE_MEMORY", "1") not in ("0", "false") if memory is None else memory
+        self.stacks: Counter = Counter()      # (thread, frames...) -> samples
+        self.buckets: Counter = Counter()     # (is_main, bucket) -> seconds
+        self.samples = 0
+        self._labels: dict = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> "Profiler":
+        if self.memory:
+            tracemalloc.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.wall_seconds = time.perf_counter() - self._wall
+        self.cpu_seconds = time.process_time() - self._cpu
+        self.peak_bytes = 0
+        self.top_allocations = []
+        if self.memory and tracemalloc.is_tracing():
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, linecache.__file__),
+            ))
+            self.top_allocations = snapshot.statistics("lineno")[:10]
+            tracemalloc.stop()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        main = threading.main_thread().ident
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            # weight by the real gap: busy threads holding the GIL delay the sampler past its interval
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            with self._lock:
+                self.samples += 1
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    # pool threads "ThreadPoolExecutor-0_3" share one root in the flamegraph
+                    thread = re.sub(r"_\d+$", "", names.get(ident, str(ident)))
+                    self.buckets[(ident == main, classify(frame))] += elapsed
+                    self.stacks[(thread, *self._stack(frame))] += 1
+
+    def _stack(self, frame) -> list[str]:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f"{_module(frame)}:{code.co_name}".replace(";", ",").replace(" ", "_")
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    # ========== Output ==========
+    def collapsed(self) -> str:
+        with self._lock:
+            return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self, top: int = 15) -> str:
+        with self._lock:
+            stacks, buckets, samples = dict(self.stacks), dict(self.buckets), self.samples
+        wall, cpu = self.wall_seconds, self.cpu_seconds
+        lines = [f"Profile of {self.name}: {wall:.2f}s wall, {cpu:.2f}s CPU ({100 * cpu / wall if wall else 0:.0f}%), "
+                 f"{samples} samples every {1000 * self.interval:g} ms", ""]
+
+        def breakdown(title: str, counts: dict[str, float]) -> None:
+            total = sum(counts.values())
+            if not total:
+                return
+            lines.append(title)
+            for bucket, seconds in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+                lines.append(f"  {bucket:<18}{seconds:>9.2f}s{100 * seconds / total:>7.1f}%")
+            local = sum(c for b, c in counts.items() if b not in (NETWORK, WAIT, IDLE))
+            waiting = sum(c for b, c in counts.items() if b in (NETWORK, WAIT))
+            lines.append(f"  -> local work {100 * local / total:.0f}%, waiting on the network "
+                         f"{100 * waiting / total:.0f}%")
+            lines.append("")
+
+        breakdown("Main thread (wall time)", {b: c for (is_main, b), c in buckets.items() if is_main})
+        busy: Counter = Counter()
+        for (_, bucket), count in buckets.items():
+            if bucket != IDLE:
+                busy[bucket] += count
+        breakdown("All threads (busy thread-seconds)", busy)
+
+        self_samples: Counter = Counter()
+        total_samples: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            self_samples[frames[-1]] += count
+            for label in set(frames):
+                total_samples[label] += count
+        per_sample = wall / samples if samples else self.interval
+        lines.append(f"{'function':<60}{'self s':>9}{'total s':>9}")
+        for label, count in self_samples.most_common(top):
+            lines.append(f"{label[-59:]:<60}{count * per_sample:>9.2f}{total_samples[label] * per_sample:>9.2f}")
+        lines.append("")
+
+        if self.memory:
+            lines.append(f"Memory: {self.peak_bytes / 2**20:.1f} MiB peak traced{_max_rss()}")
+            for stat in self.top_allocations:
+                where = stat.traceback[0]
+                lines.append(f"  {stat.size / 2**10:>10.1f} KiB {stat.count:>8} blocks  "
+                             f"{_short_path(where.filename)}:{where.lineno}")
+        return "\n".join(lines)
+
+    def write(self, base: str) -> tuple[str, str]:
+        os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+        collapsed_path, summary_path = f"{base}.collapsed", f"{base}.txt"
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        summary = self.summary()
+        with open(summary_path, "w", encoding="utf-8") as f:
+            f.write(summary + "\n")
+        return collapsed_path, summary_path
+
+
+def _max_rss() -> str:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return ""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return f", {rss / (2**20 if sys.platform == 'darwin' else 2**10):.1f} MiB max RSS"
+
+
+def _short_path(path: str) -> str:
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and path.startswith(prefix + os.sep):
+            return path[len(prefix) + 1:]
+    return path
+
+
+# ========== Entry points ==========
+@contextmanager
+def profiled(name: str | None = None, output: str | None = None, interval_ms: float | None = None,
+             memory: bool | None = None):
+    """Profile the block; write `<output>.collapsed` and `<output>.txt` and print the summary."""
+    name = name or os.path.splitext(os.path.basename(sys.argv[0] or "profile"))[0]
+    output = output or os.path.join(PROFILE_DIR, f"{name}-{datetime.now():%Y%m%d-%H%M%S}")
+    profiler = Profiler(name, interval_ms, memory).start()
+    logging.info(f"🔵 Profiling {name} (sampling every {1000 * profiler.interval:g} ms)")
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        collapsed_path, summary_path = profiler.write(output)
+        print("\n" + profiler.summary(), file=sys.stderr)
+        print(f"\n✅ Profile written to {summary_path} and {collapsed_path} (flamegraph.pl / speedscope)",
+              file=sys.stderr)
+
+
+def profile_from_argv(name: str | None = None):
+    """`profiled()` when `--profile[=path]` is in sys.argv (removed before main() parses it) or PROFILE is set.
+
+    PROFILE=1 uses the default path, any other value is the output path.
+    """
+    output = None
+    requested = False
+    for arg in list(sys.argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            requested = True
+            output = arg.partition("=")[2] or output
+            sys.argv.remove(arg)
+    env = os.getenv("PROFILE", "")
+    if env not in ("", "0", "false"):
+        requested = True
+        output = output or (env if env not in ("1", "true") else None)
+    if not requested:
+        return _nothing()
+    return profiled(name, output)
+
+
+@contextmanager
+def _nothing():
+    yield None
+
+
+if __name__ == "__main__":
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description="Profile any script: python profiling.py script.py [args...]")
+    parser.add_argument("--output", help="output path without extension (default profiles/<script>-<time>)")
+    parser.add_argument("--interval-ms", type=float, default=None)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    sys.argv = [args.script, *args.args]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+    name = os.path.splitext(os.path.basename(args.script))[0]
+    with profiled(name, args.output, args.interval_ms, False if args.no_memory else None):
+        runpy.run_path(args.script, run_name="__main__")
@@ -0,0 +1,200 @@
+"""Prompt builder: compact, measured prompts with a token budget per call.
+
+    prompt = (
+        PromptBuilder("summarize", budget=SUMMARY_PROMPT_TOKENS, overflow="truncate")
+        .text('''
+            You are an expert summarizer.
+            Here is the content to summarize:
+        ''')
+        .block("content", content, truncatable=True)
+        .text("Please provide a brief summary of the main points.")
+        .build()
+    )
+
+Instruction text is dedented and its lines stripped, so the indentation of a
+triple-quoted string inside a function never reaches the model. Data blocks
+(`<tag>...</tag>`) keep their line structure and relative indentation, so
+code and nested lists survive, but lose trailing spaces, runs of spaces
+inside a line and extra blank lines; fenced code blocks keep their spacing. A section or example identical to an earlier
+one is dropped. All of this is deterministic: the same inputs give the same
+prompt, byte for byte, so cached and coalesced requests still match.
+
+`build()` logs the estimated tokens of every section (tokens.estimate_tokens,
+no tokenizer or network call), and how many the compaction saved compared
+with the raw sections. Over `budget`, overflow="error" raises PromptBudgetError
+listing the sections, and overflow="truncate" shortens the truncatable
+sections, largest first: examples are dropped from the end, text is cut with
+a "[... N tokens truncated]" marker.
+"""
+import hashlib
+import logging
+import re
+import textwrap
+
+from tokens import CHARS_PER_TOKEN, estimate_tokens
+from tracing import set_attribute
+
+_SPACES = re.compile(r"[ \t\f\v]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_FENCE = re.compile(r"\s*(```|~~~)")
+
+
+class PromptBudgetError(ValueError):
+    pass
+
+
+def compact_text(text: str) -> str:
+    """Instructions: dedented, every line stripped, at most one blank line in a row."""
+    lines = [line.strip() for line in textwrap.dedent(text).splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+def compact_data(text: str) -> str:
+    """Data (documents, HTML, examples): common indentation removed, leading indentation kept,
+    runs of spaces after it collapsed (not inside fenced code), at most one blank line in a row."""
+    lines, in_fence = [], False
+    for line in textwrap.dedent(str(text)).splitlines():
+        line = line.rstrip()
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            body = line.lstrip()
+            line = line[:len(line) - len(body)] + _SPACES.sub(" ", body)
+        lines.append(line)
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip("\n")
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(" ".join(text.split()).encode()).hexdigest()
+
+
+class _Section:
+    def __init__(self, name: str, raw: str, text: str = "", tag: str | None = None,
+                 items: list[str] | None = None, item_tag: str | None = None, truncatable: bool = False):
+        self.name = name
+        self.raw = raw
+        self.text = text
+        self.tag = tag
+        self.items = items
+        self.item_tag = item_tag
+        self.truncatable = truncatable
+        self.truncated = 0
+
+    def render(self) -> str:
+        body = self.text
+        if self.items is not None:
+            body = "\n\n".join(f"<{self.item_tag}-{i}>\n{item}\n</{self.item_tag}-{i}>"
+                               for i, item in enumerate(self.items, start=1))
+        return f"<{self.tag}>\n{body}\n</{self.tag}>" if self.tag else body
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
+
+
+class PromptBuilder:
+    def __init__(self, name: str, budget: int | None = None, overflow: str = "error"):
+        if overflow not in ("error", "truncate"):
+            raise ValueError(f"overflow must be 'error' or 'truncate', not {overflow!r}")
+        self.name = name
+        self.budget = budget
+        self.overflow = overflow
+        self.sections: list[_Section] = []
+        self.report: dict = {}
+
+    def text(self, text: str, name: str = "instructions") -> "PromptBuilder":
+        self.sections.append(_Section(name, text, compact_text(text)))
+        return self
+
+    def block(self, tag: str, content: str, truncatable: bool = False, name: str | None = None) -> "PromptBuilder":
+        """`content` wrapped in <tag>...</tag>."""
+        content = str(content)
+        self.sections.append(_Section(name or tag, content, compact_data(content), tag=tag, truncatable=truncatable))
+        return self
+
+    def examples(self, tag: str, items: list[str], item_tag: str, truncatable: bool = True,
+                 name: str | None = None) -> "PromptBuilder":
+        """Numbered <item_tag-N> items inside <tag>; duplicates dropped, the last ones go first when truncating."""
+        unique, seen = [], set()
+        for item in items:
+            item = compact_data(item)
+            if item and _key(item) not in seen:
+                seen.add(_key(item))
+                unique.append(item)
+        if len(unique) < len(items):
+            logging.info(f"🔵 Prompt {self.name}: dropped {len(items) - len(unique)} repeated <{item_tag}> items")
+        raw = "\n\n".join(str(item) for item in items)
+        self.sections.append(_Section(name or tag, raw, tag=tag, items=unique, item_tag=item_tag,
+                                      truncatable=truncatable))
+        return self
+
+    # ========== Build ==========
+    def build(self) -> str:
+        sections, seen = [], set()
+        for section in self.sections:
+            key = _key(section.render())
+            if key in seen:
+                logging.info(f"🔵 Prompt {self.name}: dropped a repeated {section.name} section")
+                continue
+            seen.add(key)
+            sections.append(section)
+
+        total = self._total(sections)
+        if self.budget is not None and total > self.budget:
+            if self.overflow == "error":
+                raise PromptBudgetError(
+                    f"Prompt {self.name} is ~{total} tokens, over its budget of {self.budget} "
+                    f"({self._sizes(sections)})")
+            total = self._truncate(sections, total)
+
+        prompt = "\n\n".join(section.render() for section in sections)
+        raw_tokens = estimate_tokens("\n\n".join(section.raw for section in self.sections))
+        tokens = estimate_tokens(prompt)
+        truncated = sum(section.truncated for section in sections)
+        self.report = {
+            "name": self.name,
+            "tokens": tokens,
+            "raw_tokens": raw_tokens,
+            "saved_tokens": max(0, raw_tokens - tokens - truncated),
+            "truncated_tokens": truncated,
+            "sections": {},
+        }
+        for section in sections:
+            self.report["sections"][section.name] = self.report["sections"].get(section.name, 0) + section.tokens()
+        logging.info(f"🔵 Prompt {self.name}: ~{tokens} tokens ({self._sizes(sections)}), "
+                     f"{self.report['saved_tokens']} saved by compaction")
+        set_attribute("prompt.tokens", tokens)
+        return prompt
+
+    def _total(self, sections: list[_Section]) -> int:
+        return estimate_tokens("\n\n".join(section.render() for section in sections))
+
+    def _sizes(self, sections: list[_Section]) -> str:
+        return ", ".join(f"{section.name} {section.tokens()}" for section in sections)
+
+    def _truncate(self, sections: list[_Section], total: int) -> int:
+        for section in sorted((s for s in sections if s.truncatable), key=lambda s: s.tokens(), reverse=True):
+            excess = total - self.budget
+            if excess <= 0:
+                break
+            before = section.tokens()
+            if section.items is not None:
+                while len(section.items) > 1 and self._total(sections) > self.budget:
+                    section.items.pop()
+                if self._total(sections) > self.budget:
+                    section.items[0] = self._cut(section.items[0], self._total(sections) - self.budget)
+            else:
+                section.text = self._cut(section.text, excess)
+            section.truncated += before - section.tokens()
+            total = self._total(sections)
+        if total > self.budget:
+            raise PromptBudgetError(f"Prompt {self.name} is ~{total} tokens after truncation, over its budget of "
+                                    f"{self.budget} ({self._sizes(sections)})")
+        logging.warning(f"🟡 Prompt {self.name} truncated to ~{total} tokens to fit its budget of {self.budget} "
+                        f"({', '.join(f'{s.name} -{s.truncated}' for s in sections if s.truncated)})")
+        return total
+
+    @staticmethod
+    def _cut(text: str, excess_tokens: int) -> str:
+        marker_tokens = 8
+        keep = max(0, len(text) - (excess_tokens + marker_tokens) * CHARS_PER_TOKEN)
+        return f"{text[:keep].rstrip()}\n[... {estimate_tokens(text[keep:])} tokens truncated]"
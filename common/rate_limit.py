@@ -0,0 +1,247 @@
+"""Client-side quota awareness for Gemini calls.
+
+Two layers, shared by every call in the process:
+  * RateLimiter - token buckets for requests/min and tokens/min (prompt size
+    is estimated locally, no count_tokens round-trip).
+  * AdaptiveConcurrency - AIMD limit on in-flight calls: +1 per healthy
+    round, halve on a 429 or when latency climbs well above its baseline.
+
+Configure with GEMINI_RPM, GEMINI_TPM (0 / unset = unlimited) and
+GEMINI_MAX_CONCURRENCY, then send requests through rate_limited_generate().
+
+Token usage of the calls made inside a `with track_usage() as usage:` block
+(including map_concurrently workers) is collected in `usage.calls`.
+"""
+import contextvars
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from tokens import estimate_tokens
+from tracing import span
+
+
+# Output tokens also count against TPM but are unknown up front.
+OUTPUT_TOKEN_RESERVE = 256
+THROTTLE_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests", "RateLimitError", "MockRateLimitError"}
+# a wrapped 429 without a status code: the number alone could be a token count, an ID or an amount
+_THROTTLE_MESSAGE = re.compile(r"\b429\b.*\b(quota|rate.?limit|too many requests|resource.*exhausted)"
+                               r"|\b(quota|rate.?limit|too many requests|resource.*exhausted).*\b429\b",
+                               re.IGNORECASE | re.DOTALL)
+
+
+# Providers enforce quotas over a rolling minute. A bucket that bursts B and
+# refills at R/min can admit B + R in one window, so split the quota: a 10%
+# burst plus a 90% refill rate never exceeds it.
+BURST_FRACTION = 0.1
+
+
+# ========== Token bucket ==========
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, per_minute * BURST_FRACTION)
+        self.rate = per_minute * (1 - BURST_FRACTION) / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request still goes, once the bucket is full
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = 0, tpm: float = 0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Block until both buckets can pay for one request of `tokens`; returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self.requests.wait_time(1, now) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+                )
+                if wait == 0.0:
+                    if self.requests:
+                        self.requests.take(1)
+                    if self.tokens:
+                        self.tokens.take(tokens)
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+
+# ========== AIMD concurrency ==========
+class AdaptiveConcurrency:
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 32,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0, latency_slack: float = 0.05,
+                 cooldown: float = 1.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_slack = latency_slack  # absolute seconds, so jitter on very fast calls isn't "rising latency"
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline_latency: float | None = None
+        self.smoothed_latency: float | None = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float | None = None, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease()
+            elif latency is not None:
+                self._observe(latency)
+            self._cond.notify_all()
+
+    def _observe(self, latency: float) -> None:
+        self.smoothed_latency = latency if self.smoothed_latency is None else 0.8 * self.smoothed_latency + 0.2 * latency
+        if self.baseline_latency is None or latency < self.baseline_latency:
+            self.baseline_latency = latency
+        else:
+            # let the baseline drift up slowly so one lucky fast call doesn't pin it forever
+            self.baseline_latency += 0.01 * (latency - self.baseline_latency)
+        if self.smoothed_latency > self.latency_tolerance * self.baseline_latency + self.latency_slack:
+            self._decrease()
+        else:
+            # additive increase: roughly +1 per `limit` successful calls, i.e. per round
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return  # one back-off per burst of failures, not one per failed call
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        logging.warning(f"🟡 Backing off Gemini concurrency to {int(self.limit)}")
+
+
+# ========== Shared instances ==========
+_limiter: RateLimiter | None = None
+_controller: AdaptiveConcurrency | None = None
+_init_lock = threading.Lock()
+
+
+def configure(rpm: float | None = None, tpm: float | None = None, max_concurrency: int | None = None) -> None:
+    """(Re)create the process-wide limiter and controller; None falls back to the env vars."""
+    global _limiter, _controller
+    with _init_lock:
+        rpm = float(os.getenv("GEMINI_RPM", "0")) if rpm is None else rpm
+        tpm = float(os.getenv("GEMINI_TPM", "0")) if tpm is None else tpm
+        max_concurrency = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")) if max_concurrency is None else max_concurrency
+        _limiter = RateLimiter(rpm, tpm)
+        _controller = AdaptiveConcurrency(initial=min(2, max_concurrency), max_limit=max_concurrency)
+
+
+def get_limiter() -> RateLimiter:
+    if _limiter is None:
+        configure()
+    return _limiter
+
+
+def get_controller() -> AdaptiveConcurrency:
+    if _controller is None:
+        configure()
+    return _controller
+
+
+# ========== Usage ==========
+_usage: contextvars.ContextVar["list[dict] | None"] = contextvars.ContextVar("llm_usage", default=None)
+
+
+class track_usage:
+    """Collects model / prompt_tokens / output_tokens of every call made inside the block."""
+
+    def __enter__(self) -> "track_usage":
+        self.calls: list[dict] = []
+        self._token = _usage.set(self.calls)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        _usage.reset(self._token)
+        return False
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(c["prompt_tokens"] for c in self.calls)
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(c["output_tokens"] for c in self.calls)
+
+
+def _record_usage(model, response, call) -> None:
+    meta = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(meta, "prompt_token_count", 0) or 0
+    output_tokens = getattr(meta, "candidates_token_count", 0) or 0
+    call.set("prompt_tokens", prompt_tokens)
+    call.set("output_tokens", output_tokens)
+    calls = _usage.get()
+    if calls is not None:
+        calls.append({"model": getattr(model, "model_name", ""), "prompt_tokens": prompt_tokens,
+                      "output_tokens": output_tokens})
+
+
+def is_throttle_error(error: Exception) -> bool:
+    if type(error).__name__ in THROTTLE_ERROR_NAMES:
+        return True
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code is not None:
+        return code == 429 or str(code) == "429"
+    return bool(_THROTTLE_MESSAGE.search(str(error)))
+
+
+def rate_limited_generate(model, prompt, max_retries: int = 5, **kwargs):
+    """model.generate_content(prompt) behind the shared limiter, retrying 429s with backoff."""
+    limiter, controller = get_limiter(), get_controller()
+    tokens = estimate_tokens(prompt if isinstance(prompt, str) else str(prompt)) + OUTPUT_TOKEN_RESERVE
+    with span("gemini.generate_content", model=getattr(model, "model_name", ""), tokens_estimate=tokens) as call:
+        waited = 0.0
+        for attempt in range(max_retries + 1):
+            waited += limiter.acquire(tokens)
+            controller.acquire()
+            start = time.monotonic()
+            try:
+                response = model.generate_content(prompt, **kwargs)
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                controller.release(throttled=throttled)
+                if not throttled or attempt == max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                logging.warning(f"🟡 Throttled by Gemini (attempt {attempt + 1}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                waited += delay
+                continue
+            controller.release(latency=time.monotonic() - start)
+            call.set("retries", attempt)
+            call.set("rate_limit_wait_s", round(waited, 3))
+            _record_usage(model, response, call)
+            return response
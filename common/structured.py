@@ -0,0 +1,233 @@
+"""Local, deterministic repair of structured (JSON) LLM output.
+
+Fixes the glitches models make most often without another round-trip:
+  * prose or code fences around the JSON object
+  * numbers written as strings: "1.234,56", "$1,200", "1 200,00 €"
+  * dates in mixed formats: "30/08/2025", "Aug 30, 2025", "2025.08.30"
+Whatever is still wrong comes back as a list of field paths, so only those
+fields need to be asked for again (see build_field_reprompt).
+"""
+import copy
+import json
+import re
+from datetime import date
+
+from prompting import PromptBuilder
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+
+def loads(text: str | bytes):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+# ========== JSON ==========
+def extract_json_text(text: str) -> str:
+    """Cut the first complete JSON object/array out of `text`, dropping anything around it."""
+    start = next((i for i, ch in enumerate(text) if ch in "{["), None)
+    if start is None:
+        raise ValueError("no JSON object found in response")
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    raise ValueError("unterminated JSON object in response")
+
+
+def parse_lenient(text: str):
+    try:
+        return loads(text)
+    except ValueError:
+        return loads(extract_json_text(text))
+
+
+# ========== Numbers ==========
+_NUMBER_JUNK = re.compile(r"[^\d,.\-]")
+_THOUSANDS_COMMA = re.compile(r"^-?\d{1,3}(,\d{3})+$")
+
+
+def parse_number(value) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    negative = text.startswith("(") and text.endswith(")")
+    text = _NUMBER_JUNK.sub("", text)
+    if not re.search(r"\d", text):
+        raise ValueError(f"not a number: {value!r}")
+    if "," in text and "." in text:
+        # whichever separator comes last is the decimal one
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        text = text.replace(",", "") if _THOUSANDS_COMMA.match(text) else text.replace(",", ".")
+    elif text.count(".") > 1:
+        text = text.replace(".", "")
+    number = float(text)
+    return -number if negative else number
+
+
+# ========== Dates ==========
+_MONTHS = {name: i + 1 for i, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+_YMD = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})")
+_DMY = re.compile(r"^(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})$")
+_TEXT_MONTH = re.compile(r"([a-zA-Z]{3,})\.?")
+
+
+def normalize_date(value, dayfirst: bool = True) -> str:
+    """Return an ISO YYYY-MM-DD date or raise ValueError.
+
+    For ambiguous a/b/yyyy dates a part above 12 decides the order,
+    otherwise `dayfirst` does.
+    """
+    text = str(value).strip()
+    if m := _YMD.match(text):
+        year, month, day = (int(g) for g in m.groups())
+    elif m := _DMY.match(text):
+        a, b, year = (int(g) for g in m.groups())
+        if year < 100:
+            year += 2000
+        if a > 12 or (dayfirst and b <= 12):
+            day, month = a, b
+        else:
+            month, day = a, b
+    else:
+        words = _TEXT_MONTH.findall(text)
+        month = next((_MONTHS[w[:3].lower()] for w in words if w[:3].lower() in _MONTHS), None)
+        numbers = [int(n) for n in re.findall(r"\d+", text)]
+        years = [n for n in numbers if n > 31]
+        days = [n for n in numbers if 1 <= n <= 31]
+        if month is None or not years or not days:
+            raise ValueError(f"unrecognised date: {value!r}")
+        year, day = years[0], days[0]
+    return date(year, month, day).isoformat()
+
+
+def normalize_date_or_keep(value) -> str:
+    try:
+        return normalize_date(value)
+    except (ValueError, TypeError):
+        return value
+
+
+# ========== Schema-driven repair ==========
+def get_path(data, path: str):
+    for part in path.split("."):
+        data = data[part]
+    return data
+
+
+def set_path(data: dict, path: str, value) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    data[parts[-1]] = value
+
+
+def repair_against_schema(data, schema: dict, path: str = "") -> tuple[object, list[str]]:
+    """Coerce `data` towards `schema` (Gemini-style JSON schema); returns (data, invalid_paths)."""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(data, dict):
+            return data, [path or "$"]
+        errors = []
+        data = dict(data)
+        for name, sub in schema.get("properties", {}).items():
+            sub_path = f"{path}.{name}" if path else name
+            if data.get(name) in (None, ""):
+                if name in schema.get("required", []):
+                    errors.append(sub_path)
+                continue
+            data[name], sub_errors = repair_against_schema(data[name], sub, sub_path)
+            errors.extend(sub_errors)
+        return data, errors
+    if kind in ("number", "integer"):
+        try:
+            number = parse_number(data)
+        except ValueError:
+            return data, [path]
+        return (int(number) if kind == "integer" else number), []
+    if kind == "string":
+        if isinstance(data, (dict, list)):
+            return data, [path]
+        text = str(data).strip()
+        if "date" in path.rsplit(".", 1)[-1].lower():
+            text = normalize_date_or_keep(text)
+        return text, []
+    return data, []
+
+
+def subschema(schema: dict, paths: list[str]) -> dict:
+    """The part of `schema` that covers only `paths` (for a targeted re-prompt)."""
+    result = {"type": "object", "properties": {}, "required": []}
+    for path in paths:
+        source, target = schema, result
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            prop = source["properties"][part]
+            if i == len(parts) - 1:
+                target["properties"][part] = copy.deepcopy(prop)
+            else:
+                target["properties"].setdefault(part, {"type": "object", "properties": {}, "required": []})
+            if part not in target["required"]:
+                target["required"].append(part)
+            source, target = prop, target["properties"][part]
+    return result
+
+
+def optional_schema(schema: dict) -> dict:
+    """`schema` with nothing required, for extracting from a fragment of a document."""
+    result = {k: v for k, v in schema.items() if k != "required"}
+    if "properties" in schema:
+        result["properties"] = {name: optional_schema(sub) for name, sub in schema["properties"].items()}
+    return result
+
+
+def build_field_reprompt(content: str, schema: dict, paths: list[str]) -> tuple[str, dict]:
+    fields = "\n".join(f"- {p}" for p in paths)
+    prompt = (
+        PromptBuilder("field_reprompt")
+        .text("""
+            You are an expert data extractor who excels at analyzing invoices.
+
+            A previous extraction from the invoice below returned missing or invalid values for these fields only:
+        """)
+        .text(fields, name="fields")
+        .block("invoice-content", content)
+        .text("Return ONLY these fields as a JSON object. Numbers must be plain JSON numbers, dates must be YYYY-MM-DD.")
+        .build()
+    )
+    return prompt, subschema(schema, paths)
+
+
+def merge_fields(data: dict, patch: dict, paths: list[str]) -> dict:
+    merged = copy.deepcopy(data) if isinstance(data, dict) else {}
+    for path in paths:
+        try:
+            set_path(merged, path, get_path(patch, path))
+        except (KeyError, TypeError):
+            pass
+    return merged
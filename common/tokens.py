@@ -0,0 +1,13 @@
+import math
+
+
+# Gemini / GPT style tokenizers average roughly 4 characters per token on
+# English prose. Good enough for budgeting and rate limiting without pulling
+# a tokenizer (or a network round-trip to count_tokens) into every script.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
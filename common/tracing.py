@@ -0,0 +1,305 @@
+"""Lightweight local tracing: nested, timed spans written as OTLP/JSON.
+
+    from tracing import span, traced
+
+    @traced
+    def get_pdf_content(path): ...
+
+    with span("process_invoice", file=pdf_file) as s:
+        ...
+        s.set("invoice.number", number)
+
+Tracing is off (and close to free) unless TRACE_FILE is set. Each finished
+trace is appended to that file as one OTLP/JSON ExportTraceServiceRequest per
+line, the same shape as the OpenTelemetry collector's file exporter, so it can
+be replayed into any OTLP backend. With TRACE_LANGFUSE=1 (and the `langfuse`
+package + LANGFUSE_* keys) traces are forwarded to Langfuse as well.
+
+Where the wall time went, per span name and per run:
+
+    python ../common/tracing.py report traces.jsonl
+"""
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import ContextDecorator
+
+SERVICE_NAME = os.path.basename(os.path.dirname(os.path.abspath(sys.argv[0] or "."))) or "ai_agent"
+STATUS_OK, STATUS_ERROR = 1, 2
+SPAN_KIND_INTERNAL = 1
+
+_current: contextvars.ContextVar["span | None"] = contextvars.ContextVar("current_span", default=None)
+
+
+# ========== Exporter ==========
+class _Exporter:
+    """Collects the spans of each trace and writes the trace out when its root span ends."""
+
+    def __init__(self, path: str, langfuse: bool):
+        self.path = path
+        self.langfuse = _LangfuseForwarder() if langfuse else None
+        self._open: dict[str, list[dict]] = {}
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def add(self, otlp_span: dict, is_root: bool) -> None:
+        with self._lock:
+            spans = self._open.setdefault(otlp_span["traceId"], [])
+            spans.append(otlp_span)
+            if is_root:
+                self._write(self._open.pop(otlp_span["traceId"]))
+
+    def flush(self) -> None:
+        with self._lock:
+            for spans in self._open.values():  # traces whose root never ended (crash, interrupted run)
+                self._write(spans)
+            self._open.clear()
+        if self.langfuse:
+            self.langfuse.flush()
+
+    def _write(self, spans: list[dict]) -> None:
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "ai_agent.tracing"}, "spans": spans}],
+        }]}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        if self.langfuse:
+            self.langfuse.send(spans)
+
+
+class _LangfuseForwarder:
+    def __init__(self):
+        try:
+            from langfuse import Langfuse
+        except ImportError:
+            logging.warning("🟡 TRACE_LANGFUSE is set but langfuse isn't installed; writing the local file only")
+            self.client = None
+            return
+        self.client = Langfuse(
+            public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+            secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+            host=os.getenv("LANGFUSE_HOST"),
+        )
+
+    def send(self, spans: list[dict]) -> None:
+        if self.client is None:
+            return
+        from datetime import datetime, timezone
+
+        def when(nanos: str) -> datetime:
+            return datetime.fromtimestamp(int(nanos) / 1e9, tz=timezone.utc)
+
+        try:
+            root = next((s for s in spans if not s.get("parentSpanId")), spans[-1])
+            self.client.trace(id=root["traceId"], name=root["name"])
+            for s in spans:
+                error = s["status"]["code"] == STATUS_ERROR
+                self.client.span(
+                    id=s["spanId"], trace_id=s["traceId"], parent_observation_id=s.get("parentSpanId") or None,
+                    name=s["name"], start_time=when(s["startTimeUnixNano"]), end_time=when(s["endTimeUnixNano"]),
+                    metadata={a["key"]: next(iter(a["value"].values())) for a in s["attributes"]},
+                    level="ERROR" if error else "DEFAULT", status_message=s["status"].get("message"),
+                )
+        except Exception as e:  # tracing must never break the pipeline
+            logging.warning(f"🟡 Could not forward trace to Langfuse: {e}")
+
+    def flush(self) -> None:
+        if self.client is not None:
+            self.client.flush()
+
+
+_exporter: _Exporter | None = None
+_configured = False
+_config_lock = threading.Lock()
+
+
+def configure(path: str | None = None, langfuse: bool | None = None) -> None:
+    """Turn tracing on (path) or off (None); by default it follows TRACE_FILE / TRACE_LANGFUSE."""
+    global _exporter, _configured
+    with _config_lock:
+        if _exporter is not None:
+            _exporter.flush()
+        path = os.getenv("TRACE_FILE") if path is None else path
+        langfuse = os.getenv("TRACE_LANGFUSE", "") not in ("", "0", "false") if langfuse is None else langfuse
+        _exporter = _Exporter(path, langfuse) if path else None
+        _configured = True
+
+
+def _get_exporter() -> _Exporter | None:
+    # resolved on first use, so a TRACE_FILE from .env (loaded in load_api_key) still counts
+    if not _configured:
+        configure()
+    return _exporter
+
+
+def enabled() -> bool:
+    return _get_exporter() is not None
+
+
+# ========== Spans ==========
+class span(ContextDecorator):
+    """A timed, nested unit of work. Use as `with span(name, **attrs):` or as a decorator."""
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._exporter = None
+
+    def _recreate_cm(self):
+        # a decorator is entered once per call (and maybe from several threads): fresh span each time
+        return span(self.name, **self.attributes)
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "span":
+        self._exporter = _get_exporter()
+        if self._exporter is None:
+            return self
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = secrets.token_hex(8)
+        self._token = _current.set(self)
+        self._start_ns = time.time_ns()
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._exporter is None:
+            return False
+        duration = time.perf_counter_ns() - self._start  # monotonic, immune to clock steps
+        _current.reset(self._token)
+        status = {"code": STATUS_OK}
+        if exc is not None:
+            status = {"code": STATUS_ERROR, "message": f"{exc_type.__name__}: {exc}"}
+        self._exporter.add({
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self._start_ns),
+            "endTimeUnixNano": str(self._start_ns + duration),
+            "attributes": _attributes(self.attributes),
+            "status": status,
+        }, is_root=self.parent_id is None)
+        return False
+
+
+def traced(fn):
+    """Decorator: one span per call, named after the function."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _get_exporter() is None:
+            return fn(*args, **kwargs)
+        with span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def set_attribute(key: str, value) -> None:
+    """Attach an attribute to the innermost open span (no-op when tracing is off)."""
+    current = _current.get()
+    if current is not None:
+        current.set(key, value)
+
+
+def _attributes(values: dict) -> list[dict]:
+    attributes = []
+    for key, value in values.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}  # OTLP/JSON encodes int64 as a string
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        attributes.append({"key": key, "value": typed})
+    return attributes
+
+
+# ========== Report ==========
+def load_spans(path: str) -> list[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    spans.extend(scope.get("spans", []))
+    return spans
+
+
+def _ms(s: dict) -> float:
+    return (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)] if ordered else 0.0
+
+
+def report(path: str, runs: int = 3) -> None:
+    spans = load_spans(path)
+    if not spans:
+        print(f"No spans in {path}")
+        return
+    children: dict[str, list[dict]] = {}
+    for s in spans:
+        children.setdefault(s.get("parentSpanId") or "", []).append(s)
+    roots = children.get("", [])
+    root_total = sum(_ms(r) for r in roots) or 1.0
+
+    # self time = own duration minus direct children (children running in parallel can exceed it)
+    by_name: dict[str, dict] = {}
+    for s in spans:
+        own = _ms(s)
+        child_ms = sum(_ms(c) for c in children.get(s["spanId"], []))
+        stats = by_name.setdefault(s["name"], {"durations": [], "self": 0.0, "errors": 0})
+        stats["durations"].append(own)
+        stats["self"] += max(0.0, own - child_ms)
+        stats["errors"] += s["status"]["code"] == STATUS_ERROR
+
+    print(f"{len(roots)} runs, {len(spans)} spans, {root_total / 1000:.2f}s total\n")
+    header = f"{'span':<34}{'count':>7}{'total s':>10}{'self s':>9}{'self %':>8}{'p50 ms':>10}{'p95 ms':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in sorted(by_name.items(), key=lambda item: item[1]["self"], reverse=True):
+        durations = stats["durations"]
+        print(f"{name[:33]:<34}{len(durations):>7}{sum(durations) / 1000:>10.2f}{stats['self'] / 1000:>9.2f}"
+              f"{100 * stats['self'] / root_total:>7.1f}%{_percentile(durations, 50):>10.1f}"
+              f"{_percentile(durations, 95):>10.1f}{stats['errors']:>8}")
+
+    for root in sorted(roots, key=lambda r: int(r["startTimeUnixNano"]))[-runs:]:
+        print(f"\nrun {root['traceId'][:8]}:")
+        _print_tree(root, children, _ms(root) or 1.0, 1)
+
+
+def _print_tree(s: dict, children: dict, root_ms: float, depth: int) -> None:
+    marker = " ✗" if s["status"]["code"] == STATUS_ERROR else ""
+    print(f"{'  ' * depth}{s['name']:<{40 - 2 * depth}}{_ms(s):>10.1f} ms {100 * _ms(s) / root_ms:>6.1f}%{marker}")
+    for child in sorted(children.get(s["spanId"], []), key=lambda c: int(c["startTimeUnixNano"])):
+        _print_tree(child, children, root_ms, depth + 1)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Where the wall time goes, from a TRACE_FILE.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_cmd = commands.add_parser("report")
+    report_cmd.add_argument("path")
+    report_cmd.add_argument("--runs", type=int, default=3, help="latest runs to print as a tree")
+    args = parser.parse_args()
+    report(args.path, args.runs)
@@ -1,3 +1,5 @@
+import os
+
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
@@ -60,5 +62,7 @@ class ResearchCrew():
             tasks=self.tasks, # Automatically created by the @task decorator
             process=Process.sequential,
             verbose=True,
+            # set per worker by parallel_eval.py, so parallel iterations share one rate budget
+            max_rpm=int(os.environ["CREW_MAX_RPM"]) if os.getenv("CREW_MAX_RPM") else None,
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
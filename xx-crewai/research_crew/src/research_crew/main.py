@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+import os
 import sys
 import warnings
 
@@ -23,11 +24,20 @@ def run():
     }
     
     try:
-        ResearchCrew().crew().kickoff(inputs=inputs)
+        with _profile_from_argv():
+            ResearchCrew().crew().kickoff(inputs=inputs)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
 
 
+def _profile_from_argv():
+    """`run_crew --profile` or PROFILE=1 crewai run: profile the run with the repo's common/profiling.py."""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "common"))
+    from profiling import profile_from_argv
+
+    return profile_from_argv("research_crew")
+
+
 def train():
     """
     Train the crew for a given number of iterations.
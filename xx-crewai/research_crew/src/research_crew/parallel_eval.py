@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""Run crew test iterations in parallel worker processes and aggregate the scores.
+
+    uv run parallel_test 20 gpt-4o-mini --workers 4 --max-rpm 60
+    uv run python -m research_crew.parallel_eval 6 gpt-4o-mini --fake     # offline, mock LLMs
+
+`crewai test` runs its iterations back to back. Here every iteration is an
+independent job in its own process (spawned, so no crewAI global state such
+as the event bus or telemetry is shared) with its own crew instance and its
+own output folder, eval_runs/<run>/iteration_NN/, so `report.md` files don't
+collide. Each iteration is scored by crewAI's CrewEvaluator with `eval_llm`,
+exactly as `Crew.test` does it.
+
+Budget: at most --workers iterations run at once, and --max-rpm (requests per
+minute for the whole run) is split evenly between them through the crew's own
+`max_rpm` limiter; with fewer requests per minute than workers, the pool
+shrinks to one worker per request. The limiter only covers the agents' calls:
+CrewEvaluator scores each task with its own `eval_llm` agent, outside the
+crew, so add one evaluation call per task on top of the budget.
+
+`train()` stays sequential (`crewai train`): every training iteration stops
+for human feedback on stdin, which parallel workers can't share.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import traceback
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
+
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "common")
+# what the mock evaluator answers; CrewEvaluator's prompt asks for a 1-10 score
+FAKE_EVAL_ANSWER = '{"quality": 8.0}'
+
+
+def default_inputs() -> dict:
+    return {"topic": "AI LLMs", "current_year": str(datetime.now().year)}
+
+
+# ========== Worker ==========
+def run_iteration(iteration: int, eval_llm: str, inputs: dict, output_dir: str, max_rpm: int | None,
+                  fake: bool) -> dict:
+    """One isolated test iteration: fresh crew, own output folder, scored by CrewEvaluator."""
+    os.makedirs(output_dir, exist_ok=True)
+    if max_rpm:
+        os.environ["CREW_MAX_RPM"] = str(max_rpm)  # read by ResearchCrew.crew()
+    result = {"iteration": iteration, "output_dir": output_dir, "scores": {}, "task_seconds": {}, "error": None}
+    start = time.monotonic()
+    try:
+        from crewai.utilities.evaluators.crew_evaluator_handler import CrewEvaluator
+        from crewai.utilities.llm_utils import create_llm
+
+        from research_crew.crew import ResearchCrew
+
+        crew = ResearchCrew().crew()
+        for task in crew.tasks:
+            if task.output_file:
+                task.output_file = os.path.join(output_dir, os.path.basename(task.output_file))
+        if fake:
+            sys.path.insert(0, COMMON_DIR)
+            import mock_llm
+            mock_llm.install_genai(canned={"score from 1 to 10": FAKE_EVAL_ANSWER})
+            for agent in crew.agents:
+                agent.llm = mock_llm.make_crew_llm()
+            evaluator_llm = mock_llm.make_crew_llm("mock/evaluator")
+        else:
+            evaluator_llm = create_llm(eval_llm)
+
+        evaluator = CrewEvaluator(crew, evaluator_llm)
+        evaluator.set_iteration(iteration)
+        crew.kickoff(inputs=inputs)
+
+        scores = evaluator.tasks_scores.get(iteration, [])
+        seconds = evaluator.run_execution_times.get(iteration, [])
+        for index, task in enumerate(crew.tasks):
+            name = task.name or f"task_{index + 1}"
+            if index < len(scores):
+                result["scores"][name] = scores[index]
+            if index < len(seconds):
+                result["task_seconds"][name] = seconds[index]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+    result["seconds"] = time.monotonic() - start
+    with open(os.path.join(output_dir, "result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+# ========== Runner ==========
+def run_parallel(n_iterations: int, eval_llm: str, workers: int = 4, max_rpm: int | None = None,
+                 runs_dir: str = "eval_runs", inputs: dict | None = None, fake: bool = False) -> dict:
+    inputs = inputs or default_inputs()
+    workers = max(1, min(workers, n_iterations))
+    run_dir = os.path.join(runs_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    if max_rpm:
+        workers = min(workers, max_rpm)  # at least 1 rpm each, never more than max_rpm in total
+    per_worker_rpm = max_rpm // workers if max_rpm else None
+    print(f"🚀 {n_iterations} iterations on {workers} workers"
+          f"{f', {per_worker_rpm} rpm each' if per_worker_rpm else ''} -> {run_dir}")
+
+    results = []
+    start = time.monotonic()
+    # spawn: each worker starts from a clean interpreter, nothing of crewAI's global state is inherited
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(run_iteration, i, eval_llm, inputs, os.path.join(run_dir, f"iteration_{i:02d}"),
+                        per_worker_rpm, fake)
+            for i in range(1, n_iterations + 1)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            status = f"🔴 {result['error']}" if result["error"] else "🟢"
+            print(f"{status} iteration {result['iteration']} finished in {result['seconds']:.1f}s")
+            results.append(result)
+    wall = time.monotonic() - start
+
+    summary = aggregate(sorted(results, key=lambda r: r["iteration"]), wall)
+    summary.update({"eval_llm": eval_llm, "workers": workers, "max_rpm": max_rpm, "run_dir": run_dir})
+    with open(os.path.join(run_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print_summary(summary)
+    return summary
+
+
+def aggregate(results: list[dict], wall_seconds: float) -> dict:
+    ok = [r for r in results if not r["error"]]
+    tasks: dict[str, dict] = {}
+    for r in ok:
+        for name, score in r["scores"].items():
+            tasks.setdefault(name, {"scores": [], "seconds": []})["scores"].append(score)
+        for name, seconds in r["task_seconds"].items():
+            tasks.setdefault(name, {"scores": [], "seconds": []})["seconds"].append(seconds)
+    crew_scores = [statistics.mean(r["scores"].values()) for r in ok if r["scores"]]
+    iteration_seconds = [r["seconds"] for r in results]
+    return {
+        "iterations": len(results),
+        "failed": [r["iteration"] for r in results if r["error"]],
+        "tasks": {
+            name: {
+                "scores": t["scores"],
+                "mean": statistics.mean(t["scores"]) if t["scores"] else None,
+                "stdev": statistics.stdev(t["scores"]) if len(t["scores"]) > 1 else 0.0,
+                "mean_seconds": statistics.mean(t["seconds"]) if t["seconds"] else None,
+            }
+            for name, t in tasks.items()
+        },
+        "crew_mean": statistics.mean(crew_scores) if crew_scores else None,
+        "wall_seconds": wall_seconds,
+        "sum_iteration_seconds": sum(iteration_seconds),
+        # what back-to-back iterations would have taken, over what this run took
+        "speedup": sum(iteration_seconds) / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def print_summary(summary: dict) -> None:
+    print(f"\n{'task':<28}{'mean':>7}{'stdev':>7}{'avg s':>8}  scores per iteration")
+    print("-" * 72)
+    for name, t in summary["tasks"].items():
+        mean = f"{t['mean']:.2f}" if t["mean"] is not None else "-"
+        seconds = f"{t['mean_seconds']:.1f}" if t["mean_seconds"] is not None else "-"
+        scores = " ".join(f"{s:g}" for s in t["scores"])
+        print(f"{name[:27]:<28}{mean:>7}{t['stdev']:>7.2f}{seconds:>8}  {scores}")
+    crew_mean = f"{summary['crew_mean']:.2f}" if summary["crew_mean"] is not None else "-"
+    failed = f", failed: {summary['failed']}" if summary["failed"] else ""
+    print(f"\nCrew score {crew_mean} over {summary['iterations'] - len(summary['failed'])} iterations{failed}")
+    print(f"⏱️ {summary['wall_seconds']:.1f}s wall for {summary['sum_iteration_seconds']:.1f}s of iterations "
+          f"({summary['speedup']:.1f}x)")
+    print(f"✅ Reports and per-iteration results in {summary.get('run_dir', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel `crewai test`: independent iterations in worker processes.")
+    parser.add_argument("n_iterations", type=int)
+    parser.add_argument("eval_llm", help="model that scores every task, as for `crewai test`")
+    parser.add_argument("--workers", type=int, default=4, help="iterations running at once")
+    parser.add_argument("--max-rpm", type=int, default=None, help="agent requests per minute, whole run")
+    parser.add_argument("--runs-dir", default="eval_runs")
+    parser.add_argument("--topic", default=None)
+    parser.add_argument("--fake", action="store_true", help="mock LLMs for the crew and the evaluator (offline)")
+    args = parser.parse_args()
+
+    inputs = default_inputs()
+    if args.topic:
+        inputs["topic"] = args.topic
+    summary = run_parallel(args.n_iterations, args.eval_llm, args.workers, args.max_rpm, args.runs_dir,
+                           inputs, args.fake)
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()